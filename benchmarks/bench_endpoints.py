@@ -0,0 +1,100 @@
+"""End-to-end latency and throughput of card, word-list and admin endpoints.
+
+Seed the database first (python -m benchmarks.data_generator), then
+
+    python -m benchmarks.bench_endpoints --requests 500 --concurrency 16
+    python -m benchmarks.bench_endpoints --url http://127.0.0.1:8000   # against a running uvicorn
+
+Without --url the app is called in-process through httpx's ASGI transport.
+"""
+import argparse
+import asyncio
+import contextlib
+import statistics
+import time
+import httpx
+
+from benchmarks.data_generator import PASSWORD, TOPICS
+from benchmarks.results import save_results, print_table
+
+ENDPOINTS = {
+    'cards/topic': '/user_cards/topic/{topic_id}?limit=25',
+    'cards/random': '/user_cards/random?limit=25',
+    'user_words': '/users/me/words?limit=100',
+    'user_words/sorted': '/users/me/words?limit=100&sort_by=english&desc=true',
+    'user_topics': '/users/me/topics',
+    'user_words/search': '/users/me/words/search?q=wort_{page}1',
+    'admin/words/search': '/admin/words/search?q=word+{page}2',
+    'admin/words': '/admin/words?limit=100&skip={page}',
+    'admin/words/users': '/admin/words?limit=100&sort_by=users&desc=true',
+    'admin/users': '/admin/users?limit=100',
+}
+
+
+def percentile(values: list[float], share: float) -> float:
+    return sorted(values)[min(int(len(values) * share), len(values) - 1)]
+
+
+async def login(client: httpx.AsyncClient, username: str) -> dict:
+    response = await client.post('/token', data={'username': username, 'password': PASSWORD})
+    response.raise_for_status()
+    return {'Authorization': f"Bearer {response.json()['access_token']}"}
+
+
+async def run_endpoint(client: httpx.AsyncClient, name: str, path: str, headers: dict,
+                       requests_amount: int, concurrency: int) -> dict:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    errors = 0
+
+    async def call(number: int):
+        nonlocal errors
+        url = path.format(topic_id=number % TOPICS + 1, page=number % 10)
+        async with semaphore:
+            started = time.perf_counter()
+            response = await client.get(url, headers=headers)
+            latencies.append((time.perf_counter() - started) * 1000)
+            errors += response.status_code >= 400
+
+    started = time.perf_counter()
+    await asyncio.gather(*(call(number) for number in range(requests_amount)))
+    elapsed = time.perf_counter() - started
+    return {'name': name,
+            'requests': requests_amount,
+            'errors': errors,
+            'p50_ms': statistics.median(latencies),
+            'p95_ms': percentile(latencies, 0.95),
+            'p99_ms': percentile(latencies, 0.99),
+            'requests_per_s': requests_amount / elapsed}
+
+
+async def run(url: str | None, requests_amount: int, concurrency: int, username: str, endpoints: list[str]
+              ) -> list[dict]:
+    if url:
+        client = httpx.AsyncClient(base_url=url, timeout=60)
+        lifespan = contextlib.nullcontext()
+    else:
+        from main import app
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url='http://bench', timeout=60)
+        # ASGITransport doesn't send lifespan events
+        lifespan = app.router.lifespan_context(app)
+    results = []
+    async with lifespan, client:
+        headers = await login(client, username)
+        for name in endpoints:
+            await run_endpoint(client, name, ENDPOINTS[name], headers, concurrency, concurrency)  # warm up
+            results.append(await run_endpoint(client, name, ENDPOINTS[name], headers, requests_amount, concurrency))
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', help='base url of a running app; in-process when omitted')
+    parser.add_argument('--requests', type=int, default=200, help='requests per endpoint')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--username', default='bench_user_0', help='generated admin user')
+    parser.add_argument('--endpoints', nargs='+', choices=ENDPOINTS, default=list(ENDPOINTS))
+    args = parser.parse_args()
+    endpoint_results = asyncio.run(run(args.url, args.requests, args.concurrency, args.username, args.endpoints))
+    print_table(endpoint_results)
+    print(f"Saved to {save_results('endpoints', endpoint_results, vars(args))}")
@@ -0,0 +1,68 @@
+"""Micro-benchmarks for woerter.net page parsing, plus full scraper calls against the local fixture server.
+
+    python -m benchmarks.bench_parsing --number 200
+"""
+import argparse
+import os
+import random
+import timeit
+from bs4 import BeautifulSoup
+
+import modules.word_info as word_info
+from benchmarks.fixture_server import FIXTURES_DIR, serve
+from benchmarks.results import save_results, print_table
+
+WORD_PAGES = ['word_schreiben.html', 'word_tisch.html', 'word_gross.html']
+SEARCH_PAGES = ['search_die.html', 'search_jogurt.html']
+
+
+def read_fixture(name: str) -> str:
+    with open(os.path.join(FIXTURES_DIR, name)) as fixture:
+        return fixture.read()
+
+
+def measure(name: str, func, number: int, repeat: int = 5) -> dict:
+    timings = timeit.repeat(func, number=number, repeat=repeat)
+    return {'name': name,
+            'us_per_call': min(timings) / number * 1e6,
+            'us_per_call_median': sorted(timings)[len(timings) // 2] / number * 1e6}
+
+
+def run(number: int) -> list[dict]:
+    random.seed(0)  # get_word_example picks a random example
+    results = []
+    for page in WORD_PAGES:
+        html = read_fixture(page)
+        soup = BeautifulSoup(html, 'html.parser')
+        results.append(measure(f'soup/{page}', lambda: BeautifulSoup(html, 'html.parser'), number))
+        results.append(measure(f'parse_word/{page}', lambda: word_info.parse_word(soup), number))
+        results.append(measure(f'get_word_example/{page}', lambda: word_info.get_word_example(soup), number))
+        results.append(measure(f'get_word_level_and_type/{page}',
+                               lambda: word_info.get_word_level_and_type(soup), number))
+        results.append(measure(f'get_word_translation/{page}', lambda: word_info.get_word_translation(soup), number))
+        results.append(measure(f'get_word_inflections/{page}', lambda: word_info.get_word_inflections(soup), number))
+    for page in SEARCH_PAGES:
+        soup = BeautifulSoup(read_fixture(page), 'html.parser')
+        results.append(measure(f'parse_words_suggestion/{page}',
+                               lambda: word_info.parse_words_suggestion(soup), number))
+        results.append(measure(f'parse_word_search/{page}', lambda: word_info.parse_word_search(soup), number))
+
+    server, word_info.WOERTER_URL = serve()
+    try:
+        for word in ('schreiben', 'Tisch'):
+            results.append(measure(f'get_word_info/{word} (local server)',
+                                   lambda: word_info.get_word_info(word), max(number // 10, 1)))
+        results.append(measure('get_word_info_from_search/jogurt (local server)',
+                               lambda: word_info.get_word_info_from_search('jogurt', 'Noun'), max(number // 10, 1)))
+    finally:
+        server.shutdown()
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--number', type=int, default=200, help='calls per timing round')
+    args = parser.parse_args()
+    parsing_results = run(args.number)
+    print_table(parsing_results)
+    print(f"Saved to {save_results('parsing', parsing_results, vars(args))}")
@@ -0,0 +1,48 @@
+"""Build time, memory size and lookup latency of the local spelling index.
+
+    python -m benchmarks.bench_spelling --words 50000
+"""
+import argparse
+import random
+import string
+import time
+import timeit
+
+from modules.spelling import SpellingIndex
+from benchmarks.results import save_results, print_table
+
+QUERIES = ['jogurt', 'schreibn', 'tish', 'grosss', 'fahradt', 'zzzzzzzz']
+
+
+def synthetic_words(amount: int, seed: int = 42) -> list[tuple[str, str]]:
+    randomizer = random.Random(seed)
+    letters = string.ascii_lowercase + 'äöüß'
+    words = [('Joghurt', 'Noun'), ('schreiben', 'Verb'), ('der Tisch', 'Noun'), ('groß', 'Adjective'),
+             ('das Fahrrad', 'Noun')]
+    while len(words) < amount:
+        words.append((''.join(randomizer.choices(letters, k=randomizer.randint(4, 14))), 'Noun'))
+    return words
+
+
+def run(words_amount: int, number: int) -> list[dict]:
+    words = synthetic_words(words_amount)
+    index = SpellingIndex()
+    started = time.perf_counter()
+    index.load(words)
+    results = [{'name': f'load/{words_amount} words', 'ms': (time.perf_counter() - started) * 1000,
+                'deletes': len(index._deletes)}]
+    for query in QUERIES:
+        seconds = min(timeit.repeat(lambda: index.suggest(query), number=number, repeat=5)) / number
+        results.append({'name': f'suggest/{query}', 'us_per_call': seconds * 1e6,
+                        'suggestions': len(index.suggest(query))})
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--words', type=int, default=50_000)
+    parser.add_argument('--number', type=int, default=200)
+    args = parser.parse_args()
+    spelling_results = run(args.words, args.number)
+    print_table(spelling_results)
+    print(f"Saved to {save_results('spelling', spelling_results, vars(args))}")
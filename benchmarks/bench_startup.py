@@ -0,0 +1,49 @@
+"""Cold start time of a fresh interpreter: what every spawned worker and every CLI tool pays.
+
+    python -m benchmarks.bench_startup --repeat 10
+
+Each case runs in a new process from the repository root with the current environment.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from benchmarks.results import save_results, print_table
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CASES = {
+    'import data.database_manager': 'import data.database_manager',
+    'import main (worker spawn)': 'import main',
+    'import main + lifespan startup': (
+        'import asyncio, main\n'
+        'async def startup():\n'
+        '    async with main.app.router.lifespan_context(main.app):\n'
+        '        pass\n'
+        'asyncio.run(startup())'
+    ),
+    'data.maintenance --help (CLI)': 'import runpy, sys; sys.argv = ["maintenance", "--help"]\n'
+                                     'try:\n    runpy.run_module("data.maintenance", run_name="__main__")\n'
+                                     'except SystemExit:\n    pass',
+}
+
+
+def measure(name: str, code: str, repeat: int) -> dict:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        subprocess.run([sys.executable, '-c', code], cwd=REPO_DIR, check=True,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        timings.append((time.perf_counter() - started) * 1000)
+    return {'name': name, 'ms_median': statistics.median(timings), 'ms_min': min(timings)}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=10)
+    args = parser.parse_args()
+    startup_results = [measure(name, code, args.repeat) for name, code in CASES.items()]
+    print_table(startup_results)
+    print(f"Saved to {save_results('startup', startup_results, vars(args))}")
@@ -0,0 +1,116 @@
+"""Seed the configured database with synthetic users, words, topics and user words.
+
+    python -m benchmarks.data_generator --scale 100k
+
+*scale* is the amount of user words; every user gets 100 of them, the dictionary holds scale/10 words.
+All generated names start with "bench_", so a run can be removed with --drop. The first generated user
+(bench_user_0) is an Admin, all users have the password "bench".
+"""
+import argparse
+import datetime
+import random
+import time
+from sqlalchemy import insert, delete, select
+
+from data.database_manager import db_manager
+from data.models import User, UserRole, Word, WordExample, Topic, UserWord, UserWordTopic
+from modules.security import get_password_hash
+
+SCALES = {'10k': 10_000, '100k': 100_000, '1M': 1_000_000}
+WORDS_PER_USER = 100
+TOPICS = 50
+PASSWORD = 'bench'
+WORD_TYPES = ['Noun', 'Verb', 'Adjective', 'Pronoun', 'Preposition', 'Conjunction', 'Adverb', 'Article', 'Particle']
+LEVELS = ['A1', 'A2', 'B1', 'B2', 'C1', 'C2']
+CHUNK = 10_000
+
+
+def insert_returning_ids(model, rows: list[dict]) -> list[int]:
+    ids = []
+    for start in range(0, len(rows), CHUNK):
+        ids.extend(db_manager.session.scalars(insert(model).returning(model.id), rows[start:start + CHUNK]))
+    return ids
+
+
+def insert_rows(model, rows: list[dict]) -> None:
+    for start in range(0, len(rows), CHUNK):
+        db_manager.session.execute(insert(model), rows[start:start + CHUNK])
+
+
+def seed(user_words: int, seed_value: int = 42) -> dict:
+    randomizer = random.Random(seed_value)
+    users_amount = max(user_words // WORDS_PER_USER, 1)
+    words_amount = max(user_words // 10, WORDS_PER_USER)
+    started = time.perf_counter()
+    now = datetime.datetime.now()
+    db_manager.create_tables()
+
+    password = get_password_hash(PASSWORD)
+    user_ids = insert_returning_ids(User, [dict(username=f'bench_user_{number}',
+                                                email=f'bench_user_{number}@example.com',
+                                                password=password,
+                                                level=randomizer.choice(LEVELS),
+                                                login_attempts=0,
+                                                streak=0,
+                                                created_at=now)
+                                           for number in range(users_amount)])
+    roles = {role: db_manager.add_role(role).id for role in ('Admin', 'User')}
+    insert_rows(UserRole, [dict(user_id=user_id, role_id=roles['Admin' if not number else 'User'])
+                           for number, user_id in enumerate(user_ids)])
+
+    word_types = [db_manager.add_word_type(word_type).id for word_type in WORD_TYPES]
+    word_ids = insert_returning_ids(Word, [dict(word=f'bench_wort_{number}',
+                                                word_type_id=randomizer.choice(word_types),
+                                                english=f'bench word {number}',
+                                                level=randomizer.choice(LEVELS))
+                                           for number in range(words_amount)])
+    insert_rows(WordExample, [dict(word_id=word_id,
+                                   example=f'Das ist das Beispiel Nummer {word_id}.',
+                                   translation=f'This is example number {word_id}.')
+                              for word_id in word_ids])
+    topic_ids = insert_returning_ids(Topic, [dict(name=f'bench_topic_{number}') for number in range(TOPICS)])
+    db_manager.session.commit()
+
+    for user_id in user_ids:
+        user_word_ids = insert_returning_ids(UserWord, [
+            dict(user_id=user_id,
+                 word_id=word_id,
+                 fails=randomizer.randint(0, 10),
+                 success=randomizer.randint(0, 20),
+                 last_shown=now - datetime.timedelta(minutes=randomizer.randint(0, 60 * 24 * 90)))
+            for word_id in randomizer.sample(word_ids, WORDS_PER_USER)])
+        topics_links = []
+        for user_word_id in user_word_ids:
+            for topic_id in randomizer.sample(topic_ids, randomizer.randint(1, 2)):
+                topics_links.append(dict(user_word_id=user_word_id, user_id=user_id, topic_id=topic_id))
+        insert_rows(UserWordTopic, topics_links)
+        db_manager.session.commit()
+    db_manager.reconcile_words_user_count()
+    return {'users': users_amount, 'words': words_amount, 'topics': TOPICS,
+            'user_words': users_amount * WORDS_PER_USER, 'seconds': round(time.perf_counter() - started, 1)}
+
+
+def drop() -> None:
+    """Remove everything created by seed()."""
+    bench_users = select(User.id).where(User.username.like('bench_user_%'))
+    bench_words = select(Word.id).where(Word.word.like('bench_wort_%'))
+    bench_user_words = select(UserWord.id).where(UserWord.user_id.in_(bench_users))
+    db_manager.session.execute(delete(UserWordTopic).where(UserWordTopic.user_word_id.in_(bench_user_words)))
+    db_manager.session.execute(delete(UserWord).where(UserWord.user_id.in_(bench_users)))
+    db_manager.session.execute(delete(UserRole).where(UserRole.user_id.in_(bench_users)))
+    db_manager.session.execute(delete(User).where(User.id.in_(bench_users)))
+    db_manager.session.execute(delete(WordExample).where(WordExample.word_id.in_(bench_words)))
+    db_manager.session.execute(delete(Word).where(Word.id.in_(bench_words)))
+    db_manager.session.execute(delete(Topic).where(Topic.name.like('bench_topic_%')))
+    db_manager.session.commit()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scale', choices=SCALES, default='10k')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--drop', action='store_true', help='remove previously generated data first')
+    args = parser.parse_args()
+    if args.drop:
+        drop()
+    print(seed(SCALES[args.scale], args.seed))
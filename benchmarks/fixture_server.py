@@ -0,0 +1,84 @@
+"""Local stand-in for woerter.net serving the HTML fixtures from benchmarks/fixtures.
+
+    python -m benchmarks.fixture_server --port 8765
+    python -m benchmarks.fixture_server --record schreiben tisch   # save real pages as fixtures
+
+Point the scrapers at it with the *woerter_url* env variable (or by setting modules.word_info.WOERTER_URL).
+"""
+import argparse
+import os
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs, unquote
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), 'fixtures')
+
+
+def fixture_name(kind: str, word: str) -> str:
+    slug = unquote(word).replace('+', ' ').strip().lower().replace(' ', '_').replace('ß', 'ss')
+    return f'{kind}_{slug}.html'
+
+
+def fixture_path_for_url(url: str) -> str | None:
+    parsed = urlparse(url)
+    query = parse_qs(parsed.query)
+    if parsed.path.rstrip('/') == '/search' and query.get('w'):
+        name = fixture_name('search', query['w'][0])
+    elif parsed.path in ('', '/') and query.get('w'):
+        name = fixture_name('word', query['w'][0])
+    elif parsed.path.startswith('/wort/'):
+        name = fixture_name('word', parsed.path[len('/wort/'):].removesuffix('.htm'))
+    else:
+        return None
+    path = os.path.join(FIXTURES_DIR, name)
+    return path if os.path.exists(path) else None
+
+
+class FixtureHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        path = fixture_path_for_url(self.path)
+        if not path:
+            self.send_error(404)
+            return
+        with open(path, 'rb') as fixture:
+            body = fixture.read()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(port: int = 0) -> tuple[ThreadingHTTPServer, str]:
+    """Start the server in a daemon thread. Returns the server and its base url."""
+    server = ThreadingHTTPServer(('127.0.0.1', port), FixtureHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://127.0.0.1:{server.server_address[1]}'
+
+
+def record(words: list[str], base_url: str = 'https://www.woerter.net') -> None:
+    import requests
+    for word in words:
+        for kind, url in (('word', f'{base_url}/?w={word}'), ('search', f'{base_url}/search/?w={word}')):
+            response = requests.get(url)
+            if response.status_code == 200:
+                with open(os.path.join(FIXTURES_DIR, fixture_name(kind, word)), 'w') as fixture:
+                    fixture.write(response.text)
+                print(f'recorded {url}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--record', nargs='+', metavar='WORD', help='download real pages for WORD as fixtures')
+    args = parser.parse_args()
+    if args.record:
+        record(args.record)
+    else:
+        fixture_server, url = serve(args.port)
+        print(f'Serving {FIXTURES_DIR} on {url}')
+        threading.Event().wait()
@@ -0,0 +1,80 @@
+"""Machine-readable benchmark results.
+
+Every run is saved as benchmarks/results/<suite>-<timestamp>.json. Compare two runs with
+
+    python -m benchmarks.results BASE.json NEW.json [--threshold 1.1]
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import subprocess
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), 'results')
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(__file__)).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def save_results(suite: str, results: list[dict], params: dict | None = None) -> str:
+    """Save a list of benchmark records. Each record has a unique *name* and numeric metrics."""
+    timestamp = datetime.datetime.now()
+    document = {
+        'suite': suite,
+        'timestamp': timestamp.isoformat(timespec='seconds'),
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'params': params or {},
+        'results': results
+    }
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    path = os.path.join(RESULTS_DIR, f"{suite}-{timestamp.strftime('%Y%m%d-%H%M%S')}.json")
+    with open(path, 'w') as results_file:
+        json.dump(document, results_file, indent=2)
+    return path
+
+
+def compare(old_path: str, new_path: str) -> list[dict]:
+    """Ratio new/old for every numeric metric present in both runs."""
+    with open(old_path) as old_file, open(new_path) as new_file:
+        old = {record['name']: record for record in json.load(old_file)['results']}
+        new = {record['name']: record for record in json.load(new_file)['results']}
+    comparison = []
+    for name in old.keys() & new.keys():
+        for metric, old_value in old[name].items():
+            new_value = new[name].get(metric)
+            if isinstance(old_value, (int, float)) and isinstance(new_value, (int, float)) and old_value:
+                comparison.append({'name': name, 'metric': metric, 'old': old_value, 'new': new_value,
+                                   'ratio': new_value / old_value})
+    return sorted(comparison, key=lambda row: (row['name'], row['metric']))
+
+
+def print_table(results: list[dict]) -> None:
+    for record in results:
+        metrics = ', '.join(f'{key}={value:.2f}' if isinstance(value, float) else f'{key}={value}'
+                            for key, value in record.items() if key != 'name')
+        print(f"{record['name']:50} {metrics}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.results',
+                                     description='Compare two benchmark result files')
+    parser.add_argument('old', help='results file of the baseline run')
+    parser.add_argument('new', help='results file of the run to check')
+    parser.add_argument('--threshold', type=float, default=1.1, help='flag metrics that grew by this ratio')
+    args = parser.parse_args()
+    for row in compare(args.old, args.new):
+        # throughput metrics (*_per_s) regress when they drop, time and size metrics when they grow
+        if row['metric'].endswith('_per_s'):
+            regression = row['ratio'] < 1 / args.threshold
+        else:
+            regression = row['ratio'] > args.threshold
+        flag = '  <-- regression' if regression else ''
+        print(f"{row['name']:50} {row['metric']:14} {row['old']:12.2f} -> {row['new']:12.2f}  x{row['ratio']:.2f}{flag}")
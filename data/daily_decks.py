@@ -0,0 +1,125 @@
+"""Nightly job building the deck of cards for the day of every active user.
+
+    python -m data.daily_decks --processes 4 --shard-size 1000
+
+Active users (with activity in the last *active_user_days*) are split into shards of user ids; every shard is
+one set-based pass over users_words in a worker process, its decks are written to daily_decks in one statement.
+/user_cards/daily then serves the stored deck (cards not answered since it was built) and only falls back to
+scoring when the deck is used up.
+
+A deck holds the cards due by the end of the day (the schedule of modules/review_state.py), ordered by the
+*card_scoring* function, and up to *daily_new_cards* never shown cards; *daily_deck_size* cards at most.
+Progress and throughput are printed per shard and can be written in the Prometheus text format
+(``--metrics-file``, e.g. for the node exporter textfile collector).
+
+Environment: *daily_deck_size* (default 50), *daily_new_cards* (default 10), *active_user_days* (default 30).
+"""
+import argparse
+import datetime
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from itertools import groupby
+from typing import Callable
+import numpy as np
+from dotenv import load_dotenv
+
+from data.database_manager import db_manager
+from modules.metrics import Counter, Histogram
+from modules.review_state import ReviewState, scorers, epoch, CARD_SCORING
+
+load_dotenv()
+DAILY_DECK_SIZE = int(os.getenv('daily_deck_size', 50))
+DAILY_NEW_CARDS = int(os.getenv('daily_new_cards', 10))
+ACTIVE_USER_DAYS = int(os.getenv('active_user_days', 30))
+
+deck_users = Counter('daily_deck_users_total', 'Users whose daily deck was built.')
+deck_cards = Counter('daily_deck_cards_total', 'Cards put into daily decks by kind (due or new).', ('kind',))
+deck_shard_duration = Histogram('daily_deck_shard_seconds', 'Time to build and store the decks of one shard.')
+job_metrics = [deck_users, deck_cards, deck_shard_duration]
+
+
+def build_deck(state: ReviewState, until: float, scorer: Callable[[ReviewState, float], np.ndarray],
+               size: int = DAILY_DECK_SIZE, new_cards: int = DAILY_NEW_CARDS) -> tuple[list[int], int, int]:
+    """(user word ids, due count, new count) of one user's deck; due cards by score first, then new ones."""
+    is_new = (state.fails + state.success) == 0
+    new_rows = np.flatnonzero(is_new)[:min(new_cards, size)]
+    due_rows = np.flatnonzero(~is_new & (state.due <= until))
+    due_limit = size - len(new_rows)
+    scores = scorer(state, until)
+    if len(due_rows) > due_limit:
+        due_rows = due_rows[np.argpartition(-scores[due_rows], due_limit - 1)[:due_limit]] if due_limit \
+            else due_rows[:0]
+    due_rows = due_rows[np.argsort(-scores[due_rows], kind='stable')]
+    return state.user_word_ids[np.concatenate([due_rows, new_rows])].tolist(), len(due_rows), len(new_rows)
+
+
+def build_shard(user_ids: list[int], deck_date: datetime.date, scoring: str = CARD_SCORING) -> dict:
+    """Build and store the decks of *user_ids*; returns the shard's counts for progress reporting."""
+    started = time.perf_counter()
+    until = epoch(datetime.datetime.combine(deck_date + datetime.timedelta(days=1), datetime.time()))
+    created_at = datetime.datetime.now()
+    decks = []
+    due_total = new_total = 0
+    rows = db_manager.get_review_rows(user_ids)
+    for user_id, user_rows in groupby(rows, key=lambda row: row[0]):
+        state = ReviewState([row[1:] for row in user_rows], [])
+        cards, due_count, new_count = build_deck(state, until, scorers[scoring])
+        decks.append(dict(user_id=user_id, deck_date=deck_date, cards=cards, due_count=due_count,
+                          new_count=new_count, created_at=created_at))
+        due_total += due_count
+        new_total += new_count
+    db_manager.save_daily_decks(decks)
+    return {'users': len(decks), 'due': due_total, 'new': new_total, 'seconds': time.perf_counter() - started}
+
+
+def init_worker() -> None:
+    # connections inherited from the parent process must not be used by the forked worker
+    db_manager.dispose(close=False)
+
+
+def run(processes: int, shard_size: int, deck_date: datetime.date) -> dict:
+    since = datetime.datetime.now() - datetime.timedelta(days=ACTIVE_USER_DAYS)
+    user_ids = db_manager.get_active_user_ids(since)
+    shards = [user_ids[index:index + shard_size] for index in range(0, len(user_ids), shard_size)]
+    print(f'Building {deck_date} decks of {len(user_ids)} active users in {len(shards)} shard(s), '
+          f'{processes} process(es).')
+    started = time.perf_counter()
+    totals = {'users': 0, 'due': 0, 'new': 0}
+
+    def report(number: int, shard: dict) -> None:
+        deck_users.inc(amount=shard['users'])
+        deck_cards.inc('due', amount=shard['due'])
+        deck_cards.inc('new', amount=shard['new'])
+        deck_shard_duration.observe(shard['seconds'])
+        for key in totals:
+            totals[key] += shard[key]
+        elapsed = time.perf_counter() - started
+        print(f'{number}/{len(shards)} shards, {totals["users"]} users, '
+              f'{totals["users"] / elapsed:.0f} users/s, {totals["due"] + totals["new"]} cards')
+
+    if processes == 1:
+        for number, shard_user_ids in enumerate(shards, start=1):
+            report(number, build_shard(shard_user_ids, deck_date))
+    else:
+        with ProcessPoolExecutor(processes, initializer=init_worker) as executor:
+            futures = [executor.submit(build_shard, shard_user_ids, deck_date) for shard_user_ids in shards]
+            for number, future in enumerate(as_completed(futures), start=1):
+                report(number, future.result())
+    totals['seconds'] = time.perf_counter() - started
+    return totals
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--processes', type=int, default=os.cpu_count())
+    parser.add_argument('--shard-size', type=int, default=1000, help='users per shard')
+    parser.add_argument('--date', type=datetime.date.fromisoformat, default=datetime.date.today(),
+                        help='day of the decks (YYYY-MM-DD), today by default')
+    parser.add_argument('--metrics-file', help='write the job metrics to this file in the Prometheus text format')
+    args = parser.parse_args()
+    job_totals = run(args.processes, args.shard_size, args.date)
+    print(f'Done: {job_totals["users"]} decks in {job_totals["seconds"]:.1f} s.')
+    if args.metrics_file:
+        with open(args.metrics_file, 'w') as metrics_file:
+            metrics_file.write('\n'.join(line for metric in job_metrics for line in metric.render()) + '\n')
@@ -1,26 +1,178 @@
 import os
 import datetime
-from typing import Type
+import functools
+import inspect
+import logging
+import threading
+from typing import Type, Generator, Callable
 from dotenv import load_dotenv
-from sqlalchemy import URL, create_engine, exc, text, desc
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy import (URL, Engine, create_engine, event, exc, text, desc, select, case, update, delete, insert, or_,
+                        union)
+from sqlalchemy.orm import sessionmaker, scoped_session, selectinload, with_loader_criteria, ORMExecuteState
+from sqlalchemy.dialects import postgresql, sqlite
 
 from data.models import *
 from modules.word_info import get_word_info_from_search
+from modules.text_search import word_similarity
+from modules.review_state import ReviewState, review_states, scorers, pack_ids, unpack_ids, CARD_SCORING
+from modules.stats import (MASTERED_MARGIN, user_word_counters, counters_delta, next_streak,
+                           stats_from_counters)
+from modules.sync import changes_since, encode_token
+from data.replicas import Replica, ReplicaSet, current_user_id, is_replica_method
 
+logger = logging.getLogger(__name__)
 
+# Core tables, so the subqueries are not filtered by hide_deleted themselves
+DELETED_USERS = select(User.__table__.c.id).where(User.__table__.c.deleted_at.isnot(None))
+DELETED_WORDS = select(Word.__table__.c.id).where(Word.__table__.c.deleted_at.isnot(None))
+DELETED_TOPICS = select(Topic.__table__.c.id).where(Topic.__table__.c.deleted_at.isnot(None))
+INCLUDE_DELETED = {'include_deleted': True}
+# words are sorted without their articles: 'der Zug' after 'die Bahn'
+WORD_SORT_KEY = func.regexp_replace(Word.word, r'(der |die |das |der, |das, )', '', 'g')
+
+
+def hide_deleted(execute_state: ORMExecuteState) -> None:
+    """Keep soft-deleted users, words and topics, and the user words and topic links depending on them, out of
+    every ORM query (relationship loads included) unless executed with the *include_deleted* option."""
+    if not execute_state.is_select or execute_state.is_column_load \
+            or execute_state.execution_options.get('include_deleted', False):
+        return
+    execute_state.statement = execute_state.statement.options(
+        with_loader_criteria(SoftDelete, lambda cls: cls.deleted_at.is_(None), include_aliases=True),
+        with_loader_criteria(UserWord, lambda cls: cls.user_id.notin_(DELETED_USERS)
+                             & cls.word_id.notin_(DELETED_WORDS), include_aliases=True),
+        with_loader_criteria(UserWordTopic, lambda cls: cls.topic_id.notin_(DELETED_TOPICS), include_aliases=True)
+    )
+
+
+def session_factory(engine) -> sessionmaker:
+    factory = sessionmaker(bind=engine)
+    event.listen(factory, 'do_orm_execute', hide_deleted)
+    return factory
+
+
+def routed(method: Callable, read_only: bool) -> Callable:
+    """Run *method* on a replica (*read_only*) or on the primary, see data/replicas.py. Methods called from
+    another method run where the outer one does."""
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        local = self._local
+        if not self._replicas or getattr(local, 'depth', 0):
+            return method(self, *args, **kwargs)
+        user_id = current_user_id.get()
+        replica = self._replicas.pick() if read_only and not self._replicas.is_sticky(user_id) else None
+        local.depth, local.replica, local.wrote = 1, replica, False
+        try:
+            if replica is None:
+                return method(self, *args, **kwargs)
+            # a new snapshot for every read: the previous transaction on the replica ends here
+            replica.session.rollback()
+            try:
+                return method(self, *args, **kwargs)
+            except exc.OperationalError as error:
+                logger.warning('Read on replica %s failed, repeating it on the primary: %s',
+                               replica.engine.url, error)
+                self._replicas.mark_down(replica)
+                replica.session.remove()
+                local.replica = None
+                return method(self, *args, **kwargs)
+        finally:
+            if local.wrote:
+                self._replicas.record_write(user_id)
+            local.depth, local.replica = 0, None
+
+    return wrapper
+
+
+def route_methods(cls):
+    """Class decorator routing the public methods of DataManager between the primary and the replicas."""
+    for name, attribute in list(vars(cls).items()):
+        if inspect.isfunction(attribute) and not name.startswith('_'):
+            setattr(cls, name, routed(attribute, is_replica_method(name)))
+    return cls
+
+
+@route_methods
 class DataManager:
+    user_words_sort_columns = {
+        'id': UserWord.id,
+        'word_id': UserWord.word_id,
+        'word': WORD_SORT_KEY,
+        'word_type': WordType.name,
+        'level': Word.level,
+        'english': Word.english,
+        'example': WordExample.example,
+        'fails': UserWord.fails,
+        'success': UserWord.success,
+        'last_shown': UserWord.last_shown
+    }
 
-    def __init__(self, database_url_object):
+    def __init__(self, database_url_object, replica_url_objects=()):
+        # no connection is opened here: the engine connects on the first statement
         self._engine = create_engine(database_url_object, echo=False)
+        # one session per thread: DataManager methods are executed by the sized 'db' pool (modules/executor.py)
+        self._session_factory = session_factory(self._engine)
+        event.listen(self._session_factory, 'after_flush', self._record_flush)
+        event.listen(self._session_factory, 'do_orm_execute', self._record_statement)
+        self._session = scoped_session(self._session_factory)
+        replica_engines = [create_engine(url, echo=False) for url in replica_url_objects]
+        self._replicas = ReplicaSet([Replica(engine, scoped_session(session_factory(engine)))
+                                     for engine in replica_engines])
+        self._local = threading.local()
+
+    @property
+    def session(self) -> scoped_session:
+        """Session of this thread on the server the running method was routed to."""
+        replica = getattr(self._local, 'replica', None)
+        return replica.session if replica is not None else self._session
+
+    @property
+    def engines(self) -> list[Engine]:
+        return [self._engine, *(replica.engine for replica in self._replicas)]
+
+    def _record_flush(self, session, flush_context) -> None:
+        self._local.wrote = True
+
+    def _record_statement(self, execute_state: ORMExecuteState) -> None:
+        if execute_state.is_insert or execute_state.is_update or execute_state.is_delete:
+            self._local.wrote = True
+
+    def create_tables(self) -> None:
         Base.metadata.create_all(self._engine)
-        self.session = sessionmaker(bind=self._engine)()
+        try:
+            self.add_search_indexes()
+        except exc.DBAPIError as error:
+            logger.warning('Trigram search indexes were not created, search will scan: %s', error)
+        self.add_review_events_partitions()
+        self.add_users_words_partitions()
+
+    def release_sessions(self) -> None:
+        """Close this thread's sessions (primary and replicas); loaded objects stay readable, detached."""
+        self._session.remove()
+        for replica in self._replicas:
+            replica.session.remove()
+
+    def dispose(self, close: bool = True) -> None:
+        """Drop pooled connections; close=False in a forked process leaves the parent's connections alone."""
+        for engine in self.engines:
+            engine.dispose(close=close)
 
     def get_users(self, limit: int = 25, skip: int = 0, sort_by: str = 'id', reverse: bool = False):
         query = self.session.query(User)
         sorted_query = self.sort_query(query, User, sort_by, reverse)
         return self.slice_query(sorted_query, limit, skip)
 
+    def get_users_rows(self, limit: int = 25, skip: int = 0, sort_by: str = 'id', reverse: bool = False
+                       ) -> list[dict]:
+        """Read-only users page: selects only the columns shown in the admin users list."""
+        query = select(User.id, User.username, User.email, User.level, User.last_login, User.login_attempts,
+                       User.last_activity, User.created_at, User.streak, Role.name.label('role')) \
+            .outerjoin(UserRole, UserRole.user_id == User.id).outerjoin(Role, Role.id == UserRole.role_id)
+        sorting = Role.name if sort_by == 'role' else getattr(User, sort_by)
+        query = query.order_by(desc(sorting) if reverse else sorting, User.id)
+        return [row._asdict() for row in self.session.execute(self.slice_select(query, limit, skip))]
+
     def get_user_by_id(self, user_id: int):
         try:
             result = self.session.query(User).filter_by(id=user_id).one()
@@ -46,6 +198,7 @@ class DataManager:
         return result
 
     def add_user(self, username, email, password, level='A1'):
+        self.purge_deleted(User, (User.username == username) | (User.email == email))
         new_user = User(username=username,
                         email=email,
                         created_at=datetime.datetime.now(),
@@ -106,12 +259,20 @@ class DataManager:
         return db_user.user_role.role.name == role
 
     def delete_user(self, user_id):
+        """Soft delete: the user is hidden at once, the reaper removes the user's words and the user later."""
         try:
             delete_user = self.session.query(User).filter_by(id=user_id).one()
         except exc.NoResultFound:
             return f'User with id={user_id} was not found.'
-        self.session.delete(delete_user)
+        # a user can have a word more than once: each user word is subtracted
+        user_words = select(UserWord.word_id, func.count().label('count')).where(UserWord.user_id == user_id) \
+            .group_by(UserWord.word_id).subquery()
+        self.session.execute(update(Word).where(Word.id == user_words.c.word_id)
+                             .values(user_count=Word.user_count - user_words.c.count)
+                             .execution_options(synchronize_session=False))
+        delete_user.deleted_at = datetime.datetime.now()
         self.session.commit()
+        review_states.forget(user_id)
         return delete_user
 
     def update_user_last_login(self, user_id: int):
@@ -132,6 +293,7 @@ class DataManager:
         user = self.get_user_by_id(user_id)
         if isinstance(user, str):
             return user
+        self.purge_deleted(User, (User.username == username) | (User.email == email))
         user.username = username
         user.email = email
         user.password = password
@@ -179,6 +341,7 @@ class DataManager:
         try:
             db_topic = self.session.query(Topic).filter_by(name=topic).one()
         except exc.NoResultFound:
+            self.purge_deleted(Topic, Topic.name == topic)
             db_topic = Topic(name=topic)
             self.session.add(db_topic)
             self.session.commit()
@@ -203,19 +366,106 @@ class DataManager:
                   ) -> list[Type[Word]]:
         query = self.session.query(Word)
         if sort_by == 'users':
-            sorting = desc('users') if reverse else 'users'
-            sorted_query = self.session.query(Word, func.count(UserWord.user_id).label('users')) \
-                .outerjoin(UserWord).group_by(Word.id).order_by(sorting)
-            rows_tuple = self.slice_query(sorted_query, limit, skip)
-            return [row[0] for row in rows_tuple]
+            sorted_query = query.order_by(desc(Word.user_count) if reverse else Word.user_count, Word.id)
+            return self.slice_query(sorted_query, limit, skip)
         sorted_query = self.sort_query(query, Word, sort_by, reverse)
         return self.slice_query(sorted_query, limit, skip)
 
+    def get_words_rows(self, limit: int = 25, skip: int = 0, sort_by: str = 'id', reverse: bool = False
+                       ) -> list[dict]:
+        """Read-only words page: selects only the columns of AdminWordOut plus the ids of word users."""
+        query = self.words_select()
+        match sort_by:
+            case 'users':
+                sorting = Word.user_count
+            case 'word':
+                sorting = WORD_SORT_KEY
+            case 'word_type':
+                sorting = WordType.name
+            case 'example':
+                sorting = WordExample.example
+            case _:
+                sorting = getattr(Word, sort_by)
+        query = query.order_by(desc(sorting) if reverse else sorting, Word.id)
+        rows = [row._asdict() for row in self.session.execute(self.slice_select(query, limit, skip))]
+        return self.add_words_users(rows)
+
+    @staticmethod
+    def words_select():
+        """Columns of a word as shown in AdminWordOut (without users)."""
+        return select(Word.id, Word.word, WordType.name.label('word_type'), Word.english, Word.level,
+                      WordExample.example, WordExample.translation.label('example_translation')) \
+            .join(WordType, WordType.id == Word.word_type_id).outerjoin(WordExample, WordExample.word_id == Word.id)
+
+    def add_words_users(self, rows: list[dict]) -> list[dict]:
+        words_users = self.get_words_users([row['id'] for row in rows]) if rows else {}
+        for row in rows:
+            row['users'] = words_users.get(row['id'], [])
+        return rows
+
+    def get_words_names(self) -> list[tuple[str, str]]:
+        """(word, word_type) of every word, for the spelling index (modules/spelling.py)."""
+        query = select(Word.word, WordType.name).join(WordType, WordType.id == Word.word_type_id)
+        return [tuple(row) for row in self.session.execute(query)]
+
+    def change_word_user_count(self, word_id: int, delta: int) -> None:
+        """Keep the denormalized words.user_count in step with users_words; committed by the caller."""
+        self.session.execute(update(Word).where(Word.id == word_id).values(user_count=Word.user_count + delta))
+
+    def reconcile_words_user_count(self) -> int:
+        """Recount words.user_count from users_words where it drifted. Returns the amount of fixed words."""
+        actual_count = select(func.count(UserWord.id)).where(UserWord.word_id == Word.id,
+                                                             UserWord.user_id.notin_(DELETED_USERS)).scalar_subquery()
+        result = self.session.execute(update(Word).where(Word.user_count != actual_count)
+                                      .values(user_count=actual_count).execution_options(synchronize_session=False))
+        self.session.commit()
+        return result.rowcount
+
+    def add_words_user_count_column(self) -> None:
+        """Add words.user_count with its index to a database created before the column existed (PostgreSQL)."""
+        with self._engine.begin() as connection:
+            connection.execute(text('ALTER TABLE words ADD COLUMN IF NOT EXISTS user_count INTEGER NOT NULL DEFAULT 0'))
+            connection.execute(text('CREATE INDEX IF NOT EXISTS ix_words_user_count ON words (user_count, id)'))
+
+    def add_examples_columns(self) -> None:
+        """Add words_examples.examples, users_words.example_index and users_words_examples.generated to an existing
+        database (PostgreSQL)."""
+        with self._engine.begin() as connection:
+            connection.execute(text('ALTER TABLE words_examples ADD COLUMN IF NOT EXISTS examples JSON'))
+            connection.execute(text('ALTER TABLE users_words '
+                                    'ADD COLUMN IF NOT EXISTS example_index INTEGER NOT NULL DEFAULT 0'))
+            connection.execute(text('ALTER TABLE users_words_examples '
+                                    'ADD COLUMN IF NOT EXISTS generated BOOLEAN NOT NULL DEFAULT false'))
+
     def get_word_users(self, word_id: int) -> list[int]:
         word_users = {user_word.user_id for user_word in self.session.query(UserWord)
                       .filter_by(word_id=word_id).order_by(UserWord.user_id).all()}
         return list(word_users)
 
+    def get_words_users(self, word_ids: list[int], session=None) -> dict[int, list[int]]:
+        session = session or self.session
+        words_users = {}
+        for word_id, user_id in session.query(UserWord.word_id, UserWord.user_id).distinct() \
+                .filter(UserWord.word_id.in_(word_ids)).order_by(UserWord.user_id):
+            words_users.setdefault(word_id, []).append(user_id)
+        return words_users
+
+    def iter_words(self, batch_size: int = 1000) -> Generator[tuple[list[Word], dict[int, list[int]]], None, None]:
+        """Stream all application words in batches together with the ids of users having each word.
+
+        Every batch is a query of its own (keyset pagination on the id), the session is emptied between them.
+        """
+        query = select(Word).order_by(Word.id).limit(batch_size).options(
+            selectinload(Word.word_type),
+            selectinload(Word.example)
+        )
+        with self._session_factory() as session:
+            last_id = 0
+            while db_words := session.execute(query.where(Word.id > last_id)).scalars().all():
+                last_id = db_words[-1].id
+                yield db_words, self.get_words_users([db_word.id for db_word in db_words], session)
+                session.expunge_all()
+
     def get_word_by_id(self, word_id: int) -> Type[Word]:
         try:
             db_word = self.session.query(Word).filter_by(id=word_id).one()
@@ -227,8 +477,23 @@ class DataManager:
         db_word = self.get_word_by_id(word_id)
         if isinstance(db_word, str):
             return db_word
-        self.session.delete(db_word)
+        word_users = self.get_word_users(word_id)
+        users_words, users_topics = {}, {}
+        for user_id, user_word_id, topic_id in self.session.execute(
+                select(UserWord.user_id, UserWord.id, UserWordTopic.topic_id)
+                .outerjoin(UserWordTopic, self.user_word_join(UserWordTopic)).where(UserWord.word_id == word_id)):
+            users_words.setdefault(user_id, set()).add(user_word_id)
+            users_topics.setdefault(user_id, set()).add(topic_id)
+        self.bump_data_versions(word_users)
+        # soft delete: the reaper removes the word's user words and the word later
+        db_word.deleted_at = datetime.datetime.now()
+        for user_id, user_word_ids in users_words.items():
+            self.add_sync_tombstones(user_id, 'word', user_word_ids)
+            self.add_topic_tombstones(user_id, users_topics[user_id] - {None})
         self.session.commit()
+        review_states.forget()
+        for user_id in word_users:
+            self.recount_user_counters(user_id)
         return db_word
 
     def update_word(self,
@@ -242,6 +507,8 @@ class DataManager:
         db_word = self.get_word_by_id(word_id)
         if isinstance(db_word, str):
             return db_word
+        if level != db_word.level:
+            self.move_mastered_counters(word_id, db_word.level, level)
         db_word.word = word
         db_word.word_type_id = self.add_word_type(word_type).id
         db_word.english = english
@@ -249,6 +516,8 @@ class DataManager:
         if example:
             db_word.example.example = example
             db_word.example.translation = example_translation
+        self.touch_user_words(UserWord.word_id == word_id)
+        self.bump_data_versions(self.get_word_users(word_id))
         try:
             self.session.commit()
             self.session.refresh(db_word)
@@ -257,6 +526,20 @@ class DataManager:
             return error.args[0].split('\n')[1].split(':')[1].strip()
         return db_word
 
+    def move_mastered_counters(self, word_id: int, old_level: str | None, new_level: str | None) -> None:
+        """Move the mastered copies of a word from the old level's counter to the new one for every user of the
+        word, in one query and one upsert; user words with a custom level keep theirs. Committed by the caller."""
+        mastered = select(UserWord.user_id, func.count()) \
+            .outerjoin(UserWordLevel, self.user_word_join(UserWordLevel)) \
+            .where(UserWord.word_id == word_id, UserWordLevel.id.is_(None),
+                   func.coalesce(UserWord.success, 0) - func.coalesce(UserWord.fails, 0) >= MASTERED_MARGIN) \
+            .group_by(UserWord.user_id)
+        rows = []
+        for user_id, count in self.session.execute(mastered):
+            rows.append(dict(user_id=user_id, name=f'mastered:{old_level or "Unknown"}', value=-count))
+            rows.append(dict(user_id=user_id, name=f'mastered:{new_level or "Unknown"}', value=count))
+        self.upsert_counters(rows)
+
     def get_word_by_word(self, word: str, word_type: str) -> Type[Word] | str:
         try:
             db_word = (self.session.query(Word).join(WordType)
@@ -281,6 +564,143 @@ class DataManager:
         sorted_query = self.sort_query(query=query, model=UserWord, sort_by=sort_by, reverse=reverse)
         return self.slice_query(sorted_query, limit, skip)
 
+    @staticmethod
+    def user_words_select():
+        """Columns of a user word as shown in WordOut, UserWordCard and AdminUserWordOut.
+
+        Custom translation and custom or generated example override the word's ones, same as in
+        modules/serialization.py; *custom_example* is only the user's own.
+        """
+        has_custom_example = UserWordExample.id.isnot(None)
+        return select(UserWord.id, UserWord.word_id, UserWord.user_id, Word.word, WordType.name.label('word_type'),
+                      func.coalesce(UserWordTranslation.translation, Word.english).label('english'),
+                      Word.level,
+                      case((has_custom_example, UserWordExample.example), else_=WordExample.example).label('example'),
+                      case((has_custom_example, UserWordExample.translation),
+                           else_=WordExample.translation).label('example_translation'),
+                      UserWordTranslation.translation.label('custom_translation'),
+                      case((UserWordExample.generated, None), else_=UserWordExample.example).label('custom_example'),
+                      UserWordLevel.level.label('custom_level'),
+                      UserWord.fails, UserWord.success, UserWord.last_shown) \
+            .join(Word, Word.id == UserWord.word_id) \
+            .join(WordType, WordType.id == Word.word_type_id) \
+            .outerjoin(WordExample, WordExample.word_id == Word.id) \
+            .outerjoin(UserWordTranslation, DataManager.user_word_join(UserWordTranslation)) \
+            .outerjoin(UserWordExample, DataManager.user_word_join(UserWordExample)) \
+            .outerjoin(UserWordLevel, DataManager.user_word_join(UserWordLevel))
+
+    @staticmethod
+    def user_word_join(model, user_words=UserWord):
+        """Join condition of a child of users_words (translations, examples, levels, topic links) and its user word.
+
+        It includes user_id, the partition key: with users_words_partitions a join of a user's words touches only
+        the matching partition of the child table.
+        """
+        return (model.user_word_id == user_words.id) & (model.user_id == user_words.user_id)
+
+    def user_words_rows(self, query, limit: int, skip: int, sort_by: str, reverse: bool) -> list[dict]:
+        sorting = self.user_words_sort_columns[sort_by]
+        query = query.order_by(desc(sorting) if reverse else sorting, UserWord.id)
+        rows = [row._asdict() for row in self.session.execute(self.slice_select(query, limit, skip))]
+        return self.add_user_words_topics(rows)
+
+    def add_user_words_topics(self, rows: list[dict]) -> list[dict]:
+        if not rows:
+            return rows
+        topics = {}
+        for user_word_id, topic_name in self.session.execute(
+                select(UserWordTopic.user_word_id, Topic.name).join(Topic, Topic.id == UserWordTopic.topic_id)
+                .where(UserWordTopic.user_id.in_({row['user_id'] for row in rows}),
+                       UserWordTopic.user_word_id.in_([row['id'] for row in rows])).order_by(UserWordTopic.id)):
+            topics.setdefault(user_word_id, []).append(topic_name)
+        for row in rows:
+            row['topics'] = topics.get(row['id'], [])
+        return rows
+
+    def search_rows(self, query, search_text: str, fields: list[tuple], limit: int) -> list[dict]:
+        """Rows of *query* matching *search_text* in any of the (column, weight) *fields*, best matches first.
+
+        On PostgreSQL a field matches when it contains the text or a word similar to it (pg_trgm ``%>``,
+        served by the GIN indexes of add_search_indexes); the score is the best weighted word_similarity.
+        Other databases only match parts of the text and the rows are ranked in Python.
+        """
+        pattern = '%' + search_text.lower().replace('/', '//').replace('%', '/%').replace('_', '/_') + '%'
+        if self._engine.dialect.name == 'postgresql':
+            score = func.greatest(*[func.word_similarity(search_text, column) * weight for column, weight in fields])
+            matches = [column.op('%>')(search_text) | column.ilike(pattern, escape='/') for column, _ in fields]
+            query = query.add_columns(score.label('score')).where(or_(*matches)) \
+                .order_by(desc('score'), Word.id).limit(limit)
+            return [row._asdict() for row in self.session.execute(query)]
+        query = query.add_columns(*[column.label(f'search_field_{number}')
+                                    for number, (column, _) in enumerate(fields)]) \
+            .where(or_(*[func.lower(column).like(pattern, escape='/') for column, _ in fields]))
+        rows = []
+        for row in self.session.execute(query):
+            row = row._asdict()
+            row['score'] = max(word_similarity(search_text, row.pop(f'search_field_{number}')) * weight
+                               for number, (_, weight) in enumerate(fields))
+            rows.append(row)
+        rows.sort(key=lambda found_row: -found_row['score'])
+        return rows[:limit]
+
+    def search_user_words_rows(self, user_id: int, search_text: str, limit: int = 25) -> list[dict]:
+        """User words whose word, translation or example (own or custom) match *search_text*, ranked."""
+        query = self.user_words_select().where(UserWord.user_id == user_id)
+        fields = [(Word.word, 1.0), (Word.english, 0.9), (UserWordTranslation.translation, 0.9),
+                  (WordExample.example, 0.6), (UserWordExample.example, 0.6)]
+        return self.add_user_words_topics(self.search_rows(query, search_text, fields, limit))
+
+    def search_words_rows(self, search_text: str, limit: int = 25) -> list[dict]:
+        """Words of the whole dictionary whose word, translation or example match *search_text*, ranked."""
+        fields = [(Word.word, 1.0), (Word.english, 0.9), (WordExample.example, 0.6)]
+        return self.add_words_users(self.search_rows(self.words_select(), search_text, fields, limit))
+
+    search_trigram_indexes = {
+        'ix_words_word_trgm': ('words', 'word'),
+        'ix_words_english_trgm': ('words', 'english'),
+        'ix_words_examples_example_trgm': ('words_examples', 'example'),
+        'ix_users_words_translations_translation_trgm': ('users_words_translations', 'translation'),
+        'ix_users_words_examples_example_trgm': ('users_words_examples', 'example'),
+    }
+
+    def add_search_indexes(self) -> None:
+        """Enable pg_trgm and create the GIN trigram indexes used by search_rows (PostgreSQL only)."""
+        if self._engine.dialect.name != 'postgresql':
+            return
+        with self._engine.begin() as connection:
+            connection.execute(text('CREATE EXTENSION IF NOT EXISTS pg_trgm'))
+            for index_name, (table, column) in self.search_trigram_indexes.items():
+                connection.execute(text(f'CREATE INDEX IF NOT EXISTS {index_name} '
+                                        f'ON {table} USING gin ({column} gin_trgm_ops)'))
+
+    def get_user_words_rows(self, user_id: int, limit: int = 25, skip: int = 0, sort_by: str = 'id',
+                            reverse: bool = False) -> str | list[dict]:
+        """Read-only page of user words selected as plain rows, bypassing the identity map."""
+        if not self.session.query(User.id).filter_by(id=user_id).first():
+            return f'User with id={user_id} was not found.'
+        query = self.user_words_select().where(UserWord.user_id == user_id)
+        return self.user_words_rows(query, limit, skip, sort_by, reverse)
+
+    def iter_user_words(self, user_id: int, batch_size: int = 1000) -> Generator[list[UserWord], None, None]:
+        """Stream all words of a user in batches, each fetched by a query of its own (keyset pagination on the id).
+
+        Uses its own session, which is emptied after every batch, so memory does not grow with the vocabulary size.
+        """
+        query = select(UserWord).filter_by(user_id=user_id).order_by(UserWord.id).limit(batch_size).options(
+            selectinload(UserWord.word).selectinload(Word.word_type),
+            selectinload(UserWord.word).selectinload(Word.example),
+            selectinload(UserWord.user_word_topic).selectinload(UserWordTopic.topic),
+            selectinload(UserWord.custom_translation),
+            selectinload(UserWord.example),
+            selectinload(UserWord.user_level)
+        )
+        with self._session_factory() as session:
+            last_id = 0
+            while user_words := session.execute(query.where(UserWord.id > last_id)).scalars().all():
+                last_id = user_words[-1].id
+                yield user_words
+                session.expunge_all()
+
     def add_user_word(self,
                       user_id: int,
                       word: dict,
@@ -295,23 +715,32 @@ class DataManager:
             last_shown=datetime.datetime(1, 1, 1)
         )
         self.session.add(user_word)
+        self.change_word_user_count(db_word.id, 1)
         self.session.commit()
         self.session.refresh(user_word)
         if not topics:
             topics = ['Default']
         for topic in topics:
             db_topic = self.add_topic(topic)
-            self.add_user_word_topic(user_word.id, db_topic.id)
+            self.add_user_word_topic(user_word.id, db_topic.id, user_id)
         if not example and word.get('example'):
-            self.add_word_example(db_word.id, word['example'][0], word['example'][1])
+            self.add_word_example(db_word.id, word['example'][0], word['example'][1], word.get('examples'))
         elif example:
-            self.add_user_word_example(user_word.id, example, example_translation)
+            self.add_user_word_example(user_word.id, example, example_translation, user_id)
+        if word.get('inflections'):
+            self.add_word_inflections(db_word.id, word['inflections'])
         if translation:
             self.add_user_word_translation(user_word.id, translation)
+        self.session.refresh(user_word)
+        self.change_user_counters(user_id, self.user_word_counters(user_word))
+        self.bump_data_versions([user_id])
+        self.session.commit()
+        review_states.forget(user_id)
         return user_word
 
-    def add_user_word_topic(self, user_word_id: int, topic_id: int) -> UserWordTopic:
+    def add_user_word_topic(self, user_word_id: int, topic_id: int, user_id: int | None = None) -> UserWordTopic:
         user_word_topic = UserWordTopic(user_word_id=user_word_id,
+                                        user_id=user_id,
                                         topic_id=topic_id)
         try:
             self.session.add(user_word_topic)
@@ -323,23 +752,59 @@ class DataManager:
                 .filter_by(topic_id=topic_id).one()
         return user_word_topic
 
-    def add_word_example(self, word_id: int, example: str, translation: str) -> WordExample:
+    def add_word_example(self, word_id: int, example: str, translation: str,
+                         examples: list[list[str]] | None = None) -> WordExample:
         try:
             db_example = self.session.query(WordExample).filter_by(word_id=word_id).one()
+            if examples and not db_example.examples:
+                db_example.examples = examples
+                self.session.commit()
         except exc.NoResultFound:
             db_example = WordExample(
                 word_id=word_id,
                 example=example,
-                translation=translation
+                translation=translation,
+                examples=examples
             )
             self.session.add(db_example)
             self.session.commit()
             self.session.refresh(db_example)
         return db_example
 
-    def add_user_word_example(self, user_word_id: int, example: str, translation: str | None) -> UserWordExample:
+    def add_word_inflections(self, word_id: int, tables: dict[str, dict[str, str]]) -> WordInflection:
+        """Store the conjugation/declension tables of a word; tables parsed earlier are kept."""
+        try:
+            db_inflection = self.session.query(WordInflection).filter_by(word_id=word_id).one()
+        except exc.NoResultFound:
+            db_inflection = WordInflection(word_id=word_id, tables=tables)
+            self.session.add(db_inflection)
+            self.bump_data_versions(self.get_word_users(word_id))
+            self.session.commit()
+            self.session.refresh(db_inflection)
+        return db_inflection
+
+    def get_word_inflections(self, word_id: int) -> WordInflection | str:
+        """Inflection tables of a word; a word parsed without tables (the backfill stores {}) has none either."""
+        try:
+            db_inflection = self.session.query(WordInflection).filter_by(word_id=word_id).one()
+        except exc.NoResultFound:
+            return f'Inflections of the word with id={word_id} were not found.'
+        if not db_inflection.tables:
+            return f'Word with id={word_id} has no conjugation or declension tables.'
+        return db_inflection
+
+    def get_words_without_inflections(self, limit: int = 100) -> list[tuple[int, str]]:
+        """(id, word) of words that have no inflection tables yet, for the maintenance backfill."""
+        query = select(Word.id, Word.word) \
+            .where(~select(WordInflection.id).where(WordInflection.word_id == Word.id).exists()) \
+            .order_by(Word.id).limit(limit)
+        return [tuple(row) for row in self.session.execute(query)]
+
+    def add_user_word_example(self, user_word_id: int, example: str, translation: str | None,
+                              user_id: int | None = None) -> UserWordExample:
         user_word_example = UserWordExample(
             user_word_id=user_word_id,
+            user_id=user_id,
             example=example,
             translation=translation
         )
@@ -348,6 +813,66 @@ class DataManager:
         self.session.refresh(user_word_example)
         return user_word_example
 
+    def get_user_words_without_example(self, limit: int = 20, exclude_ids: set[int] | None = None) -> list[dict]:
+        """User words with neither a custom nor a generated example, with what the example generator needs to know.
+
+        *topic* is the name of the first topic of the user word ('' without topics), *level* is the user's level.
+        """
+        first_topic = select(Topic.name).join(UserWordTopic, UserWordTopic.topic_id == Topic.id) \
+            .where(self.user_word_join(UserWordTopic)).order_by(UserWordTopic.id).limit(1).scalar_subquery()
+        query = select(UserWord.id.label('user_word_id'), UserWord.user_id, Word.id.label('word_id'), Word.word,
+                       WordType.name.label('word_type'), func.coalesce(User.level, 'A1').label('level'),
+                       func.coalesce(first_topic, '').label('topic')) \
+            .join(Word, Word.id == UserWord.word_id) \
+            .join(WordType, WordType.id == Word.word_type_id) \
+            .join(User, User.id == UserWord.user_id) \
+            .where(~select(UserWordExample.id).where(self.user_word_join(UserWordExample)).exists()) \
+            .order_by(UserWord.id).limit(limit)
+        if exclude_ids:
+            query = query.where(UserWord.id.notin_(exclude_ids))
+        return [row._asdict() for row in self.session.execute(query)]
+
+    def get_generated_examples(self, keys: set[tuple[int, str, str]]) -> dict[tuple[int, str, str], tuple[str, str]]:
+        """Cached generator outputs for (word_id, level, topic) *keys*."""
+        if not keys:
+            return {}
+        query = select(GeneratedExample.word_id, GeneratedExample.level, GeneratedExample.topic,
+                       GeneratedExample.example, GeneratedExample.translation) \
+            .where(GeneratedExample.word_id.in_({key[0] for key in keys}))
+        examples = {}
+        for word_id, level, topic, example, translation in self.session.execute(query):
+            if (word_id, level, topic) in keys:
+                examples[(word_id, level, topic)] = (example, translation)
+        return examples
+
+    def add_generated_examples(self, examples: dict[tuple[int, str, str], tuple[str, str]], provider: str) -> None:
+        rows = [dict(word_id=word_id, level=level, topic=topic, example=example, translation=translation,
+                     provider=provider)
+                for (word_id, level, topic), (example, translation) in examples.items()]
+        self.insert_ignoring_duplicates(GeneratedExample, rows)
+
+    def add_user_words_examples(self, examples: list[dict]) -> None:
+        """Bulk insert generated UserWordExample rows; user words that got an example in the meantime keep theirs."""
+        self.insert_ignoring_duplicates(UserWordExample, examples)
+        if examples:
+            self.bump_data_versions([example['user_id'] for example in examples])
+            self.session.commit()
+
+    def insert_ignoring_duplicates(self, model: Type[Base], rows: list[dict]) -> None:
+        if not rows:
+            return
+        try:
+            self.session.execute(insert(model), rows)
+            self.session.commit()
+        except exc.IntegrityError:
+            self.session.rollback()
+            for row in rows:
+                try:
+                    self.session.execute(insert(model), row)
+                    self.session.commit()
+                except exc.IntegrityError:
+                    self.session.rollback()
+
     def add_user_word_translation(self, user_word_id: int, translation: str) -> UserWordTranslation | str:
         try:
             db_user_word = self.session.query(UserWord).filter_by(id=user_word_id).one()
@@ -359,6 +884,7 @@ class DataManager:
             return db_user_word.custom_translation
         user_word_translation = UserWordTranslation(
             user_word_id=user_word_id,
+            user_id=db_user_word.user_id,
             translation=translation
         )
         self.session.add(user_word_translation)
@@ -366,18 +892,20 @@ class DataManager:
         self.session.refresh(user_word_translation)
         return user_word_translation
 
-    def user_has_word(self, user_id: int, word: str, word_type: str):
-        db_word = self.get_word_by_word(word, word_type)
-        if isinstance(db_word, str):
-            return False
-        try:
-            self.session.query(UserWord).filter_by(user_id=user_id, word_id=db_word.id).one()
-            return True
-        except exc.NoResultFound:
-            return False
+    def user_has_word(self, user_id: int, word: str, word_type: str) -> bool:
+        return not isinstance(self.get_user_word_by_word(user_id, word, word_type), str)
 
-    def get_user_word_by_word(self, user_id: int, word: str) -> str | Type[UserWord]:
-        pass
+    def get_user_word_by_word(self, user_id: int, word: str, word_type: str | None = None
+                              ) -> str | Type[UserWord]:
+        """The user's (first) user word of *word*, compared case-insensitively, of *word_type* if given."""
+        query = self.session.query(UserWord).join(Word, Word.id == UserWord.word_id) \
+            .filter(UserWord.user_id == user_id, func.lower(Word.word) == word.lower())
+        if word_type:
+            query = query.join(WordType, WordType.id == Word.word_type_id).filter(WordType.name == word_type)
+        user_word = query.order_by(UserWord.id).first()
+        if user_word is None:
+            return f'User with id={user_id} has no word "{word}".'
+        return user_word
 
     def user_word_has_translation(self, user_word_id: int) -> bool:
         try:
@@ -395,6 +923,7 @@ class DataManager:
         else:
             user_level = UserWordLevel(
                 user_word_id=user_word_id,
+                user_id=db_user_word.user_id,
                 level=level
             )
             self.session.add(user_level)
@@ -413,6 +942,7 @@ class DataManager:
         db_user_word = self.get_user_word_by_id(user_word_id)
         if isinstance(db_user_word, str):
             return db_user_word
+        counters_before = self.user_word_counters(db_user_word)
         if db_user_word.word.non_parsed_word:
             db_user_word.word.word = word
             db_user_word.word.english = english
@@ -423,6 +953,8 @@ class DataManager:
             if isinstance(db_word, Word):  # user adds a word that is present in db
                 old_word = self.session.query(Word).filter_by(id=db_user_word.word_id).one()
                 db_user_word.word_id = db_word.id
+                self.change_word_user_count(old_word.id, -1)
+                self.change_word_user_count(db_word.id, 1)
                 try:
                     self.session.query(UserWord).filter_by(word_id=old_word.id) \
                         .filter(UserWord.user_id.op('!=')(db_user_word.user_id)).first()
@@ -431,6 +963,7 @@ class DataManager:
                 if english != db_word.english and not db_user_word.custom_translation:
                     user_translation = UserWordTranslation(
                         user_word_id=user_word_id,
+                        user_id=db_user_word.user_id,
                         translation=english
                     )
                     self.session.add(user_translation)
@@ -442,6 +975,8 @@ class DataManager:
                 new_word = get_word_info_from_search(word, word_type)  # user adds new word
                 if isinstance(new_word, dict):  # user adds parsed word
                     db_new_word = self.add_new_word(new_word)
+                    self.change_word_user_count(db_user_word.word_id, -1)
+                    self.change_word_user_count(db_new_word.id, 1)
                     db_user_word.word_id = db_new_word.id
         else:
             if level != db_user_word.word.level:
@@ -449,21 +984,32 @@ class DataManager:
             if english != db_user_word.word.english:
                 self.add_user_word_translation(db_user_word.id, english)
             if not db_user_word.example:
-                self.add_user_word_example(db_user_word.id, example, example_translation)
+                self.add_user_word_example(db_user_word.id, example, example_translation, db_user_word.user_id)
             if example != db_user_word.example.example or example_translation != db_user_word.example.translation:
                 db_user_word.example.example = example
                 db_user_word.example.translation = example_translation
-        previous_user_word_topics = self.session.query(UserWordTopic).filter_by(user_word_id=user_word_id).all()
+                db_user_word.example.generated = False
+        previous_user_word_topics = self.session.query(UserWordTopic) \
+            .filter_by(user_id=db_user_word.user_id, user_word_id=user_word_id).all()
+        previous_topic_ids = [previous_topic.topic_id for previous_topic in previous_user_word_topics]
         for previous_topic in previous_user_word_topics:
             self.session.delete(previous_topic)
         for topic in topics:
-            self.add_user_word_topic(db_user_word.id, self.add_topic(topic).id)
+            self.add_user_word_topic(db_user_word.id, self.add_topic(topic).id, db_user_word.user_id)
+        # deleted topic links leave no updated_at behind
+        db_user_word.updated_at = datetime.datetime.now()
         try:
             self.session.commit()
             self.session.refresh(db_user_word)
         except exc.IntegrityError as error:
             self.session.rollback()
             return error.args[0].split('\n')[1].split(':')[1].strip()
+        self.change_user_counters(db_user_word.user_id,
+                                  counters_delta(counters_before, self.user_word_counters(db_user_word)))
+        self.add_topic_tombstones(db_user_word.user_id, previous_topic_ids)
+        self.bump_data_versions([db_user_word.user_id])
+        self.session.commit()
+        review_states.forget(db_user_word.user_id)
         return db_user_word
 
     def add_new_word(self, word: dict) -> Word:
@@ -471,6 +1017,7 @@ class DataManager:
         if isinstance(db_word, Word) and db_word.word_type.name == word.get('word_type'):
             return db_word
         word_type = self.add_word_type(word['word_type'])
+        self.purge_deleted(Word, (Word.word == word['word']) & (Word.word_type_id == word_type.id))
         new_word = Word(
             word=word['word'],
             word_type_id=word_type.id,
@@ -495,8 +1042,18 @@ class DataManager:
     def remove_user_word(self, user_word_id) -> UserWord | str:
         try:
             db_user_word = self.session.query(UserWord).filter_by(id=user_word_id).one()
-            self.session.delete(db_user_word)
+            user_id = db_user_word.user_id
+            topic_ids = [link.topic_id for link in db_user_word.user_word_topic]
+            self.change_word_user_count(db_user_word.word_id, -1)
+            self.change_user_counters(user_id, counters_delta(self.user_word_counters(db_user_word), {}))
+            self.bump_data_versions([user_id])
+            self.delete_user_words([user_word_id], {user_id})
+            # the rows are gone: the returned object must not be refreshed after the commit
+            self.session.expunge(db_user_word)
+            self.add_sync_tombstones(user_id, 'word', [user_word_id])
+            self.add_topic_tombstones(user_id, topic_ids)
             self.session.commit()
+            review_states.forget(user_id)
         except exc.NoResultFound:
             db_user_word = f'No user word with id={user_word_id} was found.'
         return db_user_word
@@ -548,13 +1105,17 @@ class DataManager:
 
         sorting = model.__dict__.get(sort_by)
         if model == Word and sort_by == 'word':
-            sorting = func.regexp_replace(Word.word, r'(der |die |das |der, |das, )', '', 'g')
+            sorting = WORD_SORT_KEY
         return query.order_by(desc(sorting)) if reverse else query.order_by(sorting)
 
     @staticmethod
     def slice_query(query, limit: int, skip: int = 0):
         return query.slice(limit * skip, limit * (skip + 1)).all()
 
+    @staticmethod
+    def slice_select(query, limit: int, skip: int = 0):
+        return query.limit(limit).offset(limit * skip)
+
     def get_user_topic_words(self,
                              user_id: int,
                              topic_id: int,
@@ -577,57 +1138,244 @@ class DataManager:
             return f'User with id={user_id} has no words in topic with id={topic_id}.'
         return user_topic_words
 
+    def get_user_topic_words_rows(self,
+                                  user_id: int,
+                                  topic_id: int,
+                                  limit: int = 25,
+                                  skip: int = 0,
+                                  sort_by: str = 'id',
+                                  reverse: bool = False) -> str | list[dict]:
+        """Read-only page of user words in a topic selected as plain rows, bypassing the identity map."""
+        if not self.session.query(User.id).filter_by(id=user_id).first():
+            return f'User with user_id={user_id} was not found.'
+        if not self.session.query(Topic.id).filter_by(id=topic_id).first():
+            return f'Topic with topic_id={topic_id} was not found.'
+        query = self.user_words_select().where(UserWord.user_id == user_id).where(
+            UserWord.id.in_(select(UserWordTopic.user_word_id).where(self.user_topic_links(user_id, topic_id))))
+        user_topic_words = self.user_words_rows(query, limit, skip, sort_by, reverse)
+        if not user_topic_words:
+            return f'User with id={user_id} has no words in topic with id={topic_id}.'
+        return user_topic_words
+
+    def user_topic_links(self, user_id: int, topic_id: int):
+        """Condition selecting users_words_topics rows that link words of *user_id* to *topic_id*."""
+        return (UserWordTopic.user_id == user_id) & (UserWordTopic.topic_id == topic_id)
+
+    def other_user_uses_topic(self, user_id: int, topic_id: int) -> bool:
+        return bool(self.session.query(UserWordTopic.id).filter_by(topic_id=topic_id).join(UserWord)
+                    .filter(UserWord.user_id != user_id).first())
+
     def delete_user_topic(self, user_id: int, topic_id: int) -> str | Type[Topic]:
-        try:
-            user_topic = self.session.query(Topic).filter_by(id=topic_id).join(UserWordTopic) \
-                .join(UserWord).filter_by(user_id=user_id).one()
-        except exc.NoResultFound:
+        user_topic = self.session.query(Topic).filter_by(id=topic_id).filter(
+            Topic.id.in_(select(UserWordTopic.topic_id).where(self.user_topic_links(user_id, topic_id)))).first()
+        if not user_topic:
             return f'User topic for user_id={user_id} and topic_id={topic_id} was not found.'
-        other_user_uses_topic = bool(self.session.query(Topic).filter_by(id=topic_id).join(UserWordTopic)
-                                     .join(UserWord).filter(UserWord.user_id != user_id).first())
-        if not other_user_uses_topic:
-            self.session.delete(user_topic)
-            self.session.commit()
-            return user_topic
-        user_topic_words = self.session.query(UserWordTopic).filter_by(topic_id=topic_id) \
-            .join(UserWord).filter_by(user_id=user_id).all()
-        self.session.delete(user_topic_words)
+        other_user_uses_topic = self.other_user_uses_topic(user_id, topic_id)
+        self.session.expunge(user_topic)
+        self.touch_user_topic_words(user_id, topic_id)
+        if other_user_uses_topic:
+            self.session.execute(delete(UserWordTopic).where(self.user_topic_links(user_id, topic_id))
+                                 .execution_options(synchronize_session=False))
+        else:
+            # soft delete: the links are hidden with the topic and removed by the reaper
+            self.session.execute(update(Topic).where(Topic.id == topic_id).values(deleted_at=datetime.datetime.now())
+                                 .execution_options(synchronize_session=False))
+        self.add_sync_tombstones(user_id, 'topic', [topic_id])
+        self.bump_data_versions([user_id])
         self.session.commit()
+        self.recount_user_counters(user_id)
+        review_states.forget(user_id)
         return user_topic
 
     def update_user_topic(self, user_id: int, topic_id: int, topic_name: str) -> str | Type[Topic]:
-        user_topic_word = self.session.query(UserWordTopic).filter_by(topic_id=topic_id) \
-            .join(UserWord).filter_by(user_id=user_id).first()
+        user_topic_word = self.session.query(UserWordTopic.id).filter(self.user_topic_links(user_id, topic_id)).first()
         if not user_topic_word:
             return f'User with user_id={user_id} has no words in topic with topic_id={topic_id}.'
-        other_user_uses_topic = bool(self.session.query(Topic).filter_by(id=topic_id).join(UserWordTopic)
-                                     .join(UserWord).filter(UserWord.user_id != user_id).first())
-        if other_user_uses_topic:
-            db_topic = self.add_topic(topic_name)
-            for user_word in self.get_user_topic_words(user_id, topic_id, 100000):
-                user_word.user_word_topic[0].topic_id = db_topic.id
-            self.session.commit()
-            return db_topic
-        db_topic = self.session.query(Topic).filter_by(id=topic_id).one()
-        db_topic.name = topic_name
-        try:
+        db_topic = self.session.query(Topic).filter_by(name=topic_name).first()
+        if not db_topic:
+            self.purge_deleted(Topic, Topic.name == topic_name)
+        if not db_topic and not self.other_user_uses_topic(user_id, topic_id):
+            db_topic = self.session.query(Topic).filter_by(id=topic_id).one()
+            db_topic.name = topic_name
+            self.touch_user_topic_words(user_id, topic_id)
+            self.bump_data_versions([user_id])
             self.session.commit()
             self.session.refresh(db_topic)
-        except exc.IntegrityError as error:
-            self.session.rollback()
-            return error.args[0].split('\n')[1].split(':')[1].strip()
+            return db_topic
+        if not db_topic:
+            db_topic = Topic(name=topic_name)
+            self.session.add(db_topic)
+            self.session.flush()
+        if db_topic.id == topic_id:
+            return db_topic
+        self.touch_user_topic_words(user_id, topic_id)
+        # words already linked to the target topic would violate _unique_user_word_topic after re-pointing
+        self.session.execute(delete(UserWordTopic).where(self.user_topic_links(user_id, topic_id)).where(
+            UserWordTopic.user_word_id.in_(select(UserWordTopic.user_word_id)
+                                           .where(self.user_topic_links(user_id, db_topic.id)).scalar_subquery())
+        ).execution_options(synchronize_session=False))
+        self.session.execute(update(UserWordTopic).where(self.user_topic_links(user_id, topic_id))
+                             .values(topic_id=db_topic.id).execution_options(synchronize_session=False))
+        if not self.session.query(UserWordTopic.id).filter_by(topic_id=topic_id).first():
+            # no one else has the old topic: soft deleted as in delete_user_topic
+            self.session.execute(update(Topic).where(Topic.id == topic_id).values(deleted_at=datetime.datetime.now())
+                                 .execution_options(synchronize_session=False))
+        self.add_sync_tombstones(user_id, 'topic', [topic_id])
+        self.bump_data_versions([user_id])
+        self.session.commit()
+        self.session.refresh(db_topic)
+        self.recount_user_counters(user_id)
+        review_states.forget(user_id)
         return db_topic
 
     def update_card(self, user_word_id, shown_time, guess) -> str | UserWord:
         db_user_word = self.get_user_word_by_id(user_word_id)
         if isinstance(db_user_word, str):
             return db_user_word
+        counters_before = self.user_word_counters(db_user_word)
         db_user_word.last_shown = shown_time
         setattr(db_user_word, guess, getattr(db_user_word, guess) + 1)
+        # the next review shows the next stored example of the word
+        db_user_word.example_index += 1
+        self.change_user_counters(db_user_word.user_id, {
+            **counters_delta(counters_before, self.user_word_counters(db_user_word)),
+            'reviews': 1, 'successes': int(guess == 'success')
+        })
+        self.record_review_day(db_user_word.user_id, shown_time.date())
+        self.bump_data_versions([db_user_word.user_id])
         self.session.commit()
         self.session.refresh(db_user_word)
+        review_states.answer(db_user_word.user_id, db_user_word.id, shown_time, guess)
         return db_user_word
 
+    def update_cards(self, user_id: int, answers: list[tuple[int, datetime.datetime, str]]) -> list[UserWord]:
+        """Apply (user_word_id, shown_time, guess) answers of one user in one transaction.
+
+        Answers to words of other users or to removed words are skipped; returns the updated user words.
+        """
+        query = select(UserWord).where(UserWord.id.in_({answer[0] for answer in answers}),
+                                       UserWord.user_id == user_id).options(
+            selectinload(UserWord.word), selectinload(UserWord.user_word_topic), selectinload(UserWord.user_level))
+        user_words = {user_word.id: user_word for user_word in self.session.execute(query).scalars()}
+        counters_before = {user_word_id: self.user_word_counters(user_word)
+                           for user_word_id, user_word in user_words.items()}
+        applied = []
+        for user_word_id, shown_time, guess in answers:
+            db_user_word = user_words.get(user_word_id)
+            if db_user_word is None:
+                continue
+            db_user_word.last_shown = shown_time
+            setattr(db_user_word, guess, getattr(db_user_word, guess) + 1)
+            db_user_word.example_index += 1
+            applied.append((user_word_id, shown_time, guess))
+        if not applied:
+            return []
+        delta = {'reviews': len(applied), 'successes': sum(guess == 'success' for _, _, guess in applied)}
+        for user_word_id, before in counters_before.items():
+            for name, value in counters_delta(before, self.user_word_counters(user_words[user_word_id])).items():
+                delta[name] = delta.get(name, 0) + value
+        self.change_user_counters(user_id, delta)
+        for day in sorted({shown_time.date() for _, shown_time, _ in applied}):
+            self.record_review_day(user_id, day)
+        self.bump_data_versions([user_id])
+        self.session.commit()
+        for user_word_id, shown_time, guess in applied:
+            review_states.answer(user_id, user_word_id, shown_time, guess)
+        return [user_words[user_word_id] for user_word_id in dict.fromkeys(answer[0] for answer in applied)]
+
+    @staticmethod
+    def user_word_counters(user_word: UserWord) -> dict[str, int]:
+        level = user_word.user_level.level if user_word.user_level else user_word.word.level
+        return user_word_counters(level, [link.topic_id for link in user_word.user_word_topic],
+                                  user_word.fails, user_word.success)
+
+    def get_user_counters(self, user_id: int, names: list[str] | None = None) -> dict[str, int]:
+        query = select(UserCounter.name, UserCounter.value).where(UserCounter.user_id == user_id)
+        if names:
+            query = query.where(UserCounter.name.in_(names))
+        return dict(self.session.execute(query).all())
+
+    def change_user_counters(self, user_id: int, values: dict[str, int], increment: bool = True) -> None:
+        """Add *values* to the user's counters (or set them with increment=False); committed by the caller."""
+        values = {name: value for name, value in values.items() if value or not increment}
+        self.upsert_counters([dict(user_id=user_id, name=name, value=value) for name, value in values.items()],
+                             increment)
+
+    def bump_data_versions(self, user_ids) -> None:
+        """Mark the words, topics and cards of *user_ids* as changed for ETags; committed by the caller."""
+        self.upsert_counters([dict(user_id=user_id, name='data_version', value=1) for user_id in set(user_ids)])
+
+    def get_data_version(self, user_id: int) -> int:
+        return self.session.execute(select(UserCounter.value).where(UserCounter.user_id == user_id,
+                                                                    UserCounter.name == 'data_version')
+                                    ).scalar() or 0
+
+    def upsert_counters(self, rows: list[dict], increment: bool = True) -> None:
+        if not rows:
+            return
+        dialect_insert = {'postgresql': postgresql.insert, 'sqlite': sqlite.insert}.get(self._engine.dialect.name)
+        if dialect_insert:
+            statement = dialect_insert(UserCounter).values(rows)
+            new_value = UserCounter.value + statement.excluded.value if increment else statement.excluded.value
+            self.session.execute(statement.on_conflict_do_update(index_elements=['user_id', 'name'],
+                                                                 set_={'value': new_value}))
+            return
+        for row in rows:
+            new_value = UserCounter.value + row['value'] if increment else row['value']
+            result = self.session.execute(update(UserCounter).where(UserCounter.user_id == row['user_id'],
+                                                                    UserCounter.name == row['name'])
+                                          .values(value=new_value).execution_options(synchronize_session=False))
+            if not result.rowcount:
+                self.session.execute(insert(UserCounter), row)
+
+    def record_review_day(self, user_id: int, day: datetime.date) -> None:
+        """Continue, start or keep the user's daily streak; committed by the caller."""
+        streak = next_streak(self.get_user_counters(user_id, ['streak', 'longest_streak', 'last_review_day']), day)
+        if streak:
+            self.change_user_counters(user_id, streak, increment=False)
+            self.session.execute(update(User).where(User.id == user_id).values(streak=streak['streak'])
+                                 .execution_options(synchronize_session=False))
+
+    def recount_user_counters(self, user_id: int, reviews: bool = False) -> None:
+        """Count the word, topic and mastered counters of the user from users_words again.
+
+        Used after changes touching many user words at once (topics, deleted words). Review counters include
+        answers to words removed since, so they are only recounted (from users_words.fails/success) with
+        *reviews* (maintenance --stats); streak counters are always kept.
+        """
+        user_words = select(UserWord).where(UserWord.user_id == user_id).subquery()
+        words, answers, successes = self.session.execute(
+            select(func.count(user_words.c.id), func.sum(func.coalesce(user_words.c.fails, 0)
+                                                         + func.coalesce(user_words.c.success, 0)),
+                   func.sum(func.coalesce(user_words.c.success, 0)))).one()
+        counters = {'words': words}
+        if reviews:
+            counters.update({'reviews': answers or 0, 'successes': successes or 0})
+        topics = select(UserWordTopic.topic_id, func.count()) \
+            .join(user_words, self.user_word_join(UserWordTopic, user_words.c)) \
+            .where(UserWordTopic.user_id == user_id).group_by(UserWordTopic.topic_id)
+        counters.update({f'topic:{topic_id}': count for topic_id, count in self.session.execute(topics)})
+        level = func.coalesce(UserWordLevel.level, Word.level, 'Unknown')
+        mastered = select(level, func.count()).select_from(user_words) \
+            .join(Word, Word.id == user_words.c.word_id) \
+            .outerjoin(UserWordLevel, self.user_word_join(UserWordLevel, user_words.c)) \
+            .where(func.coalesce(user_words.c.success, 0) - func.coalesce(user_words.c.fails, 0) >= MASTERED_MARGIN) \
+            .group_by(level)
+        counters.update({f'mastered:{level}': count for level, count in self.session.execute(mastered)})
+        self.session.execute(delete(UserCounter).where(
+            UserCounter.user_id == user_id,
+            or_(UserCounter.name.startswith('topic:'), UserCounter.name.startswith('mastered:'))
+        ))
+        self.change_user_counters(user_id, counters, increment=False)
+        self.session.commit()
+
+    def get_user_stats(self, user_id: int) -> dict:
+        counters = self.get_user_counters(user_id)
+        topic_ids = [int(name.removeprefix('topic:')) for name in counters if name.startswith('topic:')]
+        topic_names = dict(self.session.execute(select(Topic.id, Topic.name).where(Topic.id.in_(topic_ids))).all()) \
+            if topic_ids else {}
+        return stats_from_counters(counters, topic_names, datetime.date.today())
+
     def get_random_user_words(self, user_id: int, limit: int = 25) -> str | list[Type[UserWord]]:
         db_user = self.get_user_by_id(user_id)
         if isinstance(db_user, str):
@@ -639,42 +1387,409 @@ class DataManager:
             return f'User with id={user_id} has no words.'
         return user_words
 
-    def get_user_cards(self, user_id: int, topic_id: int | None, limit: int = 25, random: bool = False
-                       ) -> str | list[Type[UserWord]]:
+    def load_review_state(self, user_id: int) -> ReviewState:
+        rows = self.session.execute(select(UserWord.id, UserWord.word_id, UserWord.fails, UserWord.success,
+                                           UserWord.last_shown).where(UserWord.user_id == user_id)).all()
+        topic_links = self.session.execute(select(UserWordTopic.user_word_id, UserWordTopic.topic_id)
+                                           .join(UserWord, self.user_word_join(UserWordTopic))
+                                           .where(UserWordTopic.user_id == user_id)).all()
+        return ReviewState(rows, topic_links)
+
+    def get_user_words_by_ids(self, user_word_ids: list[int], user_id: int | None = None) -> list[UserWord]:
+        """User words in the order of *user_word_ids*, with everything a card shows loaded in a few queries."""
+        if not user_word_ids:
+            return []
+        query = select(UserWord).where(UserWord.id.in_(user_word_ids)).options(
+            selectinload(UserWord.word).selectinload(Word.word_type),
+            selectinload(UserWord.word).selectinload(Word.example),
+            selectinload(UserWord.user_word_topic).selectinload(UserWordTopic.topic),
+            selectinload(UserWord.custom_translation),
+            selectinload(UserWord.example),
+            selectinload(UserWord.user_level)
+        )
+        if user_id is not None:
+            query = query.where(UserWord.user_id == user_id)
+        user_words = {user_word.id: user_word for user_word in self.session.execute(query).scalars()}
+        return [user_words[user_word_id] for user_word_id in user_word_ids if user_word_id in user_words]
+
+    def get_user_cards(self, user_id: int, topic_id: int | None, limit: int = 25, random: bool = False,
+                       scoring: str = CARD_SCORING) -> str | list[Type[UserWord]]:
+        """Cards to review next, chosen by the *scoring* function (modules/review_state.py) or at random."""
         db_user = self.get_user_by_id(user_id)
         if isinstance(db_user, str):
             return db_user
-        query = self.session.query(UserWord).filter_by(user_id=user_id)
         if topic_id:
             db_topic = self.get_topic_by_id(topic_id)
             if isinstance(db_topic, str):
                 return db_topic
-            query = query.join(UserWordTopic).filter_by(topic_id=topic_id)
         if random:
-            sorted_query = query.order_by(func.random())
+            query = self.session.query(UserWord).filter_by(user_id=user_id)
+            if topic_id:
+                query = query.join(UserWordTopic).filter_by(topic_id=topic_id)
+            return self.slice_query(query.order_by(func.random()), limit)
+        if not topic_id:
+            deck_cards = self.get_daily_deck_cards(user_id, datetime.date.today(), limit)
+            if deck_cards:
+                return self.get_user_words_by_ids(deck_cards, user_id)
+        review_state = review_states.get(user_id, self.load_review_state)
+        return self.get_user_words_by_ids(review_state.top(limit, scorers[scoring], topic_id), user_id)
+
+    def add_review_events(self, events: list[dict]) -> None:
+        """Append review events; SQLAlchemy sends the rows as multi-row INSERTs ("insertmanyvalues")."""
+        self.insert_ignoring_duplicates(ReviewEvent, events)
+
+    def get_review_events(self, user_id: int, since: datetime.datetime, until: datetime.datetime | None = None
+                          ) -> list[ReviewEvent]:
+        """Review events of the user shown in [since, until), oldest first; scans only the partitions in range."""
+        query = select(ReviewEvent).where(ReviewEvent.user_id == user_id, ReviewEvent.shown_at >= since)
+        if until:
+            query = query.where(ReviewEvent.shown_at < until)
+        return list(self.session.execute(query.order_by(ReviewEvent.shown_at)).scalars())
+
+    def add_review_events_partitions(self, months_ahead: int = 2) -> None:
+        """Create monthly review_events partitions from the current month on, plus a default one (PostgreSQL).
+
+        Run it at least monthly (maintenance --migrate): rows of months without a partition go to the default
+        partition, which isn't pruned from time-range scans.
+        """
+        if self._engine.dialect.name != 'postgresql':
+            return
+        month = datetime.date.today().replace(day=1)
+        with self._engine.begin() as connection:
+            connection.execute(text('CREATE TABLE IF NOT EXISTS review_events_default '
+                                    'PARTITION OF review_events DEFAULT'))
+            for _ in range(months_ahead + 1):
+                next_month = (month + datetime.timedelta(days=32)).replace(day=1)
+                connection.execute(text(f'CREATE TABLE IF NOT EXISTS review_events_{month:%Y_%m} '
+                                        f"PARTITION OF review_events FOR VALUES FROM ('{month}') TO ('{next_month}')"))
+                month = next_month
+
+    users_words_tables = [model.__table__ for model in (UserWord, *USER_WORD_CHILDREN)]
+
+    def users_words_partitioned(self, connection) -> bool:
+        return connection.execute(text("SELECT relkind FROM pg_class WHERE oid = to_regclass('users_words')")
+                                  ).scalar() == 'p'
+
+    def add_users_words_partitions(self) -> None:
+        """Create the users_words_partitions hash partitions of the users_words family (PostgreSQL).
+
+        Tables created before users_words_partitions was set stay as they are until partition_users_words.
+        """
+        if self._engine.dialect.name != 'postgresql' or not PARTITIONED:
+            return
+        with self._engine.begin() as connection:
+            if not self.users_words_partitioned(connection):
+                logger.warning('users_words is not partitioned, run data/maintenance.py --partition-users-words')
+                return
+            self.create_users_words_partitions(connection)
+
+    def create_users_words_partitions(self, connection) -> None:
+        for table in self.users_words_tables:
+            for remainder in range(USERS_WORDS_PARTITIONS):
+                connection.execute(text(f'CREATE TABLE IF NOT EXISTS {table.name}_p{remainder} PARTITION OF '
+                                        f'{table.name} FOR VALUES WITH (MODULUS {USERS_WORDS_PARTITIONS}, '
+                                        f'REMAINDER {remainder})'))
+
+    def partition_users_words(self) -> bool:
+        """Move the users_words family of an existing database into hash-partitioned tables (PostgreSQL).
+
+        The tables are renamed, created again partitioned by user_id, filled with INSERT ... SELECT and the old
+        ones dropped, all in one transaction: writes to the tables wait until it is done, so run it in a
+        maintenance window. Returns False when there is nothing to do. The number of partitions can't be
+        changed afterwards without moving the rows again.
+        """
+        if self._engine.dialect.name != 'postgresql' or not PARTITIONED:
+            return False
+        self.add_user_word_user_id_columns()
+        with self._engine.begin() as connection:
+            if self.users_words_partitioned(connection):
+                return False
+            for table in self.users_words_tables:
+                old_name = f'{table.name}_unpartitioned'
+                connection.execute(text(f'ALTER TABLE {table.name} RENAME TO {old_name}'))
+                # index names are unique per schema: the new tables get the same ones
+                indexes = connection.execute(text('SELECT indexname FROM pg_indexes WHERE tablename = :table'),
+                                             {'table': old_name}).scalars().all()
+                for number, index in enumerate(indexes):
+                    connection.execute(text(f'ALTER INDEX "{index}" RENAME TO {old_name}_{number}'))
+            Base.metadata.create_all(connection, tables=self.users_words_tables)
+            self.create_users_words_partitions(connection)
+            for table in self.users_words_tables:
+                columns = ', '.join(column.name for column in table.columns)
+                connection.execute(text(f'INSERT INTO {table.name} ({columns}) '
+                                        f'SELECT {columns} FROM {table.name}_unpartitioned'))
+            for table in reversed(self.users_words_tables):
+                connection.execute(text(f'DROP TABLE {table.name}_unpartitioned'))
+            for table in self.users_words_tables:
+                connection.execute(text(f'ANALYZE {table.name}'))
+        self.add_search_indexes()
+        return True
+
+    def add_user_word_user_id_columns(self) -> None:
+        """Add user_id, filled from users_words, with its index to the users_words child tables of an existing
+        database (PostgreSQL). Topic links without a user word are dropped."""
+        with self._engine.begin() as connection:
+            for model in USER_WORD_CHILDREN:
+                table = model.__tablename__
+                connection.execute(text(f'ALTER TABLE {table} ADD COLUMN IF NOT EXISTS user_id INTEGER'))
+                connection.execute(text(f'UPDATE {table} SET user_id = users_words.user_id FROM users_words '
+                                        f'WHERE users_words.id = {table}.user_word_id AND {table}.user_id IS NULL'))
+                connection.execute(text(f'DELETE FROM {table} WHERE user_id IS NULL'))
+                connection.execute(text(f'ALTER TABLE {table} ALTER COLUMN user_id SET NOT NULL'))
+                connection.execute(text(f'CREATE INDEX IF NOT EXISTS ix_{table}_user_id '
+                                        f'ON {table} (user_id, user_word_id)'))
+
+    def get_user_ids(self) -> list[int]:
+        return list(self.session.execute(select(User.id).order_by(User.id)).scalars())
+
+    def get_active_user_ids(self, since: datetime.datetime) -> list[int]:
+        return list(self.session.execute(select(User.id).where(User.last_activity >= since).order_by(User.id))
+                    .scalars())
+
+    def get_review_rows(self, user_ids: list[int]) -> list[tuple]:
+        """(user_id, user_word_id, word_id, fails, success, last_shown) of all words of *user_ids*, by user."""
+        query = select(UserWord.user_id, UserWord.id, UserWord.word_id, UserWord.fails, UserWord.success,
+                       UserWord.last_shown).where(UserWord.user_id.in_(user_ids)) \
+            .order_by(UserWord.user_id, UserWord.id)
+        return [tuple(row) for row in self.session.execute(query)]
+
+    def save_daily_decks(self, decks: list[dict]) -> None:
+        """Replace the decks of the users in *decks* (cards as lists of user word ids)."""
+        if not decks:
+            return
+        self.session.execute(delete(DailyDeck).where(DailyDeck.user_id.in_([deck['user_id'] for deck in decks])))
+        self.session.execute(insert(DailyDeck), [{**deck, 'cards': pack_ids(deck['cards'])} for deck in decks])
+        self.bump_data_versions([deck['user_id'] for deck in decks])
+        self.session.commit()
+
+    def get_daily_deck_cards(self, user_id: int, deck_date: datetime.date, limit: int) -> list[int]:
+        """First *limit* cards of the user's deck for *deck_date* not answered since the deck was built."""
+        deck = self.session.execute(select(DailyDeck.cards, DailyDeck.created_at)
+                                    .where(DailyDeck.user_id == user_id, DailyDeck.deck_date == deck_date)).first()
+        if not deck:
+            return []
+        cards = unpack_ids(deck.cards)
+        pending = set(self.session.execute(select(UserWord.id).where(UserWord.user_id == user_id,
+                                                                     UserWord.id.in_(cards),
+                                                                     UserWord.last_shown < deck.created_at))
+                      .scalars())
+        return [user_word_id for user_word_id in cards if user_word_id in pending][:limit]
+
+    def touch_user_words(self, condition) -> None:
+        """Mark user words as changed for delta sync when a row of theirs was deleted; committed by the caller."""
+        self.session.execute(update(UserWord).where(condition).values(updated_at=datetime.datetime.now())
+                             .execution_options(synchronize_session=False))
+
+    def touch_user_topic_words(self, user_id: int, topic_id: int) -> None:
+        """Mark the user's words in the topic as changed for delta sync; committed by the caller."""
+        self.touch_user_words((UserWord.user_id == user_id) & UserWord.id.in_(
+            select(UserWordTopic.user_word_id).where(self.user_topic_links(user_id, topic_id))))
+
+    def add_sync_tombstones(self, user_id: int, kind: str, object_ids) -> None:
+        """Committed by the caller."""
+        now = datetime.datetime.now()
+        rows = [dict(user_id=user_id, kind=kind, object_id=object_id, deleted_at=now) for object_id in set(object_ids)]
+        if rows:
+            self.session.execute(insert(SyncTombstone), rows)
+
+    def add_topic_tombstones(self, user_id: int, topic_ids) -> None:
+        """Tombstones for those of *topic_ids* the user has no words in any more; committed by the caller."""
+        topic_ids = set(topic_ids)
+        if not topic_ids:
+            return
+        self.session.flush()
+        kept = self.session.execute(select(UserWordTopic.topic_id).distinct()
+                                    .join(UserWord, self.user_word_join(UserWordTopic))
+                                    .where(UserWordTopic.user_id == user_id, UserWordTopic.topic_id.in_(topic_ids))
+                                    ).scalars()
+        self.add_sync_tombstones(user_id, 'topic', topic_ids - set(kept))
+
+    def changed_user_word_ids(self, user_id: int, since: datetime.datetime):
+        """Ids of the user's words changed after *since*, found through the updated_at indexes of the family."""
+        queries = [select(UserWord.id).where(UserWord.user_id == user_id, UserWord.updated_at > since)]
+        for model in USER_WORD_CHILDREN:
+            queries.append(select(model.user_word_id).join(UserWord, self.user_word_join(model))
+                           .where(model.updated_at > since, model.user_id == user_id))
+        return union(*queries)
+
+    def get_user_changes(self, user_id: int, token_time: datetime.datetime | None) -> dict:
+        """Words and topics of the user changed or deleted since the sync at *token_time* (modules/sync.py)."""
+        now = datetime.datetime.now()
+        since = changes_since(token_time, now)
+        if since is None:
+            user_word_ids = select(UserWord.id).where(UserWord.user_id == user_id)
         else:
-            sorting = (UserWord.fails * 2) + (UserWord.success * -1) \
-                      + func.extract('epoch', (func.now() - UserWord.last_shown)) * 0.5
-            sorted_query = query.order_by(desc(sorting))
-        try:
-            user_cards = self.slice_query(sorted_query, limit)
-        except exc.NoResultFound:
-            return f'User with id={user_id} has no word in topic with id={topic_id}' if topic_id \
-                else f'User with id={user_id} has no words.'
-        return user_cards
-
-
-load_dotenv()
-url_object = URL.create(
-    drivername=os.getenv('db_drivername'),
-    username=os.getenv('db_username'),
-    password=os.getenv('db_password'),
-    host=os.getenv('db_host'),
-    port=os.getenv('db_port'),
-    database=os.getenv('db_database')
-)
-
-db_manager = DataManager(url_object)
+            user_word_ids = self.changed_user_word_ids(user_id, since)
+        query = self.user_words_select().where(UserWord.id.in_(user_word_ids)).order_by(UserWord.id)
+        words = self.add_user_words_topics([row._asdict() for row in self.session.execute(query)])
+        topics = self.session.execute(select(Topic.id, Topic.name).distinct()
+                                      .join(UserWordTopic, UserWordTopic.topic_id == Topic.id)
+                                      .where(UserWordTopic.user_id == user_id,
+                                             UserWordTopic.user_word_id.in_(user_word_ids)).order_by(Topic.id)).all()
+        deleted = {'word': set(), 'topic': set()}
+        if since is not None:
+            for kind, object_id in self.session.execute(
+                    select(SyncTombstone.kind, SyncTombstone.object_id)
+                    .where(SyncTombstone.user_id == user_id, SyncTombstone.deleted_at > since)):
+                deleted[kind].add(object_id)
+            # a topic removed and then used again is not deleted
+            deleted['topic'] -= set(self.session.execute(
+                select(UserWordTopic.topic_id).join(UserWord, self.user_word_join(UserWordTopic))
+                .where(UserWordTopic.user_id == user_id, UserWordTopic.topic_id.in_(deleted['topic']))).scalars())
+        return dict(token=encode_token(now), reset=since is None and token_time is not None, words=words,
+                    topics=[topic._asdict() for topic in topics], deleted_words=sorted(deleted['word']),
+                    deleted_topics=sorted(deleted['topic']))
+
+    def prune_sync_tombstones(self, before: datetime.datetime) -> int:
+        result = self.session.execute(delete(SyncTombstone).where(SyncTombstone.deleted_at < before))
+        self.session.commit()
+        return result.rowcount
+
+    def add_updated_at_columns(self) -> None:
+        """Add updated_at with its index to the users_words tables of an existing database (PostgreSQL)."""
+        indexes = [('users_words', 'ix_users_words_user_id_updated_at', 'user_id, updated_at')] + [
+            (table, f'ix_{table}_updated_at', 'updated_at, user_word_id')
+            for table in ('users_words_translations', 'users_words_examples', 'users_words_levels', 'users_words_topics')]
+        with self._engine.begin() as connection:
+            for table, index, columns in indexes:
+                connection.execute(text(f'ALTER TABLE {table} '
+                                        'ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP NOT NULL DEFAULT now()'))
+                connection.execute(text(f'CREATE INDEX IF NOT EXISTS {index} ON {table} ({columns})'))
+
+    def add_deleted_at_columns(self) -> None:
+        """Add deleted_at with its partial index to users, words and topics of an existing database (PostgreSQL)."""
+        with self._engine.begin() as connection:
+            for table in ('users', 'words', 'topics'):
+                connection.execute(text(f'ALTER TABLE {table} ADD COLUMN IF NOT EXISTS deleted_at TIMESTAMP'))
+                connection.execute(text(f'CREATE INDEX IF NOT EXISTS ix_{table}_deleted_at ON {table} (deleted_at) '
+                                        'WHERE deleted_at IS NOT NULL'))
+
+    # rows removed together with a soft-deleted user or word, few per user or word
+    owned_rows = {
+        User: (UserCounter.user_id, UserRole.user_id, NonParsedWord.user_id, DailyDeck.user_id, SyncTombstone.user_id),
+        Word: (WordExample.word_id, WordInflection.word_id, NonParsedWord.word_id, GeneratedExample.word_id),
+        Topic: ()
+    }
+
+    def delete_user_words(self, user_word_ids: list[int], user_ids: set[int]) -> int:
+        """Delete user words of *user_ids* with their translations, examples, levels and topic links in one statement
+        per table (in the users' partitions only), instead of loading them for the ORM cascade; committed by the
+        caller."""
+        removed = 0
+        for model in USER_WORD_CHILDREN:
+            removed += self.session.execute(delete(model).where(model.user_id.in_(user_ids),
+                                                                model.user_word_id.in_(user_word_ids))
+                                            .execution_options(synchronize_session=False)).rowcount
+        return removed + self.session.execute(delete(UserWord).where(UserWord.user_id.in_(user_ids),
+                                                                     UserWord.id.in_(user_word_ids))
+                                              .execution_options(synchronize_session=False)).rowcount
+
+    def reap_batch(self, model: type[SoftDelete], ids: list[int], batch_size: int) -> int:
+        """Remove up to *batch_size* rows depending on the soft-deleted *ids* of *model* (User, Word or Topic) or,
+        once nothing depends on them, the rows themselves. Returns the amount of removed rows; committed by the caller.
+        """
+        if model is Topic:
+            link_ids = self.session.execute(select(UserWordTopic.id).where(UserWordTopic.topic_id.in_(ids))
+                                            .limit(batch_size), execution_options=INCLUDE_DELETED).scalars().all()
+            if link_ids:
+                return self.session.execute(delete(UserWordTopic).where(UserWordTopic.id.in_(link_ids))
+                                            .execution_options(synchronize_session=False)).rowcount
+        else:
+            owner = UserWord.user_id if model is User else UserWord.word_id
+            user_words = self.session.execute(select(UserWord.id, UserWord.user_id).where(owner.in_(ids))
+                                              .limit(batch_size), execution_options=INCLUDE_DELETED).all()
+            if user_words:
+                return self.delete_user_words([user_word.id for user_word in user_words],
+                                              {user_word.user_id for user_word in user_words})
+        removed = 0
+        for column in self.owned_rows[model]:
+            removed += self.session.execute(delete(column.class_).where(column.in_(ids))
+                                            .execution_options(synchronize_session=False)).rowcount
+        return removed + self.session.execute(delete(model).where(model.id.in_(ids), model.deleted_at.isnot(None))
+                                              .execution_options(synchronize_session=False)).rowcount
+
+    def reap_deleted(self, batch_size: int = 1000) -> int:
+        """One bounded, committed step of removing soft-deleted rows; 0 when there is nothing left to remove."""
+        # a user owns many more rows than a word or a topic
+        for model, limit in ((User, max(1, batch_size // 100)), (Word, batch_size), (Topic, batch_size)):
+            ids = self.session.execute(select(model.id).where(model.deleted_at.isnot(None))
+                                       .order_by(model.deleted_at).limit(limit),
+                                       execution_options=INCLUDE_DELETED).scalars().all()
+            if ids:
+                removed = self.reap_batch(model, ids, batch_size)
+                self.session.commit()
+                return removed
+        return 0
+
+    def purge_deleted(self, model: type[SoftDelete], condition, batch_size: int = 1000) -> None:
+        """Remove soft-deleted rows matching *condition* now, so their unique name can be used again."""
+        ids = self.session.execute(select(model.id).where(model.deleted_at.isnot(None), condition),
+                                   execution_options=INCLUDE_DELETED).scalars().all()
+        if not ids:
+            return
+        while self.reap_batch(model, ids, batch_size):
+            self.session.commit()
+
+
+def database_url() -> URL:
+    load_dotenv()
+    return URL.create(
+        drivername=os.getenv('db_drivername'),
+        username=os.getenv('db_username'),
+        password=os.getenv('db_password'),
+        host=os.getenv('db_host'),
+        port=os.getenv('db_port'),
+        database=os.getenv('db_database')
+    )
+
+
+def replica_urls() -> list[URL]:
+    """URLs of the read replicas in *db_replica_hosts*: the primary's URL with another host and port."""
+    load_dotenv()
+    primary = database_url()
+    urls = []
+    for address in filter(None, map(str.strip, os.getenv('db_replica_hosts', '').split(','))):
+        host, _, port = address.partition(':')
+        urls.append(primary.set(host=host, port=int(port) if port else primary.port))
+    return urls
+
+
+class LazyDataManager:
+    """Stands in for the process' DataManager and creates it on first attribute access.
+
+    Importing this module (and everything importing db_manager) needs neither the .env file nor a database;
+    a worker builds its engine when it first uses it, e.g. in the app lifespan. Callbacks registered with
+    on_create (engine instrumentation) run once, right after the DataManager is built.
+    """
+
+    def __init__(self, factory: Callable[[], DataManager]):
+        self._factory = factory
+        self._instance = None
+        self._callbacks = []
+        self._lock = threading.Lock()
+
+    @property
+    def instance(self) -> DataManager:
+        if self._instance is None:
+            with self._lock:
+                if self._instance is None:
+                    instance = self._factory()
+                    for callback in self._callbacks:
+                        callback(instance)
+                    self._instance = instance
+        return self._instance
+
+    def on_create(self, callback: Callable[[DataManager], None]) -> None:
+        with self._lock:
+            self._callbacks.append(callback)
+            if self._instance is not None:
+                callback(self._instance)
+
+    def __getattr__(self, name: str):
+        return getattr(self.instance, name)
+
+
+db_manager: LazyDataManager = LazyDataManager(lambda: DataManager(database_url(), replica_urls()))
 
 if __name__ == '__main__':
     db_manager.session.rollback()
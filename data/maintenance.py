@@ -0,0 +1,91 @@
+import argparse
+import datetime
+import time
+
+from data.database_manager import db_manager
+from data.models import USERS_WORDS_PARTITIONS
+from modules.word_info import get_soup_for_word, get_word_from_soup, get_word_inflections
+from modules.sync import SYNC_TOMBSTONE_DAYS
+from modules.reaper import reaper
+
+
+def reconcile_words_user_count() -> None:
+    fixed_words = db_manager.reconcile_words_user_count()
+    print(f'words.user_count reconciled: {fixed_words} word(s) fixed.')
+
+
+def recount_users_counters() -> None:
+    user_ids = db_manager.get_user_ids()
+    for user_id in user_ids:
+        db_manager.recount_user_counters(user_id, reviews=True)
+    print(f'Progress counters recounted for {len(user_ids)} user(s).')
+
+
+def prune_sync_tombstones() -> None:
+    before = datetime.datetime.now() - datetime.timedelta(days=SYNC_TOMBSTONE_DAYS)
+    pruned = db_manager.prune_sync_tombstones(before)
+    print(f'Sync tombstones older than {SYNC_TOMBSTONE_DAYS} days pruned: {pruned}.')
+
+
+def reap_deleted() -> None:
+    print(f'Soft-deleted users, words and topics removed: {reaper.reap()} row(s).')
+
+
+def partition_users_words() -> None:
+    if db_manager.partition_users_words():
+        print(f'users_words and its tables moved into {USERS_WORDS_PARTITIONS} hash partitions.')
+    else:
+        print('Nothing to do: users_words is partitioned already, users_words_partitions is not set '
+              'or the database is not PostgreSQL.')
+
+
+def backfill_inflections(limit: int, delay: float = 3) -> None:
+    """Parse conjugation/declension tables for words added before they were stored.
+
+    Words whose page has no tables get an empty record, so they aren't fetched again on the next run.
+    """
+    words = db_manager.get_words_without_inflections(limit)
+    for number, (word_id, word) in enumerate(words, start=1):
+        soup = get_soup_for_word(word)
+        if not soup or isinstance(soup, str):
+            print(f'{number}/{len(words)} {word}: page was not fetched ({soup}).')
+            continue
+        _, soup = get_word_from_soup(soup)
+        tables = get_word_inflections(soup) if soup else {}
+        db_manager.add_word_inflections(word_id, tables)
+        print(f'{number}/{len(words)} {word}: {", ".join(tables) or "no tables"}')
+        time.sleep(delay)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Database maintenance jobs')
+    parser.add_argument('--migrate', action='store_true', help='add tables and columns missing in an existing database')
+    parser.add_argument('--inflections', type=int, metavar='LIMIT', default=0,
+                        help='fetch conjugation/declension tables for up to LIMIT words that have none')
+    parser.add_argument('--stats', action='store_true', help='recount the progress counters of all users')
+    parser.add_argument('--prune-tombstones', action='store_true',
+                        help='delete sync tombstones older than sync_tombstone_days')
+    parser.add_argument('--reap', action='store_true',
+                        help='remove soft-deleted users, words and topics with their rows now')
+    parser.add_argument('--partition-users-words', action='store_true',
+                        help='move users_words and its tables into users_words_partitions hash partitions')
+    args = parser.parse_args()
+    if args.migrate:
+        db_manager.create_tables()
+        db_manager.add_words_user_count_column()
+        db_manager.add_examples_columns()
+        db_manager.add_search_indexes()
+        db_manager.add_updated_at_columns()
+        db_manager.add_deleted_at_columns()
+        db_manager.add_user_word_user_id_columns()
+    if args.partition_users_words:
+        partition_users_words()
+    reconcile_words_user_count()
+    if args.stats:
+        recount_users_counters()
+    if args.reap:
+        reap_deleted()
+    if args.prune_tombstones:
+        prune_sync_tombstones()
+    if args.inflections:
+        backfill_inflections(args.inflections)
@@ -1,12 +1,34 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, TIMESTAMP, Sequence, Enum, UniqueConstraint
+import datetime
+import os
+from dotenv import load_dotenv
+from sqlalchemy import (Column, Integer, String, ForeignKey, DateTime, TIMESTAMP, Sequence, Enum, UniqueConstraint,
+                        Index, JSON, Date, LargeBinary, Boolean, ForeignKeyConstraint, event, select)
 from sqlalchemy.orm import relationship, declarative_base
-from sqlalchemy.sql import func
+from sqlalchemy.sql import func, text
 
+load_dotenv()
+# hash partitions of users_words and its translations, examples, levels and topic links by user_id
+# (PostgreSQL only, DataManager.partition_users_words); 0: the tables are not partitioned
+USERS_WORDS_PARTITIONS = int(os.getenv('users_words_partitions', 0))
+PARTITIONED = USERS_WORDS_PARTITIONS > 0
 
 Base = declarative_base()
 
 
-class User(Base):
+class SoftDelete:
+    """Rows with *deleted_at* are hidden from ORM queries (data/database_manager.py hide_deleted) right away;
+    their dependent rows and then the rows themselves are removed in batches by the reaper (modules/reaper.py).
+    """
+    deleted_at = Column(DateTime)
+
+
+def deleted_at_index(table: str) -> Index:
+    # only the few rows waiting for the reaper are indexed
+    return Index(f'ix_{table}_deleted_at', 'deleted_at', postgresql_where=text('deleted_at IS NOT NULL'),
+                 sqlite_where=text('deleted_at IS NOT NULL'))
+
+
+class User(SoftDelete, Base):
     __tablename__ = 'users'
 
     id = Column(Integer, Sequence('user_id_seq'), primary_key=True)
@@ -19,6 +41,7 @@ class User(Base):
     created_at = Column(TIMESTAMP, server_default=func.now())
     streak = Column(Integer)
     level = Column(Enum('A1', 'A2', 'B1', 'B2', 'C1', 'C2', name='level'), default='A1')
+    __table_args__ = (deleted_at_index('users'),)
 
     users_words = relationship("UserWord", back_populates="user", cascade="all, delete-orphan")
     non_parsed_word = relationship("NonParsedWord", back_populates="user")
@@ -31,6 +54,23 @@ class User(Base):
         return self.__str__()
 
 
+class UserCounter(Base):
+    """One progress counter of a user (modules/stats.py), maintained incrementally by DataManager."""
+    __tablename__ = 'users_counters'
+
+    id = Column(Integer, Sequence('users_counters_id_seq'), primary_key=True)
+    user_id = Column(Integer, ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    name = Column(String, nullable=False)
+    value = Column(Integer, nullable=False, default=0)
+    __table_args__ = (UniqueConstraint('user_id', 'name', name='_unique_user_counter'),)
+
+    def __str__(self):
+        return f'{self.id}. user_id={self.user_id} {self.name}={self.value}'
+
+    def __repr__(self):
+        return self.__str__()
+
+
 class Role(Base):
     __tablename__ = 'roles'
 
@@ -51,7 +91,7 @@ class UserRole(Base):
     role = relationship("Role", back_populates="user_role")
 
 
-class Word(Base):
+class Word(SoftDelete, Base):
     __tablename__ = 'words'
 
     id = Column(Integer, Sequence('word_id_seq'), primary_key=True)
@@ -59,11 +99,15 @@ class Word(Base):
     word_type_id = Column(Integer, ForeignKey('word_types.id', ondelete='CASCADE'), nullable=False)
     english = Column(String, nullable=False)
     level = Column(String)
-    __table_args__ = UniqueConstraint('word', 'word_type_id', name='_unique_word'),
+    user_count = Column(Integer, nullable=False, default=0, server_default='0')
+    __table_args__ = (UniqueConstraint('word', 'word_type_id', name='_unique_word'),
+                      Index('ix_words_user_count', 'user_count', 'id'),
+                      deleted_at_index('words'))
 
     word_type = relationship("WordType", back_populates="words")
     users_word = relationship("UserWord", back_populates="word", cascade="all, delete")
     example = relationship("WordExample", back_populates="word", uselist=False, cascade="all, delete")
+    inflection = relationship("WordInflection", back_populates="word", uselist=False, cascade="all, delete")
     non_parsed_word = relationship("NonParsedWord", back_populates="word", uselist=False, cascade="all, delete")
 
     def __str__(self):
@@ -73,11 +117,12 @@ class Word(Base):
         return self.__str__()
 
 
-class Topic(Base):
+class Topic(SoftDelete, Base):
     __tablename__ = 'topics'
 
     id = Column(Integer, Sequence('topic_id_seq'), primary_key=True)
     name = Column(String, unique=True)
+    __table_args__ = (deleted_at_index('topics'),)
 
     users_words_topics = relationship("UserWordTopic", cascade="all, delete", back_populates="topic")
 
@@ -110,6 +155,8 @@ class WordExample(Base):
     word_id = Column(Integer, ForeignKey('words.id', ondelete='CASCADE'), unique=True, nullable=False)
     example = Column(String, nullable=False)
     translation = Column(String)
+    # every [example, translation] pair of the scraped page; cards rotate through them (UserWord.example_index)
+    examples = Column(JSON)
 
     word = relationship("Word", back_populates="example")
 
@@ -120,15 +167,61 @@ class WordExample(Base):
         return self.__str__()
 
 
+class WordInflection(Base):
+    __tablename__ = 'words_inflections'
+
+    id = Column(Integer, Sequence('word_inflection_id_seq'), primary_key=True)
+    word_id = Column(Integer, ForeignKey('words.id', ondelete='CASCADE'), unique=True, nullable=False)
+    # conjugation/declension tables of the scraped page: {table title: {label: form}}, see word_info.py
+    tables = Column(JSON, nullable=False)
+
+    word = relationship("Word", back_populates="inflection")
+
+    def __str__(self):
+        return f'{self.id}. word={self.word.word}: {", ".join(self.tables)}'
+
+    def __repr__(self):
+        return self.__str__()
+
+
+def user_words_family_args(table: str, *args, unique: tuple[str, ...] | None = None,
+                           name: str | None = None) -> tuple:
+    """__table_args__ of a table of the users_words family: *args*, the unique constraint on *unique* columns
+    and, when partitioned, the partitioning clause. A partitioned table's unique constraints and primary key
+    contain user_id, so children reference users_words by (id, user_id)."""
+    partition_key = ('user_id',) if PARTITIONED else ()
+    if unique:
+        args += (UniqueConstraint(*unique, *partition_key, name=name),)
+    if table != 'users_words':
+        args += (Index(f'ix_{table}_user_id', 'user_id', 'user_word_id'),)
+    if PARTITIONED and table != 'users_words':
+        args += (ForeignKeyConstraint(['user_word_id', 'user_id'], ['users_words.id', 'users_words.user_id'],
+                                      ondelete='CASCADE'),)
+    return args + ({'postgresql_partition_by': 'HASH (user_id)'} if PARTITIONED else {},)
+
+
+def user_word_foreign_key() -> list[ForeignKey]:
+    # partitioned: part of the (user_word_id, user_id) foreign key of user_words_family_args
+    return [] if PARTITIONED else [ForeignKey('users_words.id', ondelete='CASCADE')]
+
+
 class UserWord(Base):
     __tablename__ = 'users_words'
 
     id = Column(Integer, Sequence('users_word_id_seq'), primary_key=True)
     word_id = Column(Integer, ForeignKey('words.id', ondelete='CASCADE'), nullable=False)
-    user_id = Column(Integer, ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    # the partition key, also in the child tables: per-user queries filter and join on it to touch one partition
+    user_id = Column(Integer, ForeignKey('users.id', ondelete='CASCADE'), nullable=False, primary_key=PARTITIONED)
     fails = Column(Integer, default=0)
     success = Column(Integer, default=0)
     last_shown = Column(DateTime)
+    example_index = Column(Integer, nullable=False, default=0, server_default='0')
+    # changes since a client's last sync (modules/sync.py), also set when a child row or topic link is deleted
+    updated_at = Column(DateTime, nullable=False, default=datetime.datetime.now, onupdate=datetime.datetime.now,
+                        server_default=func.now())
+    __table_args__ = user_words_family_args('users_words',
+                                            Index('ix_users_words_user_id_updated_at', 'user_id', 'updated_at'))
+    __mapper_args__ = {'primary_key': [id]}
 
     word = relationship("Word", back_populates="users_word")
     user = relationship("User", back_populates="users_words")
@@ -150,8 +243,15 @@ class UserWordTranslation(Base):
     __tablename__ = 'users_words_translations'
 
     id = Column(Integer, Sequence('users_words_translations_id_seq'), primary_key=True)
-    user_word_id = Column(Integer, ForeignKey('users_words.id', ondelete='CASCADE'), nullable=False)
+    user_word_id = Column(Integer, *user_word_foreign_key(), nullable=False)
+    user_id = Column(Integer, nullable=False, primary_key=PARTITIONED)
     translation = Column(String, nullable=False)
+    updated_at = Column(DateTime, nullable=False, default=datetime.datetime.now, onupdate=datetime.datetime.now,
+                        server_default=func.now())
+    __table_args__ = user_words_family_args('users_words_translations',
+                                            Index('ix_users_words_translations_updated_at', 'updated_at',
+                                                  'user_word_id'))
+    __mapper_args__ = {'primary_key': [id]}
 
     user_word = relationship("UserWord", back_populates="custom_translation")
 
@@ -166,9 +266,19 @@ class UserWordExample(Base):
     __tablename__ = 'users_words_examples'
 
     id = Column(Integer, Sequence('users_words_examples_id_seq'), primary_key=True)
-    user_word_id = Column(Integer, ForeignKey('users_words.id', ondelete='CASCADE'), unique=True, nullable=False)
+    user_word_id = Column(Integer, *user_word_foreign_key(), nullable=False)
+    user_id = Column(Integer, nullable=False, primary_key=PARTITIONED)
     example = Column(String, nullable=False)
     translation = Column(String)
+    # written by the GenAI example generator (modules/genai.py), not by the user; the user's own text replaces it
+    generated = Column(Boolean, nullable=False, default=False, server_default='false')
+    updated_at = Column(DateTime, nullable=False, default=datetime.datetime.now, onupdate=datetime.datetime.now,
+                        server_default=func.now())
+    __table_args__ = user_words_family_args('users_words_examples',
+                                            Index('ix_users_words_examples_updated_at', 'updated_at',
+                                                  'user_word_id'),
+                                            unique=('user_word_id',))
+    __mapper_args__ = {'primary_key': [id]}
 
     user_word = relationship("UserWord", back_populates="example", uselist=False)
 
@@ -183,12 +293,18 @@ class UserWordTopic(Base):
     __tablename__ = 'users_words_topics'
 
     id = Column(Integer, Sequence('users_words_topic_id_seq'), primary_key=True)
-    user_word_id = Column(Integer, ForeignKey('users_words.id', ondelete='CASCADE'))
+    user_word_id = Column(Integer, *user_word_foreign_key())
+    user_id = Column(Integer, nullable=False, primary_key=PARTITIONED)
     topic_id = Column(Integer, ForeignKey('topics.id', ondelete='CASCADE'))
+    updated_at = Column(DateTime, nullable=False, default=datetime.datetime.now, onupdate=datetime.datetime.now,
+                        server_default=func.now())
 
     user_word = relationship("UserWord", back_populates="user_word_topic")
     topic = relationship("Topic", back_populates="users_words_topics")
-    __table_args__ = UniqueConstraint('user_word_id', 'topic_id', name='_unique_user_word_topic'),
+    __table_args__ = user_words_family_args('users_words_topics',
+                                            Index('ix_users_words_topics_updated_at', 'updated_at', 'user_word_id'),
+                                            unique=('user_word_id', 'topic_id'), name='_unique_user_word_topic')
+    __mapper_args__ = {'primary_key': [id]}
 
     def __str__(self):
         return (f'{self.id}. user_word_id={self.user_word_id} word={self.user_word.word.word} '
@@ -219,8 +335,15 @@ class UserWordLevel(Base):
     __tablename__ = 'users_words_levels'
 
     id = Column(Integer, Sequence('users_words_levels_id_seq'), primary_key=True)
-    user_word_id = Column(Integer, ForeignKey('users_words.id', ondelete='CASCADE'), unique=True)
+    user_word_id = Column(Integer, *user_word_foreign_key())
+    user_id = Column(Integer, nullable=False, primary_key=PARTITIONED)
     level = Column(Enum('A1', 'A2', 'B1', 'B2', 'C1', 'C2', name='level'))
+    updated_at = Column(DateTime, nullable=False, default=datetime.datetime.now, onupdate=datetime.datetime.now,
+                        server_default=func.now())
+    __table_args__ = user_words_family_args('users_words_levels',
+                                            Index('ix_users_words_levels_updated_at', 'updated_at', 'user_word_id'),
+                                            unique=('user_word_id',))
+    __mapper_args__ = {'primary_key': [id]}
 
     user_word = relationship("UserWord", back_populates="user_level")
 
@@ -230,3 +353,102 @@ class UserWordLevel(Base):
 
     def __repr__(self):
         return self.__str__()
+
+
+USER_WORD_CHILDREN = (UserWordTranslation, UserWordExample, UserWordLevel, UserWordTopic)
+
+
+@event.listens_for(UserWordTranslation, 'before_insert')
+@event.listens_for(UserWordExample, 'before_insert')
+@event.listens_for(UserWordLevel, 'before_insert')
+@event.listens_for(UserWordTopic, 'before_insert')
+def copy_user_id(mapper, connection, target) -> None:
+    """Rows created with a user_word_id only get the user_id of their user word within the INSERT."""
+    if target.user_id is None:
+        user_words = UserWord.__table__
+        target.user_id = select(user_words.c.user_id).where(user_words.c.id == target.user_word_id).scalar_subquery()
+
+
+class GeneratedExample(Base):
+    """Output of the GenAI example generator (modules/genai.py), reused for every user with the same key."""
+    __tablename__ = 'generated_examples'
+
+    id = Column(Integer, Sequence('generated_examples_id_seq'), primary_key=True)
+    word_id = Column(Integer, ForeignKey('words.id', ondelete='CASCADE'), nullable=False)
+    level = Column(Enum('A1', 'A2', 'B1', 'B2', 'C1', 'C2', name='level'), nullable=False)
+    topic = Column(String, nullable=False, default='', server_default='')
+    example = Column(String, nullable=False)
+    translation = Column(String)
+    provider = Column(String)
+    __table_args__ = (UniqueConstraint('word_id', 'level', 'topic', name='_unique_generated_example'),)
+
+    def __str__(self):
+        return f'{self.id}. word_id={self.word_id} ({self.level}, {self.topic or "-"}): {self.example}'
+
+    def __repr__(self):
+        return self.__str__()
+
+
+class DailyDeck(Base):
+    """Cards prepared for a user's day by the nightly job (data/daily_decks.py)."""
+    __tablename__ = 'daily_decks'
+
+    id = Column(Integer, Sequence('daily_decks_id_seq'), primary_key=True)
+    user_id = Column(Integer, ForeignKey('users.id', ondelete='CASCADE'), unique=True, nullable=False)
+    deck_date = Column(Date, nullable=False)
+    # user word ids in showing order, packed as little-endian int64 (modules/review_state.py pack_ids)
+    cards = Column(LargeBinary, nullable=False)
+    due_count = Column(Integer, nullable=False)
+    new_count = Column(Integer, nullable=False)
+    created_at = Column(DateTime, nullable=False)
+
+    def __str__(self):
+        return f'{self.id}. user_id={self.user_id} {self.deck_date}: {self.due_count} due, {self.new_count} new'
+
+    def __repr__(self):
+        return self.__str__()
+
+
+class ReviewEvent(Base):
+    """Append-only log of answered cards (modules/review_log.py).
+
+    On PostgreSQL the table is partitioned by month of *shown_at* (DataManager.add_review_events_partitions).
+    The primary key leads with the user and the time, so it serves per-user time-range scans and includes the
+    partition key as PostgreSQL requires. There are no foreign keys: the history outlives deleted words and users.
+    """
+    __tablename__ = 'review_events'
+
+    user_id = Column(Integer, primary_key=True)
+    shown_at = Column(DateTime, primary_key=True)
+    user_word_id = Column(Integer, primary_key=True)
+    word_id = Column(Integer, nullable=False)
+    success = Column(Boolean, nullable=False)
+    __table_args__ = {'postgresql_partition_by': 'RANGE (shown_at)'}
+
+    def __str__(self):
+        return (f'{self.shown_at} user_id={self.user_id} user_word_id={self.user_word_id}: '
+                f'{"success" if self.success else "fail"}')
+
+    def __repr__(self):
+        return self.__str__()
+
+
+class SyncTombstone(Base):
+    """A user word deleted or a topic the user no longer has, for delta sync (modules/sync.py).
+
+    *kind* is 'word' (object_id is the users_words id) or 'topic' (object_id is the topics id).
+    """
+    __tablename__ = 'sync_tombstones'
+
+    id = Column(Integer, Sequence('sync_tombstones_id_seq'), primary_key=True)
+    user_id = Column(Integer, ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    kind = Column(Enum('word', 'topic', name='sync_tombstone_kind'), nullable=False)
+    object_id = Column(Integer, nullable=False)
+    deleted_at = Column(DateTime, nullable=False, default=datetime.datetime.now)
+    __table_args__ = (Index('ix_sync_tombstones_user_id_deleted_at', 'user_id', 'deleted_at'),)
+
+    def __str__(self):
+        return f'{self.id}. user_id={self.user_id} {self.kind} {self.object_id} deleted at {self.deleted_at}'
+
+    def __repr__(self):
+        return self.__str__()
@@ -0,0 +1,138 @@
+"""Read replicas for DataManager.
+
+Read-only DataManager methods (``get_*``, ``check_user_role``, ``user_has_word``, see REPLICA_METHODS) are
+executed on a replica when replicas are configured; every other method, and everything a read-only method does
+when it is called from another method, goes to the primary. Reads whose result outlives the request stay on the
+primary too (PRIMARY_METHODS): the changes of a sync, whose token would skip rows a lagging replica hasn't
+replayed yet, and the cards, whose review state (modules/review_state.py) is cached from the first load. Replicas take turns (round-robin); one that fails a
+health check or a statement is left out for *replica_check_interval* seconds, and a read that failed on it is
+repeated on the primary. With no healthy replica everything goes to the primary.
+
+Read-your-writes: a method that writes (an ORM flush or an INSERT / UPDATE / DELETE) marks the user of the
+request (*current_user_id*, set on authentication) and that user's reads go to the primary for the next
+*replica_sticky_seconds* seconds, so a change is not followed by a page without it. The mark is kept per worker
+process: set the window above the usual replication lag.
+
+Environment:
+- *db_replica_hosts* - comma separated ``host[:port]`` of the replicas; user, password and database are the
+  primary's (*db_username*, *db_password*, *db_database*). Empty (default): no replicas
+- *replica_check_interval* - seconds between health checks of a replica (default 10)
+- *replica_max_lag* - seconds of replication lag after which a PostgreSQL replica counts as unhealthy
+  (default 30)
+- *replica_sticky_seconds* - seconds a user's reads stay on the primary after a write (default 5)
+
+Trying it with two local PostgreSQL instances (a primary on 5432 and a streaming replica on 5433)::
+
+    pg_basebackup -h localhost -p 5432 -U postgres -D replica -R   # -R: standby.signal and primary_conninfo
+    pg_ctl -D replica -o "-p 5433" start
+    # .env: db_host=localhost, db_port=5432, db_replica_hosts=localhost:5433
+
+Statements show which server answered in ``pg_stat_activity`` of each instance (or with *log_statement=all*);
+stopping the replica sends the reads to the primary until it is back.
+"""
+import contextvars
+import itertools
+import logging
+import os
+import threading
+import time
+from dotenv import load_dotenv
+from sqlalchemy import Engine, exc, text
+from sqlalchemy.orm import scoped_session
+
+load_dotenv()
+REPLICA_CHECK_INTERVAL = float(os.getenv('replica_check_interval', 10))
+REPLICA_MAX_LAG = float(os.getenv('replica_max_lag', 30))
+REPLICA_STICKY_SECONDS = float(os.getenv('replica_sticky_seconds', 5))
+
+REPLICA_METHODS = {'check_user_role', 'user_has_word'}
+PRIMARY_METHODS = {'get_user_changes', 'get_user_cards'}
+
+# seconds since the last replayed transaction, 0 when the replica has replayed everything it received
+LAG_QUERY = text('SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 '
+                 'ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END')
+
+# the authenticated user of the request, for read-your-writes; travels into the 'db' pool with the context
+current_user_id: contextvars.ContextVar[int | None] = contextvars.ContextVar('current_user_id', default=None)
+
+logger = logging.getLogger(__name__)
+
+
+def is_replica_method(name: str) -> bool:
+    return (name.startswith('get_') or name in REPLICA_METHODS) and name not in PRIMARY_METHODS
+
+
+class Replica:
+    def __init__(self, engine: Engine, session: scoped_session):
+        self.engine = engine
+        self.session = session
+        self.healthy = True
+        self.checked_at = time.monotonic()
+
+    def check(self, max_lag: float) -> bool:
+        try:
+            with self.engine.connect() as connection:
+                if self.engine.dialect.name == 'postgresql':
+                    lag = connection.execute(LAG_QUERY).scalar()
+                    if lag and lag > max_lag:
+                        logger.warning('Replica %s is %.1f s behind the primary', self.engine.url, lag)
+                        return False
+                else:
+                    connection.execute(text('SELECT 1'))
+        except exc.DBAPIError as error:
+            logger.warning('Replica %s is not available: %s', self.engine.url, error)
+            return False
+        return True
+
+
+class ReplicaSet:
+    """Round-robin choice of healthy replicas and the read-your-writes marks of users."""
+
+    def __init__(self, replicas: list[Replica], check_interval: float = REPLICA_CHECK_INTERVAL,
+                 max_lag: float = REPLICA_MAX_LAG, sticky_seconds: float = REPLICA_STICKY_SECONDS):
+        self.replicas = replicas
+        self.check_interval = check_interval
+        self.max_lag = max_lag
+        self.sticky_seconds = sticky_seconds
+        self._turns = itertools.cycle(replicas)
+        self._lock = threading.Lock()
+        # user id -> monotonic time until which the user's reads go to the primary
+        self._sticky: dict[int, float] = {}
+
+    def __bool__(self) -> bool:
+        return bool(self.replicas)
+
+    def __iter__(self):
+        return iter(self.replicas)
+
+    def pick(self) -> Replica | None:
+        """The next healthy replica; a replica due for a health check is checked first."""
+        for _ in range(len(self.replicas)):
+            with self._lock:
+                replica = next(self._turns)
+                now = time.monotonic()
+                due = now - replica.checked_at >= self.check_interval
+                if due:
+                    # the other threads keep using (or skipping) it until the check is done
+                    replica.checked_at = now
+            if due:
+                replica.healthy = replica.check(self.max_lag)
+            if replica.healthy:
+                return replica
+        return None
+
+    def mark_down(self, replica: Replica) -> None:
+        replica.healthy = False
+        replica.checked_at = time.monotonic()
+
+    def record_write(self, user_id: int | None) -> None:
+        if user_id is None:
+            return
+        now = time.monotonic()
+        with self._lock:
+            self._sticky[user_id] = now + self.sticky_seconds
+            if len(self._sticky) > 10_000:
+                self._sticky = {key: until for key, until in self._sticky.items() if until > now}
+
+    def is_sticky(self, user_id: int | None) -> bool:
+        return user_id is not None and self._sticky.get(user_id, 0) > time.monotonic()
@@ -85,6 +85,39 @@ class AdminWordOut(AdminWord):
     users: list[int]
 
 
+class WordSearchResult(WordOut):
+    score: float
+
+
+class AdminWordSearchResult(AdminWordOut):
+    score: float
+
+
+class WordInflections(BaseModel):
+    word_id: int
+    word: str
+    word_type: str
+    tables: dict[str, dict[str, str]]
+
+
+class TopicStats(BaseModel):
+    id: int
+    name: str
+    words: int
+
+
+class UserStats(BaseModel):
+    streak: int
+    longest_streak: int
+    last_review_date: datetime.date | None = None
+    reviews: int
+    successes: int
+    success_rate: float
+    words: int
+    mastered: dict[str, int]
+    topics: list[TopicStats]
+
+
 class AdminUserWordOut(BaseModel):
     id: int
     word_id: int
@@ -111,6 +144,24 @@ class TopicOut(TopicIn):
     id: int
 
 
+class SyncWord(WordOut):
+    fails: int
+    success: int
+    last_shown: datetime.datetime
+    custom_translation: str | None = None
+    custom_example: str | None = None
+    custom_level: Literal['A1', 'A2', 'B1', 'B2', 'C1', 'C2', 'Unknown'] | None = None
+
+
+class SyncOut(BaseModel):
+    token: str
+    reset: bool
+    words: list[SyncWord]
+    topics: list[TopicOut]
+    deleted_words: list[int]
+    deleted_topics: list[int]
+
+
 class UserWordCard(BaseModel):
     id: int
     word: str
@@ -1,20 +1,63 @@
+import os
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 import routers
+from data.database_manager import db_manager
+from modules import metrics, profiling, etags
+from modules.genai import example_generator
+from modules.review_log import review_log
+from modules.reaper import reaper
+from modules.executor import run_blocking
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # the database is touched only here, once per worker, instead of on import
+    if os.getenv('db_create_tables', 'true').lower() == 'true':
+        await run_blocking('db', db_manager.create_tables)
+    if example_generator:
+        example_generator.start()
+    review_log.start()
+    reaper.start()
+    yield
+    await reaper.stop()
+    await review_log.stop()
+    if example_generator:
+        await example_generator.stop()
+
 
 app = FastAPI(title='Brain Germination App',
-              description="The app aims to help users study some German showing user's words in different contexts.")
+              description="The app aims to help users study some German showing user's words in different contexts.",
+              lifespan=lifespan)
 
 app.include_router(routers.home_routes)
 app.include_router(routers.users)
 app.include_router(routers.words)
 app.include_router(routers.user_topics)
 app.include_router(routers.cards)
+app.include_router(routers.card_sessions)
 app.include_router(routers.admin_users)
 app.include_router(routers.admin_user_words)
 app.include_router(routers.admin_user_topics)
 app.include_router(routers.admin_words)
 app.include_router(routers.admin_topics)
+app.include_router(routers.admin_pools)
 app.include_router(routers.security)
+app.include_router(routers.metrics_routes)
+
+app.add_middleware(etags.ETagMiddleware)
+app.add_middleware(profiling.ProfilingMiddleware)
+app.add_middleware(metrics.MetricsMiddleware)
+
+
+def instrument_engines(manager) -> None:
+    # the primary and every read replica
+    for engine in manager.engines:
+        metrics.instrument_engine(engine)
+        profiling.instrument_engine(engine)
+
+
+db_manager.on_create(instrument_engines)
 
 # todo docstrings
 
@@ -26,4 +69,3 @@ app.include_router(routers.security)
 # todo user activation mail (background tasks)
 # todo security and validation (pydantic, bleach)
 # todo react frontend
-# todo conjugations, declensions (nouns, pronouns, adjectives, articles, verbs)
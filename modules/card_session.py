@@ -0,0 +1,172 @@
+"""Study sessions over one WebSocket (/user_cards/session).
+
+The user is authenticated once per connection. The server sends cards in batches and prepares the next batch
+in the background as soon as one is sent, so it is ready when the client has *card_session_cards* / 2 cards left.
+Answers are kept in memory and written together through DataManager.update_cards: one transaction per
+*card_session_save_batch* answers or per *card_session_save_interval* seconds, and on disconnect.
+
+Messages are JSON objects with a *type*:
+- client: ``{"type": "answer", "id": <user word id>, "guess": "success" | "fails"}`` - answer to a sent card;
+  ``{"type": "next"}`` - send the next batch now
+- server: ``{"type": "cards", "cards": [...]}`` (UserWordCard objects, an empty list when there are no more
+  cards); ``{"type": "saved", "ids": [...]}`` - answers written to the database; ``{"type": "error", "detail": ...}``
+
+Environment:
+- *card_session_cards* - cards per batch (default 10)
+- *card_session_save_batch* - answers per write (default 20)
+- *card_session_save_interval* - seconds an answer waits for a write at most (default 5)
+"""
+import asyncio
+import datetime
+import json
+import logging
+import os
+from dotenv import load_dotenv
+from fastapi import WebSocket, WebSocketDisconnect
+
+from data.database_manager import db_manager
+from modules.executor import run_blocking
+from modules.review_log import review_log
+from modules.serialization import user_word_card_row, user_word_card_list
+
+load_dotenv()
+CARD_SESSION_CARDS = int(os.getenv('card_session_cards', 10))
+CARD_SESSION_SAVE_BATCH = int(os.getenv('card_session_save_batch', 20))
+CARD_SESSION_SAVE_INTERVAL = float(os.getenv('card_session_save_interval', 5))
+
+logger = logging.getLogger(__name__)
+
+
+class CardSession:
+    def __init__(self, user_id: int, topic_id: int | None = None, cards: int = CARD_SESSION_CARDS,
+                 save_batch: int = CARD_SESSION_SAVE_BATCH, save_interval: float = CARD_SESSION_SAVE_INTERVAL):
+        self.user_id = user_id
+        self.topic_id = topic_id
+        self.cards = cards
+        self.save_batch = save_batch
+        self.save_interval = save_interval
+        # sent and not answered yet: user word id -> word id
+        self.outstanding: dict[int, int] = {}
+        self.word_ids: dict[int, int] = {}
+        # answered and not written yet: (user_word_id, shown_time, guess)
+        self.pending: list[tuple[int, datetime.datetime, str]] = []
+        self.saving: set[int] = set()
+        self._next_cards: asyncio.Task | None = None
+
+    def load_cards(self, exclude: set[int]) -> tuple[list[dict], dict[int, int]] | str:
+        """The next batch as (card rows, word id by user word id), without the cards in *exclude*."""
+        db_cards = db_manager.get_user_cards(self.user_id, self.topic_id, self.cards + len(exclude))
+        if isinstance(db_cards, str):
+            return db_cards
+        db_cards = [db_card for db_card in db_cards if db_card.id not in exclude][:self.cards]
+        rows = user_word_card_list.dump_python(
+            user_word_card_list.validate_python([user_word_card_row(db_card) for db_card in db_cards]), mode='json')
+        return rows, {db_card.id: db_card.word_id for db_card in db_cards}
+
+    def prefetch(self) -> None:
+        exclude = set(self.outstanding) | {answer[0] for answer in self.pending} | self.saving
+        self._next_cards = asyncio.create_task(run_blocking('db', self.load_cards, exclude))
+
+    async def send_cards(self, websocket: WebSocket, requested: bool = True) -> None:
+        """Send the prepared batch and start preparing the next one; an empty batch only if *requested*."""
+        next_cards = await self._next_cards
+        if isinstance(next_cards, str):
+            await websocket.send_json({'type': 'error', 'detail': next_cards})
+            return
+        rows, word_ids = next_cards
+        self.outstanding.update(word_ids)
+        self.word_ids.update(word_ids)
+        self.prefetch()
+        if rows or requested:
+            await websocket.send_json({'type': 'cards', 'cards': rows})
+
+    def answer(self, message: dict) -> str | None:
+        """Queue an answer; returns what is wrong with the message, if anything."""
+        user_word_id, guess = message.get('id'), message.get('guess')
+        if guess not in ('fails', 'success'):
+            return f'Unknown guess "{guess}", expected "fails" or "success".'
+        if not isinstance(user_word_id, int) or user_word_id not in self.outstanding:
+            return f'Card with id={user_word_id} was not sent in this session or is already answered.'
+        del self.outstanding[user_word_id]
+        self.pending.append((user_word_id, datetime.datetime.now(), guess))
+        return None
+
+    def write_answers(self, answers: list[tuple[int, datetime.datetime, str]]) -> list[int]:
+        updated = {user_word.id for user_word in db_manager.update_cards(self.user_id, answers)}
+        for user_word_id, shown_time, guess in answers:
+            if user_word_id in updated:
+                review_log.add(self.user_id, user_word_id, self.word_ids[user_word_id], shown_time,
+                               guess == 'success')
+        return sorted(updated)
+
+    async def save(self, websocket: WebSocket | None) -> None:
+        answers, self.pending = self.pending, []
+        if not answers:
+            return
+        answered_ids = {answer[0] for answer in answers}
+        self.saving |= answered_ids
+        try:
+            saved_ids = await run_blocking('db', self.write_answers, answers)
+        except Exception:
+            self.pending = answers + self.pending
+            raise
+        finally:
+            self.saving -= answered_ids
+        if websocket is not None:
+            await websocket.send_json({'type': 'saved', 'ids': saved_ids})
+
+    async def autosave(self, websocket: WebSocket) -> None:
+        while True:
+            await asyncio.sleep(self.save_interval)
+            try:
+                await self.save(websocket)
+            except WebSocketDisconnect:
+                return
+            except Exception:
+                logger.exception('Answers of user %s were not saved, retrying in %s s', self.user_id,
+                                 self.save_interval)
+
+    async def handle(self, websocket: WebSocket, text: str) -> None:
+        try:
+            message = json.loads(text)
+        except json.JSONDecodeError:
+            message = None
+        if not isinstance(message, dict):
+            await websocket.send_json({'type': 'error', 'detail': 'Messages should be JSON objects.'})
+            return
+        match message.get('type'):
+            case 'answer':
+                error = self.answer(message)
+                if error:
+                    await websocket.send_json({'type': 'error', 'detail': error})
+                    return
+                if len(self.pending) >= self.save_batch:
+                    await self.save(websocket)
+                if len(self.outstanding) <= self.cards // 2:
+                    await self.send_cards(websocket, requested=not self.outstanding)
+            case 'next':
+                await self.send_cards(websocket)
+            case message_type:
+                await websocket.send_json({'type': 'error', 'detail': f'Unknown message type "{message_type}".'})
+
+    async def run(self, websocket: WebSocket) -> None:
+        self.prefetch()
+        if isinstance(await self._next_cards, str):
+            await self.send_cards(websocket)
+            await websocket.close(code=1008)
+            return
+        await self.send_cards(websocket)
+        autosave = asyncio.create_task(self.autosave(websocket))
+        try:
+            while True:
+                await self.handle(websocket, await websocket.receive_text())
+        except WebSocketDisconnect:
+            pass
+        finally:
+            autosave.cancel()
+            self._next_cards.cancel()
+            try:
+                # the write goes on if the connection handler is cancelled (server shutdown)
+                await asyncio.shield(self.save(None))
+            except Exception:
+                logger.exception('Answers of user %s were lost: %s', self.user_id, self.pending)
@@ -0,0 +1,65 @@
+"""Conditional GET for user-scoped routes.
+
+Every change of a user's words, topics or cards bumps the user's data version (DataManager.bump_data_versions).
+Routes depending on *user_data_etag* get a weak ETag made of the user id, that version and the date (daily decks
+change with the day); a request whose If-None-Match matches is answered with 304 before the route runs, so no
+list query and no serialization happen. ETagMiddleware copies the ETag of a route to its 200 response.
+Card routes use *cards_etag*, which leaves random cards out.
+"""
+import datetime
+from typing import Annotated
+from fastapi import Depends, HTTPException, Request
+
+from data.database_manager import db_manager
+from data.schemas import UserOut
+from modules.executor import run_blocking
+from modules.security import get_current_active_user
+
+CACHE_CONTROL = 'private, no-cache'
+
+
+def matches(if_none_match: str, etag: str) -> bool:
+    if if_none_match.strip() == '*':
+        return True
+    # weak comparison: W/"x" and "x" are the same validator
+    return etag.removeprefix('W/') in {candidate.strip().removeprefix('W/') for candidate in if_none_match.split(',')}
+
+
+async def user_data_etag(request: Request,
+                         current_user: Annotated[UserOut, Depends(get_current_active_user)]) -> str:
+    version = await run_blocking('db', db_manager.get_data_version, current_user.id)
+    etag = f'W/"{current_user.id}.{version}.{datetime.date.today():%Y%m%d}"'
+    if_none_match = request.headers.get('if-none-match')
+    if if_none_match and matches(if_none_match, etag):
+        raise HTTPException(304, headers={'ETag': etag, 'Cache-Control': CACHE_CONTROL})
+    request.state.etag = etag
+    return etag
+
+
+async def cards_etag(request: Request, current_user: Annotated[UserOut, Depends(get_current_active_user)],
+                     random: bool = False) -> str | None:
+    """user_data_etag, except for random cards: they differ on every request, so they are never validated."""
+    if random:
+        return None
+    return await user_data_etag(request, current_user)
+
+
+class ETagMiddleware:
+    """Pure ASGI middleware adding the ETag chosen by user_data_etag to successful responses."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or scope['method'] not in ('GET', 'HEAD'):
+            return await self.app(scope, receive, send)
+
+        async def send_with_etag(message):
+            if message['type'] == 'http.response.start' and message['status'] == 200:
+                etag = scope.get('state', {}).get('etag')
+                if etag:
+                    message['headers'] = [*message.get('headers', []), (b'etag', etag.encode()),
+                                          (b'cache-control', CACHE_CONTROL.encode())]
+            await send(message)
+
+        await self.app(scope, receive, send_with_etag)
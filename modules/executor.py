@@ -0,0 +1,156 @@
+import asyncio
+import contextvars
+import functools
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Callable, Iterator
+from dotenv import load_dotenv
+
+load_dotenv()
+DB_WORKERS = int(os.getenv('db_workers', 5))
+SCRAPER_WORKERS = int(os.getenv('scraper_workers', 8))
+GENAI_WORKERS = int(os.getenv('genai_workers', 1))
+
+logger = logging.getLogger(__name__)
+
+
+class BlockingPool:
+    """Sized thread pool for synchronous work that would otherwise block the event loop.
+
+    Keeps track of how many calls are waiting for a free worker (queue depth)
+    and how many are being executed right now.
+    """
+
+    def __init__(self, name: str, max_workers: int, release: Callable[[], None] | None = None):
+        self.name = name
+        self.max_workers = max_workers
+        # called in the worker after every call, e.g. to end the thread's database session
+        self.release = release
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f'{name}_pool')
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._active = 0
+        self._completed = 0
+
+    def _run(self, func: Callable, *args, **kwargs) -> Any:
+        with self._lock:
+            self._queued -= 1
+            self._active += 1
+        try:
+            return func(*args, **kwargs)
+        finally:
+            try:
+                if self.release is not None:
+                    self.release()
+            finally:
+                with self._lock:
+                    self._active -= 1
+                    self._completed += 1
+
+    def submit(self, func: Callable, *args, **kwargs):
+        with self._lock:
+            self._queued += 1
+        # the caller's context travels with the call, so per-request state (metrics) is visible in the worker
+        return self._executor.submit(contextvars.copy_context().run, self._run, func, *args, **kwargs)
+
+    def call(self, func: Callable, *args, **kwargs) -> Any:
+        """Run *func* in the pool and wait for the result from a synchronous caller."""
+        if threading.current_thread().name.startswith(f'{self.name}_pool'):
+            return func(*args, **kwargs)
+        return self.submit(func, *args, **kwargs).result()
+
+    async def run(self, func: Callable, *args, **kwargs) -> Any:
+        """Run *func* in the pool and await the result without blocking the event loop."""
+        return await asyncio.wrap_future(self.submit(func, *args, **kwargs))
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queued
+
+    @property
+    def active(self) -> int:
+        return self._active
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {'pool': self.name,
+                    'max_workers': self.max_workers,
+                    'queue_depth': self._queued,
+                    'active': self._active,
+                    'completed': self._completed}
+
+    def shutdown(self, wait: bool = True) -> None:
+        self._executor.shutdown(wait=wait)
+
+
+def release_db_session() -> None:
+    """End the worker thread's session after a DataManager call: the transaction is closed and the connection goes
+    back to the pool instead of idling in transaction (blocking VACUUM and DDL) until the thread's next call, and a
+    failed call doesn't leave the session pending a rollback for the next request."""
+    # imported here: data.database_manager imports modules that import this module
+    from data.database_manager import db_manager
+    db_manager.release_sessions()
+
+
+pools = {
+    'db': BlockingPool('db', DB_WORKERS, release=release_db_session),
+    'scraper': BlockingPool('scraper', SCRAPER_WORKERS),
+    'genai': BlockingPool('genai', GENAI_WORKERS)
+}
+
+
+def get_pool(pool_name: str) -> BlockingPool:
+    return pools[pool_name]
+
+
+async def run_blocking(pool_name: str, func: Callable, *args, **kwargs) -> Any:
+    """Await a synchronous DataManager or scraper call executed in the *pool_name* pool."""
+    return await pools[pool_name].run(func, *args, **kwargs)
+
+
+async def iterate_in_pool(pool_name: str, iterator: Iterator) -> AsyncIterator:
+    """Consume a blocking iterator (e.g. a batch generator with its own session) item by item in the *pool_name* pool.
+
+    The iterator is closed in the pool as soon as the consumer stops, also when it stops early (a client
+    disconnected from a streamed response); an error of the iterator is logged before it ends the stream.
+    """
+    pool = pools[pool_name]
+    sentinel = object()
+    pending = None
+    try:
+        while True:
+            pending = pool.submit(next, iterator, sentinel)
+            item = await asyncio.wrap_future(pending)
+            if item is sentinel:
+                break
+            yield item
+    except Exception:
+        logger.exception('Iterating in the %s pool failed', pool_name)
+        raise
+    finally:
+        close = getattr(iterator, 'close', None)
+        if close is not None:
+            # not awaited, the consumer may be cancelled; after the running next() if there is one
+            if pending is None or pending.done():
+                pool.submit(close)
+            else:
+                pending.add_done_callback(lambda _: pool.submit(close))
+
+
+def offload(pool_name: str) -> Callable:
+    """Turn a synchronous function (e.g. a route handler) into a coroutine executed in the *pool_name* pool.
+
+    The wrapped signature is preserved, so FastAPI still resolves parameters, dependencies and response models.
+    """
+    def decorator(func: Callable) -> Callable:
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            return await run_blocking(pool_name, func, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def pools_stats() -> list[dict]:
+    return [pool.stats() for pool in pools.values()]
@@ -0,0 +1,194 @@
+"""Background generation of contextual examples for user words.
+
+A GenAI provider writes example sentences for many words in one call; results are cached in the
+generated_examples table by (word, word_type, user level, topic) and copied into UserWordExample rows flagged
+*generated*: a card shows a custom example first, then the generated one, then the word's scraped examples
+(modules/serialization.py user_word_card_row).
+Generation never runs on a request path: ExampleGenerator is a background task started in the app lifespan,
+new user words only wake it up.
+
+Environment:
+- *genai_provider* - ``off`` (default), ``fake`` (deterministic, no model) or ``ollama``
+- *genai_batch_size* - user words per model call (default 20)
+- *genai_interval* - seconds between checks for user words without an example (default 60)
+- *ollama_url*, *genai_model*, *genai_timeout* - Ollama server, model name and request timeout in seconds
+"""
+import asyncio
+import json
+import logging
+import os
+from abc import ABC, abstractmethod
+from typing import NamedTuple
+from dotenv import load_dotenv
+
+from data.database_manager import db_manager
+from modules.executor import run_blocking
+from modules.metrics import record_cache
+
+load_dotenv()
+GENAI_PROVIDER = os.getenv('genai_provider', 'off')
+GENAI_BATCH_SIZE = int(os.getenv('genai_batch_size', 20))
+GENAI_INTERVAL = float(os.getenv('genai_interval', 60))
+OLLAMA_URL = os.getenv('ollama_url', 'http://localhost:11434')
+GENAI_MODEL = os.getenv('genai_model', 'deepseek-r1')
+GENAI_TIMEOUT = float(os.getenv('genai_timeout', 120))
+# user words without an answer remembered at most; the oldest are tried again
+SKIPPED_LIMIT = 1000
+
+logger = logging.getLogger(__name__)
+
+
+class ExampleKey(NamedTuple):
+    word_id: int
+    word: str
+    word_type: str
+    level: str
+    topic: str
+
+    @property
+    def cache_key(self) -> tuple[int, str, str]:
+        # word_id stands for (word, word_type): words are unique on both
+        return self.word_id, self.level, self.topic
+
+
+class ExampleProvider(ABC):
+    """Turns a batch of keys into (example, translation) pairs, None for keys it couldn't handle."""
+    name = 'base'
+
+    @abstractmethod
+    def generate(self, keys: list[ExampleKey]) -> list[tuple[str, str] | None]:
+        ...
+
+
+class FakeProvider(ExampleProvider):
+    """Deterministic provider for tests and local development: no model, same key - same sentence."""
+    name = 'fake'
+
+    def generate(self, keys: list[ExampleKey]) -> list[tuple[str, str] | None]:
+        return [(f'({key.level}) Im Thema „{key.topic or "Alltag"}“ benutzen wir „{key.word}“ ({key.word_type}).',
+                 f'({key.level}) In the topic "{key.topic or "Everyday life"}" we use "{key.word}" ({key.word_type}).')
+                for key in keys]
+
+
+class OllamaProvider(ExampleProvider):
+    """Asks a local Ollama model for all examples of a batch in one JSON answer."""
+    name = 'ollama'
+
+    def __init__(self, url: str = OLLAMA_URL, model: str = GENAI_MODEL, timeout: float = GENAI_TIMEOUT):
+        self.url = url
+        self.model = model
+        self.timeout = timeout
+
+    @staticmethod
+    def build_prompt(keys: list[ExampleKey]) -> str:
+        words = [{'id': number, 'word': key.word, 'word_type': key.word_type, 'level': key.level,
+                  'topic': key.topic or None}
+                 for number, key in enumerate(keys)]
+        return ('You help people learning German. For every word below write one natural German example sentence '
+                'using the word, matching the CEFR level and, if given, the topic, plus its English translation. '
+                'Answer only with JSON: {"examples": [{"id": <id>, "example": "...", "translation": "..."}]}.\n'
+                + json.dumps(words, ensure_ascii=False))
+
+    def generate(self, keys: list[ExampleKey]) -> list[tuple[str, str] | None]:
+        import requests
+        response = requests.post(f'{self.url}/api/generate',
+                                 json={'model': self.model, 'prompt': self.build_prompt(keys),
+                                       'stream': False, 'format': 'json'},
+                                 timeout=self.timeout)
+        response.raise_for_status()
+        examples = [None] * len(keys)
+        for item in json.loads(response.json()['response']).get('examples', []):
+            number = item.get('id')
+            if isinstance(number, int) and 0 <= number < len(keys) and item.get('example'):
+                examples[number] = (item['example'], item.get('translation'))
+        return examples
+
+
+providers = {'fake': FakeProvider, 'ollama': OllamaProvider}
+
+
+class ExampleGenerator:
+    """Background task filling generated UserWordExample rows batch by batch."""
+
+    def __init__(self, provider: ExampleProvider, batch_size: int = GENAI_BATCH_SIZE,
+                 interval: float = GENAI_INTERVAL):
+        self.provider = provider
+        self.batch_size = batch_size
+        self.interval = interval
+        # user words the provider had no answer for, so they don't block the queue forever (oldest first)
+        self.skipped: dict[int, None] = {}
+        self._wake_up = asyncio.Event()
+        self._task: asyncio.Task | None = None
+
+    async def fill_batch(self) -> int:
+        """Give examples to the next batch of user words; returns the amount of examples written."""
+        rows = await run_blocking('db', db_manager.get_user_words_without_example, self.batch_size,
+                                  set(self.skipped))
+        if not rows:
+            return 0
+        keys = {ExampleKey(row['word_id'], row['word'], row['word_type'], row['level'], row['topic'])
+                for row in rows}
+        examples = await run_blocking('db', db_manager.get_generated_examples, {key.cache_key for key in keys})
+        missing = []
+        for key in keys:
+            record_cache('genai_examples', key.cache_key in examples)
+            if key.cache_key not in examples:
+                missing.append(key)
+        if missing:
+            generated = await run_blocking('genai', self.provider.generate, missing)
+            new_examples = {key.cache_key: example for key, example in zip(missing, generated) if example}
+            await run_blocking('db', db_manager.add_generated_examples, new_examples, self.provider.name)
+            examples.update(new_examples)
+        user_words_examples = []
+        for row in rows:
+            example = examples.get((row['word_id'], row['level'], row['topic']))
+            if example is None:
+                self.skip(row['user_word_id'])
+                continue
+            user_words_examples.append(dict(user_word_id=row['user_word_id'], user_id=row['user_id'],
+                                            example=example[0], translation=example[1], generated=True))
+        await run_blocking('db', db_manager.add_user_words_examples, user_words_examples)
+        return len(user_words_examples)
+
+    def skip(self, user_word_id: int) -> None:
+        self.skipped[user_word_id] = None
+        if len(self.skipped) > SKIPPED_LIMIT:
+            del self.skipped[next(iter(self.skipped))]
+
+    async def run(self) -> None:
+        while True:
+            try:
+                while await self.fill_batch():
+                    pass
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception('Example generation failed, retrying in %s s', self.interval)
+            self._wake_up.clear()
+            try:
+                await asyncio.wait_for(self._wake_up.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+
+    def wake(self) -> None:
+        """Check for user words without an example now instead of after the interval."""
+        self._wake_up.set()
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self.run())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+
+example_generator = ExampleGenerator(providers[GENAI_PROVIDER]()) if GENAI_PROVIDER in providers else None
+
+
+def wake_example_generator() -> None:
+    if example_generator:
+        example_generator.wake()
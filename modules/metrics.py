@@ -0,0 +1,212 @@
+"""In-process metrics exposed on /metrics in the Prometheus text exposition format.
+
+Request latency is recorded by MetricsMiddleware, SQL statements by engine events (instrument_engine),
+woerter.net fetches by record_fetch, cache lookups by record_cache and review log writes by record_review_events.
+"""
+import bisect
+import threading
+import time
+from contextvars import ContextVar
+from typing import Callable, Iterable
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from modules.executor import pools_stats
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 200, 500)
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def escape_label(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def format_labels(names: tuple[str, ...], values: tuple, le: str | None = None) -> str:
+    pairs = [f'{name}="{escape_label(value)}"' for name, value in zip(names, values)]
+    if le is not None:
+        pairs.append(f'le="{le}"')
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labels: tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self._values: dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount: float = 1) -> None:
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def value(self, *label_values) -> float:
+        return self._values.get(label_values, 0)
+
+    def render(self) -> Iterable[str]:
+        yield f'# HELP {self.name} {self.documentation}'
+        yield f'# TYPE {self.name} counter'
+        with self._lock:
+            values = list(self._values.items())
+        for label_values, value in values:
+            yield f'{self.name}{format_labels(self.labels, label_values)} {value}'
+
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, labels: tuple[str, ...] = (),
+                 buckets: tuple[float, ...] = LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.buckets = buckets
+        # label values -> [per-bucket counts (last one is +Inf), sum]
+        self._series: dict[tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def render(self) -> Iterable[str]:
+        yield f'# HELP {self.name} {self.documentation}'
+        yield f'# TYPE {self.name} histogram'
+        with self._lock:
+            series = [(label_values, list(counts), total) for label_values, (counts, total) in self._series.items()]
+        for label_values, counts, total in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                yield f'{self.name}_bucket{format_labels(self.labels, label_values, le)} {cumulative}'
+            yield f'{self.name}_sum{format_labels(self.labels, label_values)} {total}'
+            yield f'{self.name}_count{format_labels(self.labels, label_values)} {cumulative}'
+
+
+class Gauge:
+    """Value collected at scrape time: *collect* returns (label values, value) pairs."""
+
+    def __init__(self, name: str, documentation: str, labels: tuple[str, ...],
+                 collect: Callable[[], Iterable[tuple[tuple, float]]]):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.collect = collect
+
+    def render(self) -> Iterable[str]:
+        yield f'# HELP {self.name} {self.documentation}'
+        yield f'# TYPE {self.name} gauge'
+        for label_values, value in self.collect():
+            yield f'{self.name}{format_labels(self.labels, label_values)} {value}'
+
+
+http_request_duration = Histogram('http_request_duration_seconds', 'Request latency by route.',
+                                  ('method', 'route', 'status'))
+http_request_sql_statements = Histogram('http_request_sql_statements', 'SQL statements executed per request.',
+                                        ('route',), COUNT_BUCKETS)
+http_request_sql_duration = Histogram('http_request_sql_duration_seconds', 'Time spent in SQL per request.',
+                                      ('route',))
+db_statement_duration = Histogram('db_statement_duration_seconds', 'Duration of single SQL statements.')
+scraper_fetch_duration = Histogram('scraper_fetch_duration_seconds', 'woerter.net fetch latency by HTTP status.',
+                                   ('status',))
+scraper_fetch_bytes = Counter('scraper_fetch_bytes_total', 'Bytes downloaded from woerter.net.')
+cache_requests = Counter('cache_requests_total', 'Cache lookups by cache and result (hit or miss).',
+                         ('cache', 'result'))
+review_events_written = Counter('review_events_written_total', 'Review events written to the review log.')
+review_events_batch_duration = Histogram('review_events_batch_seconds', 'Time to write one batch of review events.')
+reaped_rows = Counter('reaped_rows_total', 'Rows of soft-deleted users, words and topics removed by the reaper.')
+pool_queue_depth = Gauge('blocking_pool_queue_depth', 'Calls waiting for a free pool worker.', ('pool',),
+                         lambda: [((stats['pool'],), stats['queue_depth']) for stats in pools_stats()])
+pool_active = Gauge('blocking_pool_active', 'Calls being executed by the pool.', ('pool',),
+                    lambda: [((stats['pool'],), stats['active']) for stats in pools_stats()])
+
+registry = [http_request_duration, http_request_sql_statements, http_request_sql_duration, db_statement_duration,
+            scraper_fetch_duration, scraper_fetch_bytes, cache_requests, review_events_written,
+            review_events_batch_duration, reaped_rows, pool_queue_depth, pool_active]
+
+
+class RequestStats:
+    """SQL work done on behalf of the current request, filled from whichever pool thread runs it."""
+
+    __slots__ = ('sql_statements', 'sql_seconds')
+
+    def __init__(self):
+        self.sql_statements = 0
+        self.sql_seconds = 0.0
+
+
+request_stats: ContextVar[RequestStats | None] = ContextVar('request_stats', default=None)
+
+
+def record_fetch(status: int | str, seconds: float, size: int) -> None:
+    scraper_fetch_duration.observe(seconds, str(status))
+    scraper_fetch_bytes.inc(amount=size)
+
+
+def record_cache(cache: str, hit: bool) -> None:
+    cache_requests.inc(cache, 'hit' if hit else 'miss')
+
+
+def record_review_events(count: int, seconds: float) -> None:
+    review_events_written.inc(amount=count)
+    review_events_batch_duration.observe(seconds)
+
+
+def instrument_engine(engine: Engine) -> None:
+    """Time every statement executed by *engine* and add it to the current request's stats."""
+    @event.listens_for(engine, 'before_cursor_execute')
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('statement_started', []).append(time.perf_counter())
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info['statement_started'].pop()
+        db_statement_duration.observe(elapsed)
+        stats = request_stats.get()
+        if stats is not None:
+            stats.sql_statements += 1
+            stats.sql_seconds += elapsed
+
+
+def render() -> str:
+    return '\n'.join(line for metric in registry for line in metric.render()) + '\n'
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware (no per-request task or body buffering) recording latency and SQL usage per route.
+
+    Routes are labelled by their path template, unmatched paths share one label.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            return await self.app(scope, receive, send)
+        stats = RequestStats()
+        token = request_stats.set(stats)
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - started
+            request_stats.reset(token)
+            route = scope.get('route')
+            route_path = getattr(route, 'path', 'unmatched')
+            http_request_duration.observe(elapsed, scope['method'], route_path, str(status))
+            http_request_sql_statements.observe(stats.sql_statements, route_path)
+            http_request_sql_duration.observe(stats.sql_seconds, route_path)
@@ -0,0 +1,240 @@
+"""Development helpers: per-request sampling profiler and N+1 query detector.
+
+Environment:
+- *profiling* - ``off`` (default), ``admin`` (only requests with an Admin bearer token) or ``dev`` (anyone).
+  A request with the ``X-Profile: 1`` header or the ``?profile=1`` query flag gets a speedscope profile
+  (https://www.speedscope.app) of its own execution instead of the usual response.
+- *n_plus_one_threshold* - K; a request running the same SQL statement shape more than K times is logged with the
+  code that triggered it. 0 (default) disables the detector.
+- *profiling_interval* - sampling interval in seconds (default 0.001).
+"""
+import json
+import logging
+import os
+import re
+import sys
+import threading
+import time
+import traceback
+from contextvars import ContextVar
+from urllib.parse import parse_qs
+from dotenv import load_dotenv
+from fastapi import HTTPException
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from modules.security import get_current_user, is_user_admin
+
+load_dotenv()
+PROFILING = os.getenv('profiling', 'off')
+N_PLUS_ONE_THRESHOLD = int(os.getenv('n_plus_one_threshold', 0))
+SAMPLE_INTERVAL = float(os.getenv('profiling_interval', 0.001))
+
+APP_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+logger = logging.getLogger(__name__)
+
+
+def is_app_file(filename: str) -> bool:
+    return filename.startswith(APP_ROOT) and 'site-packages' not in filename and filename != __file__
+
+
+class SamplingProfiler:
+    """Samples the stacks of all threads every *interval* seconds while running.
+
+    Only stacks going through application code are kept, which drops idle pool workers and the event loop
+    waiting for IO, but also means that concurrent requests on the same process show up in the profile.
+    """
+
+    def __init__(self, interval: float = SAMPLE_INTERVAL):
+        self.interval = interval
+        self.frames: dict[tuple, int] = {}
+        # thread name -> list of (stack as frame indexes root first, weight)
+        self.samples: dict[str, list[tuple[list[int], float]]] = {}
+        self.duration = 0.0
+        self._started = 0.0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample, name='profiler', daemon=True)
+
+    def frame_index(self, frame) -> int:
+        key = (frame.f_code.co_name, frame.f_code.co_filename, frame.f_code.co_firstlineno)
+        if key not in self.frames:
+            self.frames[key] = len(self.frames)
+        return self.frames[key]
+
+    def _sample(self) -> None:
+        own_id = threading.get_ident()
+        last = time.perf_counter()
+        while not self._stop.wait(self.interval):
+            now = time.perf_counter()
+            thread_names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(frame)
+                    frame = frame.f_back
+                if not any(is_app_file(stack_frame.f_code.co_filename) for stack_frame in stack):
+                    continue
+                thread_samples = self.samples.setdefault(thread_names.get(thread_id, str(thread_id)), [])
+                thread_samples.append(([self.frame_index(stack_frame) for stack_frame in reversed(stack)],
+                                       now - last))
+            last = now
+
+    def start(self) -> None:
+        self._started = time.perf_counter()
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+        self.duration = time.perf_counter() - self._started
+
+    def speedscope(self, name: str) -> dict:
+        return {
+            '$schema': 'https://www.speedscope.app/file-format-schema.json',
+            'name': name,
+            'exporter': 'brain-germination profiler',
+            'shared': {'frames': [{'name': function, 'file': filename, 'line': line}
+                                  for function, filename, line in self.frames]},
+            'profiles': [{'type': 'sampled',
+                          'name': thread_name,
+                          'unit': 'seconds',
+                          'startValue': 0,
+                          'endValue': self.duration,
+                          'samples': [stack for stack, _ in thread_samples],
+                          'weights': [weight for _, weight in thread_samples]}
+                         for thread_name, thread_samples in self.samples.items()]
+        }
+
+
+PLACEHOLDERS_LIST = re.compile(r'\(\s*(?:\?|%\(\w+\)s|\$\d+|:\w+)(?:\s*,\s*(?:\?|%\(\w+\)s|\$\d+|:\w+))*\s*\)')
+
+
+def statement_shape(statement: str) -> str:
+    """SQL text with expanded IN lists collapsed, so the same query with different ids has one shape."""
+    return ' '.join(PLACEHOLDERS_LIST.sub('(...)', statement).split())
+
+
+def statement_origin() -> str:
+    """Where the statement came from: the serialization helper if one is on the stack, else the deepest app frame."""
+    app_frames = [frame for frame in traceback.extract_stack() if is_app_file(frame.filename)]
+    serialization_frames = [frame for frame in app_frames if frame.filename.endswith('serialization.py')]
+    frame = (serialization_frames or app_frames or [None])[-1]
+    if frame is None:
+        return 'unknown'
+    return f'{os.path.relpath(frame.filename, APP_ROOT)}:{frame.lineno} in {frame.name}'
+
+
+class QueryTracker:
+    """Counts statement shapes of one request and remembers the origin of the ones repeated over *threshold*."""
+
+    def __init__(self, threshold: int):
+        self.threshold = threshold
+        self.counts: dict[str, int] = {}
+        self.origins: dict[str, str] = {}
+
+    def add(self, statement: str) -> None:
+        shape = statement_shape(statement)
+        count = self.counts[shape] = self.counts.get(shape, 0) + 1
+        if count == self.threshold + 1:
+            self.origins[shape] = statement_origin()
+
+    def findings(self) -> list[dict]:
+        return [{'statement': shape, 'count': self.counts[shape], 'origin': origin}
+                for shape, origin in self.origins.items()]
+
+
+query_tracker: ContextVar[QueryTracker | None] = ContextVar('query_tracker', default=None)
+
+
+def instrument_engine(engine: Engine) -> None:
+    """Feed statements executed by *engine* to the current request's QueryTracker (if the detector is on)."""
+    @event.listens_for(engine, 'before_cursor_execute')
+    def track_statement(conn, cursor, statement, parameters, context, executemany):
+        tracker = query_tracker.get()
+        if tracker is not None:
+            tracker.add(statement)
+
+
+async def profiling_allowed(headers: dict[bytes, bytes]) -> bool:
+    if PROFILING == 'dev':
+        return True
+    if PROFILING != 'admin':
+        return False
+    scheme, _, token = headers.get(b'authorization', b'').decode('latin-1').partition(' ')
+    if scheme.lower() != 'bearer' or not token:
+        return False
+    try:
+        return await is_user_admin(await get_current_user(token))
+    except HTTPException:
+        return False
+
+
+def profile_requested(scope, headers: dict[bytes, bytes]) -> bool:
+    if headers.get(b'x-profile', b'0') not in (b'', b'0', b'false'):
+        return True
+    return parse_qs(scope.get('query_string', b'').decode('latin-1')).get('profile', ['0'])[0] not in ('0', 'false')
+
+
+class ProfilingMiddleware:
+    """Returns a speedscope profile for requests asking for it and logs N+1 statement patterns."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or (PROFILING == 'off' and not N_PLUS_ONE_THRESHOLD):
+            return await self.app(scope, receive, send)
+        headers = dict(scope['headers'])
+        tracker = QueryTracker(N_PLUS_ONE_THRESHOLD) if N_PLUS_ONE_THRESHOLD else None
+        token = query_tracker.set(tracker)
+        try:
+            if PROFILING != 'off' and profile_requested(scope, headers) and await profiling_allowed(headers):
+                await self.profile(scope, receive, send, tracker)
+            else:
+                await self.app(scope, receive, self.with_findings(scope, send, tracker))
+        finally:
+            query_tracker.reset(token)
+
+    def with_findings(self, scope, send, tracker: QueryTracker | None):
+        if tracker is None:
+            return send
+
+        async def send_with_findings(message):
+            if message['type'] == 'http.response.start':
+                findings = tracker.findings()
+                for finding in findings:
+                    logger.warning('N+1: %s %s ran %d times "%s" (triggered from %s)', scope['method'],
+                                   scope['path'], finding['count'], finding['statement'], finding['origin'])
+                if findings:
+                    message['headers'] = [*message.get('headers', []),
+                                          (b'x-n-plus-one', str(len(findings)).encode())]
+            await send(message)
+        return send_with_findings
+
+    async def profile(self, scope, receive, send, tracker: QueryTracker | None):
+        status = 500
+
+        async def discard(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+
+        profiler = SamplingProfiler()
+        profiler.start()
+        try:
+            await self.app(scope, receive, discard)
+        finally:
+            profiler.stop()
+        name = f"{scope['method']} {scope['path']}"
+        report = profiler.speedscope(name)
+        if tracker is not None:
+            report['n_plus_one'] = tracker.findings()
+        body = json.dumps(report).encode()
+        await send({'type': 'http.response.start', 'status': 200,
+                    'headers': [(b'content-type', b'application/json'),
+                                (b'content-length', str(len(body)).encode()),
+                                (b'content-disposition', b'attachment; filename="profile.speedscope.json"'),
+                                (b'x-profiled-status', str(status).encode())]})
+        await send({'type': 'http.response.body', 'body': body})
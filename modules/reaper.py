@@ -0,0 +1,65 @@
+"""Background removal of soft-deleted users, words and topics.
+
+Deleting a user, a word or a topic only sets its *deleted_at*: the row and everything depending on it are hidden
+from queries at once (data/database_manager.py hide_deleted) and the request returns. The reaper, started in the
+app lifespan, then removes the dependent user words, translations, examples, levels and topic links and finally
+the rows themselves, *reaper_batch_size* rows per statement and transaction, so no request waits for the locks
+of a big cascade. ``python -m data.maintenance --reap`` does the same in one go.
+
+Environment:
+- *reaper_batch_size* - rows removed per transaction (default 1000)
+- *reaper_interval* - seconds between looks for deleted rows (default 10)
+"""
+import asyncio
+import logging
+import os
+from dotenv import load_dotenv
+
+from data.database_manager import db_manager
+from modules.executor import run_blocking
+from modules.metrics import reaped_rows
+
+load_dotenv()
+REAPER_BATCH_SIZE = int(os.getenv('reaper_batch_size', 1000))
+REAPER_INTERVAL = float(os.getenv('reaper_interval', 10))
+
+logger = logging.getLogger(__name__)
+
+
+class Reaper:
+    def __init__(self, batch_size: int = REAPER_BATCH_SIZE, interval: float = REAPER_INTERVAL):
+        self.batch_size = batch_size
+        self.interval = interval
+        self._task: asyncio.Task | None = None
+
+    def reap(self) -> int:
+        """Remove every soft-deleted row now; returns the amount of removed rows."""
+        total = 0
+        while removed := db_manager.reap_deleted(self.batch_size):
+            reaped_rows.inc(amount=removed)
+            total += removed
+        return total
+
+    async def run(self) -> None:
+        while True:
+            try:
+                # one batch per pool call: requests get pool workers between the batches
+                while removed := await run_blocking('db', db_manager.reap_deleted, self.batch_size):
+                    reaped_rows.inc(amount=removed)
+            except Exception:
+                logger.exception('Soft-deleted rows were not removed, retrying in %s s', self.interval)
+            await asyncio.sleep(self.interval)
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self.run())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+
+reaper = Reaper()
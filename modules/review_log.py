@@ -0,0 +1,117 @@
+"""Buffered writer of the review_events log.
+
+Card endpoints only append an event to an in-memory buffer; a background task started in the app lifespan
+writes the buffer in batches, every *review_log_interval* seconds or as soon as *review_log_batch_size* events
+are waiting. Events of the last interval are lost if the process is killed (not on a normal shutdown).
+
+Environment:
+- *review_log_batch_size* - events per INSERT (default 500)
+- *review_log_interval* - seconds between writes (default 1)
+- *review_log_max_buffer* - events kept while the database is unavailable, older ones are dropped (default 100000)
+"""
+import asyncio
+import datetime
+import logging
+import os
+import threading
+import time
+from collections import deque
+from dotenv import load_dotenv
+
+from data.database_manager import db_manager
+from modules.executor import run_blocking
+from modules.metrics import record_review_events
+
+load_dotenv()
+REVIEW_LOG_BATCH_SIZE = int(os.getenv('review_log_batch_size', 500))
+REVIEW_LOG_INTERVAL = float(os.getenv('review_log_interval', 1))
+REVIEW_LOG_MAX_BUFFER = int(os.getenv('review_log_max_buffer', 100_000))
+
+logger = logging.getLogger(__name__)
+
+
+class ReviewLog:
+    def __init__(self, batch_size: int = REVIEW_LOG_BATCH_SIZE, interval: float = REVIEW_LOG_INTERVAL,
+                 max_buffer: int = REVIEW_LOG_MAX_BUFFER):
+        self.batch_size = batch_size
+        self.interval = interval
+        self.max_buffer = max_buffer
+        # the oldest events are dropped over max_buffer
+        self._buffer: deque[dict] = deque(maxlen=max_buffer)
+        # add() is called from pool threads, the writer runs on the event loop
+        self._lock = threading.Lock()
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._batch_ready: asyncio.Event | None = None
+        self._task: asyncio.Task | None = None
+
+    def __len__(self) -> int:
+        return len(self._buffer)
+
+    def add(self, user_id: int, user_word_id: int, word_id: int, shown_at: datetime.datetime, success: bool
+            ) -> None:
+        with self._lock:
+            self._buffer.append(dict(user_id=user_id, user_word_id=user_word_id, word_id=word_id,
+                                     shown_at=shown_at, success=success))
+            batch_ready = len(self._buffer) == self.batch_size
+        if batch_ready and self._loop is not None:
+            self._loop.call_soon_threadsafe(self._batch_ready.set)
+
+    def take(self) -> list[dict]:
+        with self._lock:
+            events = list(self._buffer)
+            self._buffer.clear()
+        return events
+
+    def give_back(self, events: list[dict]) -> None:
+        """Put events that couldn't be written in front of the buffer, dropping the oldest over *max_buffer*."""
+        with self._lock:
+            dropped = len(events) + len(self._buffer) - self.max_buffer
+            buffer = deque(events, maxlen=self.max_buffer)
+            buffer.extend(self._buffer)
+            self._buffer = buffer
+            if dropped > 0:
+                logger.error('Review log buffer is full, %d events dropped', dropped)
+
+    def flush(self) -> int:
+        """Write every buffered event in batches; returns the amount written."""
+        events = self.take()
+        for start in range(0, len(events), self.batch_size):
+            batch = events[start:start + self.batch_size]
+            started = time.perf_counter()
+            try:
+                db_manager.add_review_events(batch)
+            except Exception:
+                self.give_back(events[start:])
+                raise
+            record_review_events(len(batch), time.perf_counter() - started)
+        return len(events)
+
+    async def run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._batch_ready.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._batch_ready.clear()
+            try:
+                await run_blocking('db', self.flush)
+            except Exception:
+                logger.exception('Review events were not written, retrying in %s s', self.interval)
+
+    def start(self) -> None:
+        self._loop = asyncio.get_running_loop()
+        self._batch_ready = asyncio.Event()
+        self._task = asyncio.create_task(self.run())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._loop = None
+        await run_blocking('db', self.flush)
+
+
+review_log = ReviewLog()
@@ -0,0 +1,160 @@
+"""In-memory review state of users' words for card selection without sorting users_words in SQL.
+
+Every user's words are kept as parallel NumPy arrays (user word id, word id, fails, success, last shown and due
+time), loaded from the database on the first card request and updated in place by every answered card.
+Choosing the next cards is a vectorized score over the arrays plus ``argpartition`` for the top K.
+
+Scoring functions are pluggable: a scorer takes a ReviewState and the current time (epoch seconds) and returns
+one score per card, higher scores are shown first. Register new ones in *scorers*.
+
+Environment:
+- *card_scoring* - default scorer: ``classic`` (default, the former SQL ordering) or ``due``
+- *review_state_users* - how many users' states are kept in memory (default 10000, least recently used dropped)
+- *review_state_ttl* - seconds after which a state is reloaded from the database (default 300), so changes
+  made by other worker processes are picked up
+"""
+import datetime
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+CARD_SCORING = os.getenv('card_scoring', 'classic')
+REVIEW_STATE_USERS = int(os.getenv('review_state_users', 10_000))
+REVIEW_STATE_TTL = float(os.getenv('review_state_ttl', 300))
+
+# a card answered correctly n more times than wrong is due again after BASE_INTERVAL * 2 ** n
+BASE_INTERVAL = 24 * 60 * 60
+MAX_INTERVAL_POWER = 8
+
+
+def epoch(moment: datetime.datetime | None) -> float:
+    """Naive datetimes (as stored in users_words) as seconds, without local time zone conversions."""
+    if moment is None:
+        moment = datetime.datetime(1, 1, 1)
+    return moment.replace(tzinfo=datetime.timezone.utc).timestamp()
+
+
+def due_times(fails: np.ndarray, success: np.ndarray, last_shown: np.ndarray) -> np.ndarray:
+    power = np.clip(success.astype(np.int64) - fails, 0, MAX_INTERVAL_POWER)
+    return last_shown + BASE_INTERVAL * np.exp2(power)
+
+
+def pack_ids(ids: list[int]) -> bytes:
+    return np.asarray(ids, dtype='<i8').tobytes()
+
+
+def unpack_ids(packed: bytes) -> list[int]:
+    return np.frombuffer(packed, dtype='<i8').tolist()
+
+
+class ReviewState:
+    """Review state of one user's words as parallel arrays, row i describing user word user_word_ids[i]."""
+
+    def __init__(self, rows: list[tuple], topic_links: list[tuple[int, int]]):
+        """*rows* - (user_word_id, word_id, fails, success, last_shown); *topic_links* - (user_word_id, topic_id)."""
+        self.user_word_ids = np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows))
+        self.word_ids = np.fromiter((row[1] for row in rows), dtype=np.int64, count=len(rows))
+        self.fails = np.fromiter((row[2] or 0 for row in rows), dtype=np.int32, count=len(rows))
+        self.success = np.fromiter((row[3] or 0 for row in rows), dtype=np.int32, count=len(rows))
+        self.last_shown = np.fromiter((epoch(row[4]) for row in rows), dtype=np.float64, count=len(rows))
+        self.due = due_times(self.fails, self.success, self.last_shown)
+        self.positions = {int(user_word_id): index for index, user_word_id in enumerate(self.user_word_ids)}
+        self.link_rows = np.fromiter((self.positions[user_word_id] for user_word_id, _ in topic_links
+                                      if user_word_id in self.positions), dtype=np.int64)
+        self.link_topics = np.fromiter((topic_id for user_word_id, topic_id in topic_links
+                                        if user_word_id in self.positions), dtype=np.int64)
+        self.loaded_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.user_word_ids)
+
+    def top(self, limit: int, scorer: Callable[['ReviewState', float], np.ndarray], topic_id: int | None = None,
+            now: float | None = None) -> list[int]:
+        """Ids of the *limit* user words with the highest scores (of the topic, if given), best first."""
+        now = epoch(datetime.datetime.now()) if now is None else now
+        with self.lock:
+            scores = scorer(self, now)
+            # (user_word_id, topic_id) is unique, so rows of a topic are unique too
+            rows = self.link_rows[self.link_topics == topic_id] if topic_id else None
+            if rows is not None:
+                scores = scores[rows]
+            if limit < len(scores):
+                best = np.argpartition(-scores, limit - 1)[:limit]
+            else:
+                best = np.arange(len(scores))
+            best = best[np.argsort(-scores[best], kind='stable')]
+            if rows is not None:
+                best = rows[best]
+            return self.user_word_ids[best].tolist()
+
+    def answer(self, user_word_id: int, shown_time: datetime.datetime, guess: str) -> None:
+        index = self.positions.get(user_word_id)
+        if index is None:
+            return
+        with self.lock:
+            counter = self.success if guess == 'success' else self.fails
+            counter[index] += 1
+            self.last_shown[index] = epoch(shown_time)
+            self.due[index] = due_times(self.fails[index:index + 1], self.success[index:index + 1],
+                                        self.last_shown[index:index + 1])[0]
+
+
+def classic_score(state: ReviewState, now: float) -> np.ndarray:
+    """fails * 2 - success + half the seconds since the card was shown: the ordering get_user_cards used in SQL."""
+    return state.fails * 2.0 - state.success + (now - state.last_shown) * 0.5
+
+
+def due_score(state: ReviewState, now: float) -> np.ndarray:
+    """Most overdue cards first (spaced repetition), more often failed cards first among equally overdue ones."""
+    return (now - state.due) + state.fails * 60.0
+
+
+scorers: dict[str, Callable[[ReviewState, float], np.ndarray]] = {'classic': classic_score, 'due': due_score}
+
+
+class ReviewStates:
+    """ReviewState of recently active users, least recently used dropped over *max_users*."""
+
+    def __init__(self, max_users: int = REVIEW_STATE_USERS, ttl: float = REVIEW_STATE_TTL):
+        self.max_users = max_users
+        self.ttl = ttl
+        self._states: OrderedDict[int, ReviewState] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id: int, loader: Callable[[int], ReviewState]) -> ReviewState:
+        with self._lock:
+            state = self._states.get(user_id)
+            if state is not None and time.monotonic() - state.loaded_at < self.ttl:
+                self._states.move_to_end(user_id)
+                return state
+        state = loader(user_id)
+        with self._lock:
+            self._states[user_id] = state
+            self._states.move_to_end(user_id)
+            while len(self._states) > self.max_users:
+                self._states.popitem(last=False)
+        return state
+
+    def answer(self, user_id: int, user_word_id: int, shown_time: datetime.datetime, guess: str) -> None:
+        """Apply an answered card to the user's state, if it is loaded."""
+        with self._lock:
+            state = self._states.get(user_id)
+        if state is not None:
+            state.answer(user_word_id, shown_time, guess)
+
+    def forget(self, user_id: int | None = None) -> None:
+        """Drop the state of a user whose words or topics changed (of everybody without *user_id*)."""
+        with self._lock:
+            if user_id is None:
+                self._states.clear()
+            else:
+                self._states.pop(user_id, None)
+
+
+review_states = ReviewStates()
@@ -10,8 +10,10 @@ from dotenv import load_dotenv
 import os
 
 from data.database_manager import db_manager
+from data.replicas import current_user_id
 from data.schemas import UserIn, UserOut
 from modules.utils import raise_exception
+from modules.executor import run_blocking
 
 load_dotenv()
 SECRET_KEY = os.getenv('OLD_SECRET_KEY')
@@ -49,6 +51,13 @@ def get_user(username: str) -> UserIn | None:
     return db_user
 
 
+def get_user_out(username: str) -> UserOut | None:
+    db_user = get_user(username)
+    if db_user is None:
+        return None
+    return UserOut.model_validate(db_user, from_attributes=True)
+
+
 def authenticate_user(username: str, password: str):
     user = get_user(username)
     if not user:
@@ -98,21 +107,30 @@ def create_refresh_token(data: dict,
     return refresh_token
 
 
-async def get_current_user(token: Annotated[str, Depends(oauth2_scheme)]) -> UserOut:
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Could not validate credentials",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
+async def get_user_from_token(token: str) -> UserOut | None:
+    """The user an access token was issued to; None for an invalid or expired token or an unknown user."""
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         username: str = payload.get("sub")
         if username is None:
-            raise credentials_exception
+            return None
         token_data = TokenData(username=username)
     except InvalidTokenError:
-        raise credentials_exception
-    user = get_user(username=token_data.username)
+        return None
+    user = await run_blocking('db', get_user_out, token_data.username)
+    if user is not None:
+        # the rest of the request reads its own writes (data/replicas.py)
+        current_user_id.set(user.id)
+    return user
+
+
+async def get_current_user(token: Annotated[str, Depends(oauth2_scheme)]) -> UserOut:
+    credentials_exception = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Could not validate credentials",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+    user = await get_user_from_token(token)
     if user is None:
         raise credentials_exception
     return user
@@ -146,8 +164,8 @@ async def decode_refresh_token(token: str, key: str, token_type: str) -> str:
         print(f'Token decoding error: {e}')
 
 
-def is_user_admin(current_user: Annotated[UserOut, Depends(get_current_user)]) -> bool:
-    if not db_manager.check_user_role(current_user.id, 'Admin'):
+async def is_user_admin(current_user: Annotated[UserOut, Depends(get_current_user)]) -> bool:
+    if not await run_blocking('db', db_manager.check_user_role, current_user.id, 'Admin'):
         raise_exception(403, f'User "{current_user.username}" is not an Admin. Not enough privileges.')
     return True
 
@@ -1,77 +1,155 @@
+import csv
+import io
+from typing import Generator, Iterator
+from fastapi import Response
+from fastapi.responses import StreamingResponse
+from pydantic import TypeAdapter, BaseModel
+
 from data.database_manager import db_manager
 from data.models import *
 from data.schemas import *
+from modules.executor import iterate_in_pool
 
+EXPORT_MEDIA_TYPES = {'ndjson': 'application/x-ndjson', 'csv': 'text/csv'}
 
-def word_out_from_user_word(user_word: UserWord) -> WordOut:
-    word_out = WordOut(
+word_out_list = TypeAdapter(list[WordOut])
+admin_word_out_list = TypeAdapter(list[AdminWordOut])
+user_word_card_list = TypeAdapter(list[UserWordCard])
+admin_user_word_out_list = TypeAdapter(list[AdminUserWordOut])
+user_out_admin_list = TypeAdapter(list[UserOutAdmin])
+word_search_list = TypeAdapter(list[WordSearchResult])
+admin_word_search_list = TypeAdapter(list[AdminWordSearchResult])
+sync_out = TypeAdapter(SyncOut)
+
+
+def list_response(adapter: TypeAdapter, rows: list[dict]) -> Response:
+    """Validate a whole page of rows in one call and encode it straight to JSON bytes.
+
+    Returning a ready Response makes FastAPI skip the second validation against the route's response model.
+    """
+    return Response(content=adapter.dump_json(adapter.validate_python(rows)), media_type='application/json')
+
+
+def word_out_row(user_word: UserWord) -> dict:
+    word = user_word.word
+    row = dict(
         id=user_word.id,
-        word=user_word.word.word,
-        word_type=user_word.word.word_type.name,
-        english=user_word.word.english,
-        level=user_word.word.level,
-        topics=[word_topic.topic.name for word_topic in user_word.user_word_topic]
+        word=word.word,
+        word_type=word.word_type.name,
+        english=word.english,
+        level=word.level,
+        topics=[word_topic.topic.name for word_topic in user_word.user_word_topic],
+        example=None,
+        example_translation=None
     )
-    if user_word.word.example:
-        word_out.example = user_word.word.example.example
-        word_out.example_translation = user_word.word.example.translation
+    if word.example:
+        row['example'] = word.example.example
+        row['example_translation'] = word.example.translation
     if user_word.custom_translation:
-        word_out.english = user_word.custom_translation.translation
+        row['english'] = user_word.custom_translation.translation
     if user_word.example:
-        word_out.example = user_word.example.example
-        word_out.example_translation = user_word.example.translation
-    return word_out
+        row['example'] = user_word.example.example
+        row['example_translation'] = user_word.example.translation
+    return row
 
 
-def word_out_list_from_user_words(user_words: list[UserWord]) -> list[WordOut]:
-    return [word_out_from_user_word(user_word) for user_word in user_words]
-
-
-def admin_word_from_word(db_word: Word) -> AdminWordOut:
-    admin_word_out = AdminWordOut(
+def word_out_from_user_word(user_word: UserWord) -> WordOut:
+    return WordOut(**word_out_row(user_word))
+
+
+def word_out_list_response(user_words: list[UserWord]) -> Response:
+    return list_response(word_out_list, [word_out_row(user_word) for user_word in user_words])
+
+
+def export_chunks(rows_batches: Iterator[list[dict]], model: type[BaseModel],
+                  export_format: Literal['ndjson', 'csv']) -> Iterator[bytes]:
+    """Encode batches of rows as NDJSON lines or CSV records, one chunk per batch."""
+    if export_format == 'ndjson':
+        for rows in rows_batches:
+            yield ''.join(model.model_validate(row).model_dump_json() + '\n' for row in rows).encode()
+        return
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=list(model.model_fields))
+    writer.writeheader()
+    yield buffer.getvalue().encode()
+    for rows in rows_batches:
+        buffer.seek(0)
+        buffer.truncate()
+        for row in rows:
+            item = model.model_validate(row).model_dump(mode='json')
+            writer.writerow({key: '; '.join(map(str, value)) if isinstance(value, list) else value
+                             for key, value in item.items()})
+        yield buffer.getvalue().encode()
+
+
+def export_response(chunks: Iterator[bytes], export_format: Literal['ndjson', 'csv'], filename: str
+                    ) -> StreamingResponse:
+    return StreamingResponse(iterate_in_pool('db', chunks),
+                             media_type=EXPORT_MEDIA_TYPES[export_format],
+                             headers={'Content-Disposition': f'attachment; filename="{filename}.{export_format}"'})
+
+
+def user_words_export(user_words_batches: Generator[list[UserWord], None, None],
+                      export_format: Literal['ndjson', 'csv']) -> Iterator[bytes]:
+    rows_batches = ([word_out_row(user_word) for user_word in user_words] for user_words in user_words_batches)
+    try:
+        yield from export_chunks(rows_batches, WordOut, export_format)
+    finally:
+        # ends the batches' session also when the download stops early
+        user_words_batches.close()
+
+
+def admin_word_row(db_word: Word, users: list[int]) -> dict:
+    row = dict(
         id=db_word.id,
         word=db_word.word,
         word_type=db_word.word_type.name,
         english=db_word.english,
         level=db_word.level,
-        users=db_manager.get_word_users(db_word.id)
+        users=users,
+        example=None,
+        example_translation=None
     )
     if db_word.example:
-        admin_word_out.example = db_word.example.example
-        admin_word_out.example_translation = db_word.example.translation
-    return admin_word_out
+        row['example'] = db_word.example.example
+        row['example_translation'] = db_word.example.translation
+    return row
+
+
+def admin_word_from_word(db_word: Word) -> AdminWordOut:
+    return AdminWordOut(**admin_word_row(db_word, db_manager.get_word_users(db_word.id)))
 
 
-def admin_wordlist_from_words(words: list[Word]) -> list[AdminWordOut]:
-    if not words:
-        return []
-    return [admin_word_from_word(admin_word) for admin_word in words]
+def words_export(words_batches: Generator[tuple[list[Word], dict[int, list[int]]], None, None],
+                 export_format: Literal['ndjson', 'csv']) -> Iterator[bytes]:
+    rows_batches = ([admin_word_row(db_word, words_users.get(db_word.id, [])) for db_word in db_words]
+                    for db_words, words_users in words_batches)
+    try:
+        yield from export_chunks(rows_batches, AdminWordOut, export_format)
+    finally:
+        words_batches.close()
+
+
+def user_out_from_user(user: User) -> UserOut:
+    return UserOut.model_validate(user, from_attributes=True)
 
 
 def user_out_admin(user: User) -> UserOutAdmin:
-    user.role = user.user_role.role.name
-    return user
-
-
-def admin_wordlist_out_from_user_words(words: list[UserWord], sort_by: str) -> list[AdminUserWordOut]:
-    wordlist = []
-    for user_word in words:
-        admin_word = AdminUserWordOut(
-            id=user_word.id,
-            word_id=user_word.word_id,
-            word=user_word.word.word,
-            user_id=user_word.user_id,
-            topics=[user_topic.topic.name for user_topic in user_word.user_word_topic],
-            fails=user_word.fails,
-            success=user_word.success,
-            last_shown=user_word.last_shown,
-            custom_translation=user_word.custom_translation,
-            custom_level=user_word.user_level
-        )
-        if user_word.example:
-            admin_word.custom_example = user_word.example.example
-        wordlist.append(admin_word)
-    return wordlist
+    return UserOutAdmin(**user_out_from_user(user).model_dump(), role=user.user_role.role.name)
+
+
+def topic_out_from_topic(topic: Topic) -> TopicOut:
+    return TopicOut(id=topic.id, name=topic.name)
+
+
+def topic_out_list_from_topics(topics: list[Topic]) -> list[TopicOut]:
+    return [topic_out_from_topic(topic) for topic in topics]
+
+
+def word_inflections_from_db(db_inflection: WordInflection) -> WordInflections:
+    word = db_inflection.word
+    return WordInflections(word_id=word.id, word=word.word, word_type=word.word_type.name,
+                           tables=db_inflection.tables)
 
 
 def admin_word_out_from_db_word(db_word: Word) -> AdminWord:
@@ -87,32 +165,61 @@ def admin_word_out_from_db_word(db_word: Word) -> AdminWord:
     return word_out
 
 
-def user_word_card_from_user_word(db_word: UserWord) -> UserWordCard:
-    user_word_card = UserWordCard(
+def rotated_example(word_example: WordExample | None, example_index: int,
+                    generated: UserWordExample | None = None) -> tuple[str | None, str | None]:
+    """The example at the user's rotation pointer: the generated example of the user word comes first, then every
+    stored example of the word (its default example if only one is stored)."""
+    examples = []
+    if generated:
+        examples.append((generated.example, generated.translation))
+    if word_example:
+        examples.extend(word_example.examples or [(word_example.example, word_example.translation)])
+    if not examples:
+        return None, None
+    example, translation = examples[(example_index or 0) % len(examples)]
+    return example, translation
+
+
+def user_word_card_row(db_word: UserWord) -> dict:
+    word = db_word.word
+    row = dict(
         id=db_word.id,
-        word=db_word.word.word,
-        word_type=db_word.word.word_type.name,
-        level=db_word.word.level,
-        english=db_word.word.english,
-        example=db_word.word.example.example,
-        example_translation=db_word.word.example.translation,
+        word=word.word,
+        word_type=word.word_type.name,
+        level=word.level,
+        english=word.english,
+        example=None,
+        example_translation=None,
         topics=[user_topic.topic.name for user_topic in db_word.user_word_topic],
         fails=db_word.fails,
         success=db_word.success,
         last_shown=db_word.last_shown
     )
     if db_word.custom_translation:
-        user_word_card.english = db_word.custom_translation.translation
+        row['english'] = db_word.custom_translation.translation
     if db_word.user_level:
-        user_word_card.level = db_word.user_level.level
-    if db_word.example:
-        user_word_card.example = db_word.example.example
-        user_word_card.example_translation = db_word.example.translation
-    return user_word_card
+        row['level'] = db_word.user_level.level
+    # a custom example always wins; a generated one takes the first turn of the rotation
+    if db_word.example and not db_word.example.generated:
+        row['example'] = db_word.example.example
+        row['example_translation'] = db_word.example.translation
+    else:
+        row['example'], row['example_translation'] = rotated_example(word.example, db_word.example_index,
+                                                                     db_word.example)
+    return row
+
+
+def user_word_card_from_user_word(db_word: UserWord) -> UserWordCard:
+    return UserWordCard(**user_word_card_row(db_word))
+
+
+def user_word_cards_response(user_words: list[UserWord]) -> Response:
+    return list_response(user_word_card_list, [user_word_card_row(user_word) for user_word in user_words])
 
 
 if __name__ == '__main__':
-    # word = db_manager.get_user_words(6)[0]
-    # print(word_out_from_user_word(word))
-    u_words = word_out_list_from_user_words(db_manager.get_user_words(6), 'word_type')
-    [print(u_wo) for u_wo in u_words]
+    import timeit
+    u_words = db_manager.get_user_words(6, limit=100)
+    word_out_list_response(u_words)  # warm up lazy loaded relationships
+    per_item = timeit.timeit(lambda: word_out_list_response(u_words), number=100) / 100 / max(len(u_words), 1)
+    print(f'word_out_list_response: {per_item * 1e6:.1f} us per item')
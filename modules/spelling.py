@@ -0,0 +1,227 @@
+"""Local typo-tolerant word lookup (SymSpell-style deletion dictionary).
+
+Suggestions for a misspelled word come from every word of the ``words`` table plus words found by earlier
+woerter.net searches; the remote search is only asked when nothing known is close enough. Words added or deleted
+in this worker change the index right away; it is rebuilt from the database every *spelling_refresh_interval*
+seconds to pick up the changes of the other workers.
+
+Environment:
+- *spelling_refresh_interval* - seconds between rebuilds of the index (default 300)
+"""
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable
+from dotenv import load_dotenv
+
+from data.database_manager import db_manager
+from modules.executor import run_blocking
+from modules.metrics import record_cache
+from modules.word_info import get_word_info_from_search
+
+load_dotenv()
+SPELLING_REFRESH_INTERVAL = float(os.getenv('spelling_refresh_interval', 300))
+MAX_DISTANCE = 2
+SEARCH_CACHE_SIZE = 1024
+ARTICLES = re.compile(r'^((der|die|das)[, ]+)+')
+
+
+def normalize(word: str) -> str:
+    """Lower-cased word without leading articles and with ß written as ss: 'der, das Joghurt' -> 'joghurt'."""
+    return ARTICLES.sub('', word.lower().strip()).replace('ß', 'ss')
+
+
+def max_distance_for(term: str) -> int:
+    return 1 if len(term) <= 4 else MAX_DISTANCE
+
+
+def deletes(term: str, distance: int) -> set[str]:
+    """All strings made from *term* by removing up to *distance* characters (including *term* itself)."""
+    result = {term}
+    edge = {term}
+    for _ in range(distance):
+        edge = {variant[:index] + variant[index + 1:] for variant in edge for index in range(len(variant))}
+        result |= edge
+    return result
+
+
+def edit_distance(first: str, second: str, limit: int) -> int:
+    """Damerau-Levenshtein (optimal string alignment) distance, or limit + 1 as soon as it is over *limit*."""
+    if abs(len(first) - len(second)) > limit:
+        return limit + 1
+    previous_previous = None
+    previous = list(range(len(second) + 1))
+    for first_index in range(1, len(first) + 1):
+        current = [first_index] + [0] * len(second)
+        for second_index in range(1, len(second) + 1):
+            cost = first[first_index - 1] != second[second_index - 1]
+            current[second_index] = min(previous[second_index] + 1, current[second_index - 1] + 1,
+                                        previous[second_index - 1] + cost)
+            if (first_index > 1 and second_index > 1 and first[first_index - 1] == second[second_index - 2]
+                    and first[first_index - 2] == second[second_index - 1]):
+                current[second_index] = min(current[second_index], previous_previous[second_index - 2] + 1)
+        if min(current) > limit:
+            return limit + 1
+        previous_previous, previous = previous, current
+    return previous[-1]
+
+
+class SpellingIndex:
+    """Maps every deletion variant of a known term to the term, and every term to its words."""
+
+    def __init__(self):
+        self._deletes: dict[str, set[str]] = {}
+        # normalized term -> {(word, word_type)}
+        self._words: dict[str, set[tuple[str, str | None]]] = {}
+        self._lock = threading.Lock()
+        # one thread (re)builds the index at a time
+        self._load_lock = threading.Lock()
+        # changes made while the index is being rebuilt, replayed on the new one
+        self._changes: list[tuple[str, str | None, bool]] | None = None
+        self.loaded_at: float | None = None
+
+    def __len__(self) -> int:
+        return len(self._words)
+
+    def _apply(self, word: str, word_type: str | None, present: bool) -> None:
+        term = normalize(word)
+        if not term:
+            return
+        if present:
+            if term not in self._words:
+                self._words[term] = set()
+                for variant in deletes(term, max_distance_for(term)):
+                    self._deletes.setdefault(variant, set()).add(term)
+            self._words[term].add((word, word_type))
+            return
+        words = self._words.get(term)
+        if words is None:
+            return
+        words.discard((word, word_type))
+        if not words:
+            del self._words[term]
+            for variant in deletes(term, max_distance_for(term)):
+                terms = self._deletes.get(variant)
+                if terms is not None:
+                    terms.discard(term)
+                    if not terms:
+                        del self._deletes[variant]
+
+    def _change(self, word: str, word_type: str | None, present: bool) -> None:
+        with self._lock:
+            self._apply(word, word_type, present)
+            if self._changes is not None:
+                self._changes.append((word, word_type, present))
+
+    def add(self, word: str, word_type: str | None) -> None:
+        self._change(word, word_type, True)
+
+    def remove(self, word: str, word_type: str | None) -> None:
+        self._change(word, word_type, False)
+
+    def rename(self, previous: tuple[str, str | None], current: tuple[str, str | None]) -> None:
+        if previous != current:
+            self.remove(*previous)
+            self.add(*current)
+
+    def load(self, words: Callable[[], list[tuple[str, str | None]]]) -> None:
+        """Replace the index with the *words* returned by the loader; suggestions use the old one meanwhile."""
+        with self._lock:
+            self._changes = []
+        try:
+            fresh = SpellingIndex()
+            for word, word_type in words():
+                fresh._apply(word, word_type, True)
+            with self._lock:
+                for change in self._changes:
+                    fresh._apply(*change)
+                self._deletes, self._words = fresh._deletes, fresh._words
+                self.loaded_at = time.monotonic()
+        finally:
+            with self._lock:
+                self._changes = None
+
+    def refresh(self, words: Callable[[], list[tuple[str, str | None]]], max_age: float) -> None:
+        """Load the index if it was never loaded or is older than *max_age* seconds.
+
+        The first load is waited for; a rebuild is left to the thread that started it, the others don't wait.
+        """
+        if self.loaded_at is not None and time.monotonic() - self.loaded_at < max_age:
+            return
+        if not self._load_lock.acquire(blocking=self.loaded_at is None):
+            return
+        try:
+            if self.loaded_at is None or time.monotonic() - self.loaded_at >= max_age:
+                self.load(words)
+        finally:
+            self._load_lock.release()
+
+    def suggest(self, word: str, limit: int = 5) -> list[dict]:
+        """Known words within the allowed edit distance of *word*, closest (then most similar length) first."""
+        term = normalize(word)
+        distance_limit = max_distance_for(term)
+        candidates = set()
+        with self._lock:
+            for variant in deletes(term, distance_limit):
+                candidates |= self._deletes.get(variant, set())
+        ranked = []
+        for candidate in candidates:
+            distance = edit_distance(term, candidate, distance_limit)
+            if distance <= distance_limit:
+                ranked.append((distance, abs(len(candidate) - len(term)), candidate))
+        suggestions = []
+        with self._lock:
+            for _, _, candidate in sorted(ranked)[:limit]:
+                suggestions.extend({'word': found_word, 'word_type': word_type}
+                                   for found_word, word_type in sorted(self._words[candidate], key=str))
+        return suggestions[:limit]
+
+
+spelling_index = SpellingIndex()
+search_cache: OrderedDict[str, list[dict]] = OrderedDict()
+search_cache_lock = threading.Lock()
+
+
+def known_words() -> list[tuple[str, str | None]]:
+    """(word, word_type) of the words table and of the remembered woerter.net searches."""
+    with search_cache_lock:
+        searched = [(found_word['word'], found_word['word_type'])
+                    for found_words in search_cache.values() for found_word in found_words]
+    return db_manager.get_words_names() + searched
+
+
+def local_suggestions(word: str) -> list[dict]:
+    spelling_index.refresh(known_words, SPELLING_REFRESH_INTERVAL)
+    return spelling_index.suggest(word)
+
+
+def remote_suggestions(word: str) -> list[dict] | str:
+    """woerter.net search for *word*, remembered for the next SEARCH_CACHE_SIZE different searches."""
+    key = normalize(word)
+    with search_cache_lock:
+        found_words = search_cache.get(key)
+        if found_words is not None:
+            search_cache.move_to_end(key)
+    record_cache('word_search', found_words is not None)
+    if found_words is not None:
+        return found_words
+    found_words = get_word_info_from_search(word)
+    if isinstance(found_words, list):
+        with search_cache_lock:
+            search_cache[key] = found_words
+            if len(search_cache) > SEARCH_CACHE_SIZE:
+                search_cache.popitem(last=False)
+        for found_word in found_words:
+            spelling_index.add(found_word['word'], found_word['word_type'])
+    return found_words
+
+
+async def find_similar_words(word: str) -> list[dict] | str:
+    """Words the user probably meant: known words first, woerter.net search only if there are none."""
+    suggestions = await run_blocking('db', local_suggestions, word)
+    record_cache('spelling_index', bool(suggestions))
+    if suggestions:
+        return suggestions
+    return await run_blocking('scraper', remote_suggestions, word)
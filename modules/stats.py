@@ -0,0 +1,75 @@
+"""Per-user progress counters, kept up to date by DataManager as words and reviews change.
+
+Counters are rows of users_counters (user_id, name, value), so /users/me/stats reads a few rows instead of
+counting users_words:
+- *reviews*, *successes* - answered cards and correct answers (equal to the sums of users_words.fails/success)
+- *words* - user words, *topic:<topic id>* - user words per topic
+- *mastered:<level>* - mastered user words by CEFR level: answered correctly at least *mastered_margin* (default 3)
+  times more often than wrongly
+- *streak*, *longest_streak*, *last_review_day* (date ordinal) - days in a row with at least one answered card
+- *data_version* - bumped on every change of the user's words, topics or cards (ETags, modules/etags.py)
+"""
+import datetime
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+MASTERED_MARGIN = int(os.getenv('mastered_margin', 3))
+
+STREAK_COUNTERS = ('streak', 'longest_streak', 'last_review_day')
+
+
+def is_mastered(fails: int | None, success: int | None) -> bool:
+    return (success or 0) - (fails or 0) >= MASTERED_MARGIN
+
+
+def user_word_counters(level: str | None, topic_ids: list[int], fails: int | None, success: int | None
+                       ) -> dict[str, int]:
+    """What one user word adds to its user's counters."""
+    counters = {'words': 1}
+    for topic_id in topic_ids:
+        counters[f'topic:{topic_id}'] = 1
+    if is_mastered(fails, success):
+        counters[f'mastered:{level or "Unknown"}'] = 1
+    return counters
+
+
+def counters_delta(before: dict[str, int], after: dict[str, int]) -> dict[str, int]:
+    delta = {name: after.get(name, 0) - before.get(name, 0) for name in before.keys() | after.keys()}
+    return {name: value for name, value in delta.items() if value}
+
+
+def next_streak(counters: dict[str, int], day: datetime.date) -> dict[str, int]:
+    """Streak counters after a card was answered on *day*."""
+    last_day = counters.get('last_review_day', 0)
+    streak = counters.get('streak', 0)
+    if last_day == day.toordinal():
+        return {}
+    streak = streak + 1 if last_day == day.toordinal() - 1 else 1
+    return {'streak': streak, 'longest_streak': max(streak, counters.get('longest_streak', 0)),
+            'last_review_day': day.toordinal()}
+
+
+def current_streak(counters: dict[str, int], today: datetime.date) -> int:
+    """The stored streak, or 0 if it was broken: no card answered yesterday or today."""
+    return counters.get('streak', 0) if counters.get('last_review_day', 0) >= today.toordinal() - 1 else 0
+
+
+def stats_from_counters(counters: dict[str, int], topic_names: dict[int, str], today: datetime.date) -> dict:
+    reviews = counters.get('reviews', 0)
+    last_review_day = counters.get('last_review_day')
+    topics_words = {int(name.removeprefix('topic:')): value for name, value in counters.items()
+                    if name.startswith('topic:') and value}
+    return dict(
+        streak=current_streak(counters, today),
+        longest_streak=counters.get('longest_streak', 0),
+        last_review_date=datetime.date.fromordinal(last_review_day) if last_review_day else None,
+        reviews=reviews,
+        successes=counters.get('successes', 0),
+        success_rate=counters.get('successes', 0) / reviews if reviews else 0.0,
+        words=counters.get('words', 0),
+        mastered={name.removeprefix('mastered:'): value for name, value in counters.items()
+                  if name.startswith('mastered:') and value},
+        topics=[dict(id=topic_id, name=topic_names.get(topic_id, ''), words=topics_words[topic_id])
+                for topic_id in sorted(topics_words)]
+    )
@@ -0,0 +1,46 @@
+"""Delta sync of a user's words and topics for offline clients (/users/me/sync).
+
+Rows of users_words and of its translations, examples, levels and topic links carry *updated_at*; deleted user
+words and topics the user no longer has leave a row in sync_tombstones. A sync returns everything changed after
+the client's token and a new token, so its cost follows the amount of changes, not the size of the vocabulary.
+
+The token is the server time of the previous sync, base64 encoded so clients treat it as opaque. Changes are
+looked up *sync_overlap* seconds before it: a row written by a transaction that was still open while the previous
+sync ran is returned again instead of being missed (clients apply changes idempotently, by id).
+
+Environment:
+- *sync_overlap* - seconds of changes repeated by every sync (default 5)
+- *sync_tombstone_days* - days tombstones are kept (default 90, ``data/maintenance.py --prune-tombstones``);
+  a client with an older token gets a full sync with ``reset`` set
+"""
+import base64
+import binascii
+import datetime
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+SYNC_OVERLAP = datetime.timedelta(seconds=float(os.getenv('sync_overlap', 5)))
+SYNC_TOMBSTONE_DAYS = int(os.getenv('sync_tombstone_days', 90))
+
+
+def encode_token(moment: datetime.datetime) -> str:
+    return base64.urlsafe_b64encode(moment.isoformat().encode()).decode().rstrip('=')
+
+
+def decode_token(token: str) -> datetime.datetime:
+    """Time of the sync that issued *token*; ValueError for a token this server didn't issue."""
+    try:
+        moment = datetime.datetime.fromisoformat(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)).decode())
+    except (binascii.Error, UnicodeDecodeError) as error:
+        raise ValueError(f'Invalid sync token: {token}') from error
+    if moment.tzinfo is not None:
+        raise ValueError(f'Invalid sync token: {token}')
+    return moment
+
+
+def changes_since(token_time: datetime.datetime | None, now: datetime.datetime) -> datetime.datetime | None:
+    """Lower bound of the changes to return; None for a full sync (no token or tombstones already pruned)."""
+    if token_time is None or token_time < now - datetime.timedelta(days=SYNC_TOMBSTONE_DAYS):
+        return None
+    return token_time - SYNC_OVERLAP
@@ -0,0 +1,32 @@
+"""Trigram similarity in Python, the same idea as PostgreSQL's pg_trgm.
+
+Used to rank search results on databases without pg_trgm (SQLite in development).
+"""
+import re
+
+WORD_PATTERN = re.compile(r'\w+')
+
+
+def trigrams(word: str) -> set[str]:
+    """Trigrams of a single lower-cased word padded like pg_trgm does: two spaces in front, one at the end."""
+    padded = f'  {word.lower()} '
+    return {padded[index:index + 3] for index in range(len(padded) - 2)}
+
+
+def similarity(first: str, second: str) -> float:
+    first_trigrams, second_trigrams = trigrams(first), trigrams(second)
+    return len(first_trigrams & second_trigrams) / len(first_trigrams | second_trigrams)
+
+
+def word_similarity(query: str, text: str | None) -> float:
+    """How well *query* matches *text* (0..1): exact match 1, a part of the text at least 0.5,
+    otherwise the trigram similarity to the closest word of the text.
+    """
+    if not text:
+        return 0.0
+    query, text = query.lower().strip(), text.lower()
+    if query == text:
+        return 1.0
+    if query in text:
+        return 0.5 + 0.5 * len(query) / len(text)
+    return max((similarity(query, word) for word in WORD_PATTERN.findall(text)), default=0.0)
@@ -1,18 +1,46 @@
-import requests
-from bs4 import BeautifulSoup
+from __future__ import annotations
+import os
 from random import randint
-from typing import Literal
+from typing import Literal, TYPE_CHECKING
 import time
 
+from modules.metrics import record_fetch
+
+if TYPE_CHECKING:
+    # requests and bs4 are imported on first fetch/parse, so importing the app doesn't pay for them
+    import requests
+    from bs4 import BeautifulSoup
+
+WOERTER_URL = os.getenv('woerter_url', 'https://www.woerter.net')
+
+
+def fetch(url: str) -> requests.Response:
+    """GET a woerter.net page, recording latency, status and size in the scraper metrics."""
+    import requests
+    started = time.perf_counter()
+    try:
+        response = requests.get(url)
+    except requests.exceptions.RequestException:
+        record_fetch('error', time.perf_counter() - started, 0)
+        raise
+    record_fetch(response.status_code, time.perf_counter() - started, len(response.content))
+    return response
+
+
+def make_soup(html: str) -> BeautifulSoup:
+    from bs4 import BeautifulSoup
+    return BeautifulSoup(html, 'html.parser')
+
 
 def get_soup_for_word(word: str) -> BeautifulSoup | str:
-    base_url = 'https://www.woerter.net/?w='
+    import requests
+    base_url = WOERTER_URL + '/?w='
     try:
-        response = requests.get(base_url + word.replace(' ', '+'))
+        response = fetch(base_url + word.replace(' ', '+'))
     except requests.exceptions.ConnectionError:
         return f'Connection problem. Try again later.'
     if response.status_code == 200:
-        soup = BeautifulSoup(response.text, 'html.parser')
+        soup = make_soup(response.text)
         return soup
 
 
@@ -24,40 +52,15 @@ def get_wordlist_from_word_search(
             'Adverb', 'Article', 'Particle'
         ] | None = None
 ) -> list[dict] | dict | str:
-    base_url = 'https://woerter.net'
-    search_url = base_url + '/search/?w='
+    import requests
+    search_url = WOERTER_URL + '/search/?w='
     try:
-        response = requests.get(search_url + word.replace(' ', '+'))
+        response = fetch(search_url + word.replace(' ', '+'))
     except requests.exceptions.ConnectionError:
         return 'Connection problem. Try again later.'
     if response.status_code == 200:
-        soup = BeautifulSoup(response.text, 'html.parser')
-        word_cards = soup.find_all('div', attrs={'class': 'bTrf rClear'})
-        words = []
-        for current_word in word_cards:
-            the_word = current_word.find('a').parent.find_all('span')[0].text
-            info = current_word.find('p', attrs={'class': 'rInf rKln r1Zeile rU3px rO0px'})
-            if not info.find('span'):
-                words.append(dict(
-                    word=the_word,
-                    word_type=None,
-                    level=None,
-                    href=base_url + current_word.find('a')['href']
-                ))
-                continue
-            level = None
-            if 'bZrt' in str(info):
-                level = info.find('span', attrs={'class': 'bZrt'}).text.strip()
-                current_word_type = info.find_all('span')[1].text
-            else:
-                current_word_type = info.find_all('span')[0].text
-            href = base_url + current_word.find('a')['href']
-            words.append(dict(
-                word=the_word,
-                word_type=current_word_type,
-                level=level,
-                href=href
-            ))
+        soup = make_soup(response.text)
+        words = parse_word_search(soup)
         if word_type:
             try:
                 words = [word for word in words if word['word_type'].lower() == word_type.lower()][0]
@@ -66,10 +69,40 @@ def get_wordlist_from_word_search(
         return words
 
 
+def parse_word_search(soup: BeautifulSoup) -> list[dict]:
+    word_cards = soup.find_all('div', attrs={'class': 'bTrf rClear'})
+    words = []
+    for current_word in word_cards:
+        the_word = current_word.find('a').parent.find_all('span')[0].text
+        info = current_word.find('p', attrs={'class': 'rInf rKln r1Zeile rU3px rO0px'})
+        if not info.find('span'):
+            words.append(dict(
+                word=the_word,
+                word_type=None,
+                level=None,
+                href=WOERTER_URL + current_word.find('a')['href']
+            ))
+            continue
+        level = None
+        if 'bZrt' in str(info):
+            level = info.find('span', attrs={'class': 'bZrt'}).text.strip()
+            current_word_type = info.find_all('span')[1].text
+        else:
+            current_word_type = info.find_all('span')[0].text
+        href = WOERTER_URL + current_word.find('a')['href']
+        words.append(dict(
+            word=the_word,
+            word_type=current_word_type,
+            level=level,
+            href=href
+        ))
+    return words
+
+
 def get_soup_from_url(url: str) -> BeautifulSoup:
-    response = requests.get(url)
+    response = fetch(url)
     if response.status_code == 200:
-        soup = BeautifulSoup(response.text, 'html.parser')
+        soup = make_soup(response.text)
         return soup
 
 
@@ -94,7 +127,7 @@ def get_word_from_soup(soup: BeautifulSoup) -> tuple[str, BeautifulSoup | None]:
             return soup.find('i').text.strip(), None
         new_url = url_object.attrs['href']
         if 'http' not in new_url:
-            new_url = 'https://woerter.net' + new_url
+            new_url = WOERTER_URL + new_url
         soup = get_soup_from_url(new_url)
         word = parse_word(soup)
         return word, soup
@@ -127,7 +160,8 @@ def get_word_translation(soup: BeautifulSoup) -> str | None:
     return translation
 
 
-def get_word_example(soup: BeautifulSoup) -> list[str]:
+def get_word_examples(soup: BeautifulSoup) -> list[list[str]]:
+    """All [example, translation] pairs from the word page's examples list."""
     cards_titles = soup.find_all('h2')
     examples = []
     for title in cards_titles:
@@ -135,17 +169,42 @@ def get_word_example(soup: BeautifulSoup) -> list[str]:
             examples = title.parent.parent.find('ul', attrs={'class': 'rLst rLstGt'})
     if not examples:
         return []
-    examples = examples.find_all('li')
-    for _ in range(10):
-        example = examples[randint(0, len(examples) - 1)]
+    pairs = []
+    for example in examples.find_all('li'):
         example1 = example.text.split('\xa0')[0].strip().replace('\n', ' ')
         example2 = example.text.split('\xa0')[-1].strip().replace('\n', ' ')
         if example2:
-            break
-    try:
-        return [example1, example2]
-    except NameError:
+            pairs.append([example1, example2])
+    return pairs
+
+
+def get_word_inflections(soup: BeautifulSoup) -> dict[str, dict[str, str]]:
+    """Conjugation or declension tables of the word page: {'Present': {'ich': 'schreibe', ...}, ...}.
+
+    Verbs have tenses and moods, nouns singular and plural cases, adjectives the comparison forms
+    (labelled '-' on the page).
+    """
+    tables = {}
+    for table_block in soup.find_all('div', attrs={'class': 'vTbl'}):
+        title = table_block.find(['h2', 'h3'])
+        table = table_block.find('table')
+        if not title or not table:
+            continue
+        forms = {}
+        for row in table.find_all('tr'):
+            label, form = row.find('th'), row.find('td')
+            if label and form:
+                forms[label.get_text(' ', strip=True)] = form.get_text(' ', strip=True)
+        if forms:
+            tables[title.get_text(' ', strip=True)] = forms
+    return tables
+
+
+def get_word_example(soup: BeautifulSoup) -> list[str]:
+    examples = get_word_examples(soup)
+    if not examples:
         return []
+    return examples[randint(0, len(examples) - 1)]
 
 
 def get_word_info(word: str) -> dict | str:
@@ -158,15 +217,18 @@ def get_word_info(word: str) -> dict | str:
     word_info = {'word': word}
     level, word_type = get_word_level_and_type(soup)
     translation = get_word_translation(soup)
-    example = get_word_example(soup)
+    examples = get_word_examples(soup)
+    inflections = get_word_inflections(soup)
     if level and word_type:
         word_info.update({'level': level, 'word_type': word_type})
         if word_info['level'].upper() not in ['A1', 'A2', 'B1', 'B2', 'C1', 'C2']:
             word_info['level'] = 'Unknown'
     if translation:
         word_info.update({'translation': translation})
-    if example:
-        word_info.update({'example': example})
+    if examples:
+        word_info.update({'example': examples[randint(0, len(examples) - 1)], 'examples': examples})
+    if inflections:
+        word_info.update({'inflections': inflections})
     return word_info
 
 
@@ -185,26 +247,28 @@ def get_word_info_from_search(
     word_info = {'word': get_word_from_soup(soup)[0]}
     level, word_type_parsed = get_word_level_and_type(soup)
     translation = get_word_translation(soup)
-    example = get_word_example(soup)
+    examples = get_word_examples(soup)
+    inflections = get_word_inflections(soup)
     if level and word_type:
         word_info.update({'level': level, 'word_type': word_type_parsed})
     if translation:
         word_info.update({'translation': translation})
-    if example:
-        word_info.update({'example': example})
+    if examples:
+        word_info.update({'example': examples[randint(0, len(examples) - 1)], 'examples': examples})
+    if inflections:
+        word_info.update({'inflections': inflections})
     return word_info
 
 
 def get_words_suggestion(letters: str, page_start: int = 1, pages: int = 1):
-    base_url = 'https://www.woerter.net'
-    base_search_url = base_url + '/search'
-    search_url = base_search_url + '?w='
+    import requests
+    search_url = WOERTER_URL + '/search?w='
     response_text = ''
     for page_number in range(pages):
         if page_start + page_number > 20:
             break
         try:
-            response = requests.get(f'{search_url}{letters}&p={page_start + page_number}')
+            response = fetch(f'{search_url}{letters}&p={page_start + page_number}')
         except requests.exceptions.ConnectionError:
             print(f'Connection problem for page={page_start + page_number}')
             time.sleep(3)
@@ -214,14 +278,17 @@ def get_words_suggestion(letters: str, page_start: int = 1, pages: int = 1):
     if not response_text:
         return 'Connection problem. Try again later.'
 
-    soup = BeautifulSoup(response_text, 'html.parser')
+    soup = make_soup(response_text)
+    return parse_words_suggestion(soup)
+
 
+def parse_words_suggestion(soup: BeautifulSoup) -> list[dict]:
     word_cards = soup.find_all('div', attrs={'class': 'bTrf rClear'})
     words = []
     for word_card in word_cards:
         word_container = word_card.find('div', attrs={'class': 'rU6px rO0px'})
         word = word_container.find('q').text.replace('\n', '')
-        href = base_url + word_container.find('a').get('href')
+        href = WOERTER_URL + word_container.find('a').get('href')
         english = word_card.find('span', attrs={'lang': 'en'})
         if not english:
             print(f'word {word} ({href}) has no translation.')
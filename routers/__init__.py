@@ -8,4 +8,7 @@ from .admins import admin_words
 from .admins import admin_user_words
 from .admins import admin_user_topics
 from .admins import admin_topics
-from .cards import cards
\ No newline at end of file
+from .admins import admin_pools
+from .cards import cards
+from .cards import card_sessions
+from .metrics import metrics_routes
@@ -1,14 +1,18 @@
 from fastapi import APIRouter, Path, Query, Depends
+from fastapi.responses import StreamingResponse
 from typing import Annotated, Literal
 
 from data.schemas import (UserOutAdmin, UserIn, UserPatchAdmin, UserInAdmin,
                           WordOut, WordIn, UserWordIn, UserWordPatch, WordPatch, AdminWordOut,
-                          TopicOut, AdminUserWordOut, AdminWord)
+                          TopicOut, AdminUserWordOut, AdminWord, AdminWordSearchResult, WordInflections)
 from data.database_manager import db_manager
 from modules.security import get_password_hash, is_user_admin, get_current_user
 import modules.serialization as serialization
-from modules.word_info import get_word_info, get_word_info_from_search, get_words_suggestion
+from modules.word_info import get_word_info, get_words_suggestion
 from modules.utils import check_for_exception, raise_exception
+from modules.executor import offload, run_blocking, pools_stats
+from modules.genai import wake_example_generator
+from modules.spelling import find_similar_words, spelling_index
 
 admin_users = APIRouter(prefix='/admin/users', dependencies=[Depends(is_user_admin)], tags=['admin_users'])
 admin_words = APIRouter(prefix='/admin/words', dependencies=[Depends(is_user_admin)], tags=['admin_words'])
@@ -17,24 +21,26 @@ admin_user_words = APIRouter(prefix='/admin/user_words', dependencies=[Depends(i
 admin_user_topics = APIRouter(prefix='/admin/user_topics', dependencies=[Depends(is_user_admin)],
                               tags=['admin_user_topics'])
 admin_topics = APIRouter(prefix='/admin_topics', dependencies=[Depends(is_user_admin)], tags=['admin_topics'])
+admin_pools = APIRouter(prefix='/admin/pools', dependencies=[Depends(is_user_admin)], tags=['admin_pools'])
 
 
 @admin_users.get('', summary="Show users' info")
-async def get_users(
+@offload('db')
+def get_users(
         limit: Annotated[int, Query(title='users limit', description='users per request', ge=1, le=100)] = 25,
         skip: Annotated[int, Query(title='skip pages', description='pages to skip', ge=0)] = 0,
         sort_by: Literal['id', 'username', 'email', 'level', 'login_attempts',
-                         'last_login', 'created_at', 'streak', 'role'] = 'id',
+                   'last_login', 'created_at', 'streak', 'role'] = 'id',
         desc: Annotated[bool, Query(description='true - descending')] = False
 ) -> list[UserOutAdmin]:
     """## Show info about registered users"""
-    users = db_manager.get_users(limit, skip, sort_by, desc)
-    users_out = [serialization.user_out_admin(user) for user in users]
-    return users_out
+    users_rows = db_manager.get_users_rows(limit, skip, sort_by, desc)
+    return serialization.list_response(serialization.user_out_admin_list, users_rows)
 
 
 @admin_users.post('/add', summary='Add a new user')
-async def add_user(user: UserInAdmin) -> UserOutAdmin:
+@offload('db')
+def add_user(user: UserInAdmin) -> UserOutAdmin:
     """## Register new application user
     *username* and *email* should be unique.
     """
@@ -50,13 +56,15 @@ async def add_user(user: UserInAdmin) -> UserOutAdmin:
 
 
 @admin_users.get('/me', summary="Show admin's info")
-async def read_admin_me(admin: Annotated[UserOutAdmin, Depends(get_current_user)]) -> UserOutAdmin:
+@offload('db')
+def read_admin_me(admin: Annotated[UserOutAdmin, Depends(get_current_user)]) -> UserOutAdmin:
     """## Display info of currently logged in administrator"""
-    return serialization.user_out_admin(admin)
+    return serialization.user_out_admin(db_manager.get_user_by_id(admin.id))
 
 
 @admin_users.get('/{user_id}', summary="Show specific user's info")
-async def get_user(user_id: Annotated[int, Path(ge=1, title='User ID')]) -> UserOutAdmin:
+@offload('db')
+def get_user(user_id: Annotated[int, Path(ge=1, title='User ID')]) -> UserOutAdmin:
     """## Display info for user with *user_id*"""
     user = db_manager.get_user_by_id(user_id)
     check_for_exception(user, 404)
@@ -64,7 +72,8 @@ async def get_user(user_id: Annotated[int, Path(ge=1, title='User ID')]) -> User
 
 
 @admin_users.delete('/{user_id}', summary='Delete user')
-async def remove_user(user_id: Annotated[int, Path(title='User ID', ge=1)]) -> UserOutAdmin:
+@offload('db')
+def remove_user(user_id: Annotated[int, Path(title='User ID', ge=1)]) -> UserOutAdmin:
     """## Remove a user with *user_id* from the app
     This action is irreversible. All user_words and user topic will be deleted as well."""
     user_delete = db_manager.get_user_by_id(user_id)
@@ -75,8 +84,9 @@ async def remove_user(user_id: Annotated[int, Path(title='User ID', ge=1)]) -> U
 
 
 @admin_users.put('/{user_id}', summary="Update user's info")
-async def update_user(user_id: Annotated[int, Path(title='User ID', ge=1)],
-                      user: UserInAdmin) -> UserOutAdmin:
+@offload('db')
+def update_user(user_id: Annotated[int, Path(title='User ID', ge=1)],
+                user: UserInAdmin) -> UserOutAdmin:
     """## Change user info
     All fields are required."""
     updated_user = db_manager.update_user(
@@ -91,8 +101,9 @@ async def update_user(user_id: Annotated[int, Path(title='User ID', ge=1)],
 
 
 @admin_users.patch('/{user_id}', summary="Update user's info")
-async def patch_user(user_id: Annotated[int, Path(title='User ID', ge=1)],
-                     user: UserPatchAdmin) -> UserOutAdmin:
+@offload('db')
+def patch_user(user_id: Annotated[int, Path(title='User ID', ge=1)],
+               user: UserPatchAdmin) -> UserOutAdmin:
     """## Change user info
     At least one field should be provided."""
     db_user = db_manager.get_user_by_id(user_id)
@@ -100,12 +111,13 @@ async def patch_user(user_id: Annotated[int, Path(title='User ID', ge=1)],
     stored_user_model = UserIn(**db_user.__dict__)
     update_data = user.model_dump(exclude_unset=True)
     updated_user = stored_user_model.model_copy(update=update_data)
-    db_user_updated = await update_user(user_id, updated_user)
+    db_user_updated = update_user.__wrapped__(user_id, updated_user)
     return db_user_updated
 
 
 @admin_user_words.get('/{user_id}', summary="Show user's words")
-async def get_user_words(
+@offload('db')
+def get_user_words(
         user_id: Annotated[int, Path(title='User ID', ge=1)],
         limit: Annotated[int, Query(title='words limit', description='words per request', ge=1, le=100)] = 25,
         skip: Annotated[int, Query(title='skip pages', description='pages to skip', ge=0)] = 0,
@@ -113,12 +125,14 @@ async def get_user_words(
         desc: Annotated[bool, Query(description='true - descending')] = False
 ) -> list[WordOut]:
     """## Displays words of a user with *user_id*"""
-    user_words = db_manager.get_user_words(user_id, limit, skip, sort_by, desc)
-    return serialization.word_out_list_from_user_words(user_words)
+    user_words_rows = db_manager.get_user_words_rows(user_id, limit, skip, sort_by, desc)
+    check_for_exception(user_words_rows, 404)
+    return serialization.list_response(serialization.word_out_list, user_words_rows)
 
 
 @admin_user_words.get('/words/{user_word_id}', summary='Show user word')
-async def get_user_word(
+@offload('db')
+def get_user_word(
         user_word_id: Annotated[int, Path(title='UserWord ID', ge=1)]
 ) -> WordOut:
     """## Display user word info"""
@@ -131,12 +145,12 @@ async def get_user_word(
 async def add_user_word(user_id: Annotated[int, Path(title='User ID', ge=1)],
                         word: UserWordIn) -> WordOut:
     """## Add a word for user with *user_id*"""
-    db_user = db_manager.get_user_by_id(user_id)
+    db_user = await run_blocking('db', db_manager.get_user_by_id, user_id)
     check_for_exception(db_user, 404)
-    parsed_word = get_word_info(word.word)
+    parsed_word = await run_blocking('scraper', get_word_info, word.word)
     custom_word = False
     if isinstance(parsed_word, str) and not all([word.english, word.level, word.word_type]):
-        searched_words = get_word_info_from_search(word.word)
+        searched_words = await find_similar_words(word.word)
         if isinstance(searched_words, list) and searched_words:
             suggestions = '; '.join([f"{searched_word['word']} ({searched_word['word_type']})"
                                      for searched_word in searched_words])
@@ -153,30 +167,39 @@ async def add_user_word(user_id: Annotated[int, Path(title='User ID', ge=1)],
             example_translation=word.example_translation
         )
         custom_word = True
-    the_word = parsed_word['word']
-    if db_manager.user_has_word(db_user.id, the_word, parsed_word['word_type']):
-        raise_exception(409, f"User '{db_user.username}' already has word '{the_word}' "
-                             f"({parsed_word['word_type']}).")
-    db_word = db_manager.get_word_by_word(the_word, parsed_word['word_type'])
-    if isinstance(db_word, str):
+
+    def save_user_word() -> WordOut:
+        the_word = parsed_word['word']
+        db_user = db_manager.get_user_by_id(user_id)
+        if db_manager.user_has_word(db_user.id, the_word, parsed_word['word_type']):
+            raise_exception(409, f"User '{db_user.username}' already has word '{the_word}' "
+                                 f"({parsed_word['word_type']}).")
+        db_word = db_manager.get_word_by_word(the_word, parsed_word['word_type'])
+        if isinstance(db_word, str):
+            db_user_word = db_manager.add_user_word(user_id=db_user.id,
+                                                    word=parsed_word,
+                                                    example=word.example,
+                                                    example_translation=word.example_translation,
+                                                    topics=word.topics,
+                                                    translation=word.english)
+            if custom_word:
+                db_manager.add_non_parsed_word_record(db_user.id, db_user_word.word.id)
+            return serialization.word_out_from_user_word(db_user_word)
         db_user_word = db_manager.add_user_word(user_id=db_user.id,
                                                 word=parsed_word,
-                                                example=word.example,
-                                                example_translation=word.example_translation,
                                                 topics=word.topics,
                                                 translation=word.english)
-        if custom_word:
-            db_manager.add_non_parsed_word_record(db_user.id, db_user_word.word.id)
         return serialization.word_out_from_user_word(db_user_word)
-    db_user_word = db_manager.add_user_word(user_id=db_user.id,
-                                            word=parsed_word,
-                                            topics=word.topics,
-                                            translation=word.english)
-    return serialization.word_out_from_user_word(db_user_word)
+
+    saved_user_word = await run_blocking('db', save_user_word)
+    spelling_index.add(saved_user_word.word, saved_user_word.word_type)
+    wake_example_generator()
+    return saved_user_word
 
 
 @admin_user_words.delete('/words/{user_word_id}', summary='Delete user word')
-async def remove_user_word(
+@offload('db')
+def remove_user_word(
         user_word_id: Annotated[int, Path(ge=1)]
 ) -> WordOut | None:
     """## Remove user word with *user_word_id* from the application"""
@@ -188,8 +211,9 @@ async def remove_user_word(
 
 
 @admin_user_words.patch('/words/{user_word_id}', summary='Update user word info')
-async def patch_own_word(user_word_id: Annotated[int, Path(ge=1)],
-                         word: UserWordPatch) -> WordOut:
+@offload('db')
+def patch_own_word(user_word_id: Annotated[int, Path(ge=1)],
+                   word: UserWordPatch) -> WordOut:
     """## Update info for user word with *user_word_id*
     At least one field should be provided.
     """
@@ -213,8 +237,9 @@ async def patch_own_word(user_word_id: Annotated[int, Path(ge=1)],
 
 
 @admin_user_words.put('/words/{user_word_id}', summary='Update user word info')
-async def update_own_word(user_word_id: Annotated[int, Path(ge=1)],
-                          word: UserWordIn) -> WordOut:
+@offload('db')
+def update_own_word(user_word_id: Annotated[int, Path(ge=1)],
+                    word: UserWordIn) -> WordOut:
     """## Update info for user word with *user_word_id*
     All fields are required."""
     db_user_word = db_manager.get_user_word_by_id(user_word_id)
@@ -233,18 +258,20 @@ async def update_own_word(user_word_id: Annotated[int, Path(ge=1)],
 
 
 @admin_words.get('', summary='Get application words')
-async def get_words(limit: Annotated[int, Query(ge=1, le=500, title='Pagination Limit')] = 50,
-                    skip: Annotated[int, Query(ge=0, title='Pagination page offset')] = 0,
-                    sort_by: Literal['id', 'word', 'word_type', 'level', 'users', 'english', 'example'] = 'id',
-                    desc: Annotated[bool, Query(description='true - descending')] = False
+@offload('db')
+def get_words(limit: Annotated[int, Query(ge=1, le=500, title='Pagination Limit')] = 50,
+              skip: Annotated[int, Query(ge=0, title='Pagination page offset')] = 0,
+              sort_by: Literal['id', 'word', 'word_type', 'level', 'users', 'english', 'example'] = 'id',
+              desc: Annotated[bool, Query(description='true - descending')] = False
 ) -> list[AdminWordOut]:
     """## Retrieve a list of application words with optional sorting and pagination"""
-    words = db_manager.get_words(limit, skip, sort_by, desc)
-    return serialization.admin_wordlist_from_words(words)
+    words_rows = db_manager.get_words_rows(limit, skip, sort_by, desc)
+    return serialization.list_response(serialization.admin_word_out_list, words_rows)
 
 
 @admin_words.get('/suggest', summary='Suggest words based on letter combination')
-async def suggest_word_by_letter_combination(
+@offload('scraper')
+def suggest_word_by_letter_combination(
         letter_combination: Annotated[str, Query(min_length=3)],
         page_start: Annotated[int, Query(title='Page number', description='Pagination parameter', ge=1, le=20)] = 1,
         pages: Annotated[int, Query(title='Amount of pages',
@@ -258,49 +285,97 @@ async def suggest_word_by_letter_combination(
     return get_words_suggestion(letter_combination, page_start, pages)
 
 
+@admin_words.get('/search', summary='Search application words')
+@offload('db')
+def search_words(q: Annotated[str, Query(title='Search text', min_length=2, max_length=100)],
+                 limit: Annotated[int, Query(ge=1, le=100, title='Results limit')] = 25
+                 ) -> list[AdminWordSearchResult]:
+    """## Find words of the whole dictionary by a part of the word, translation or example
+    Typos are tolerated: words similar to *q* are found as well. Results are ordered by *score* (1 - exact match).
+    """
+    found_words = db_manager.search_words_rows(q, limit)
+    return serialization.list_response(serialization.admin_word_search_list, found_words)
+
+
+@admin_words.get('/export', summary='Export application words')
+async def export_words(export_format: Literal['ndjson', 'csv'] = 'ndjson') -> StreamingResponse:
+    """## Download all application words in one request
+    - *export_format* - _ndjson_ (one JSON word per line) or _csv_
+
+    Words are streamed from the database in batches, so the size of the words table doesn't matter.
+    """
+    words_batches = db_manager.iter_words()
+    return serialization.export_response(serialization.words_export(words_batches, export_format),
+                                         export_format, 'words')
+
+
 @admin_words.get('/{word_id}', summary='Get word info')
-async def get_word(word_id: Annotated[int, Path(title='Word ID', ge=1)]) -> AdminWordOut:
+@offload('db')
+def get_word(word_id: Annotated[int, Path(title='Word ID', ge=1)]) -> AdminWordOut:
     """## Retrieve word information"""
     db_word = db_manager.get_word_by_id(word_id)
     check_for_exception(db_word, 404)
     return serialization.admin_word_from_word(db_word)
 
 
+@admin_words.get('/{word_id}/inflections', summary='Get word conjugation or declension')
+@offload('db')
+def get_word_inflections(word_id: Annotated[int, Path(title='Word ID', ge=1)]) -> WordInflections:
+    """## Conjugation, declension or comparison tables of the word, as parsed from woerter.net"""
+    db_inflection = db_manager.get_word_inflections(word_id)
+    check_for_exception(db_inflection, 404)
+    return serialization.word_inflections_from_db(db_inflection)
+
+
 @admin_words.post('', summary='Add new words')
 async def add_word(word: WordIn) -> AdminWord:
     """## Add a new word to the application"""
-    db_word = db_manager.get_word_by_word(word.word, word.word_type)
+    db_word = await run_blocking('db', db_manager.get_word_by_word, word.word, word.word_type)
     if not isinstance(db_word, str):
-        raise_exception(409, f'Word {db_word.word} ({db_word.word_type} already exists.')
-    parsed_word = get_word_info(word.word)
-    if isinstance(parsed_word, str) and all([word.word_type, word.english, word.level]):
-        db_word = db_manager.add_new_word(word)
+        raise_exception(409, f'Word {word.word} ({word.word_type} already exists.')
+    parsed_word = await run_blocking('scraper', get_word_info, word.word)
+
+    def save_word() -> AdminWord:
+        if isinstance(parsed_word, str) and all([word.word_type, word.english, word.level]):
+            db_word = db_manager.add_new_word(word)
+            return serialization.admin_word_out_from_db_word(db_word)
+        check_for_exception(parsed_word, 404)
+        db_word = db_manager.add_new_word(parsed_word)
+        if parsed_word.get('example'):
+            db_manager.add_word_example(db_word.id, parsed_word['example'][0], parsed_word['example'][1],
+                                        parsed_word.get('examples'))
+        if parsed_word.get('inflections'):
+            db_manager.add_word_inflections(db_word.id, parsed_word['inflections'])
         return serialization.admin_word_out_from_db_word(db_word)
-    check_for_exception(parsed_word, 404)
-    db_word = db_manager.add_new_word(parsed_word)
-    if parsed_word.get('example'):
-        db_manager.add_word_example(db_word.id, parsed_word['example'][0], parsed_word['example'][1])
-    return serialization.admin_word_out_from_db_word(db_word)
+
+    saved_word = await run_blocking('db', save_word)
+    spelling_index.add(saved_word.word, saved_word.word_type)
+    return saved_word
 
 
 @admin_words.delete('/{word_id}', summary='Delete a word')
-async def delete_word(word_id: Annotated[int, Path(title='Word ID', ge=1)]) -> AdminWord:
+@offload('db')
+def delete_word(word_id: Annotated[int, Path(title='Word ID', ge=1)]) -> AdminWord:
     """## Removes a word with *word_id* from the application"""
     db_word = db_manager.get_word_by_id(word_id)
     check_for_exception(db_word, 404)
     word_out = serialization.admin_word_out_from_db_word(db_word)
     db_manager.delete_word(word_id)
+    spelling_index.remove(word_out.word, word_out.word_type)
     return word_out
 
 
 @admin_words.put('/{word_id}', summary='Update word info')
-async def update_word(word_id: Annotated[int, Path(title='Word ID', ge=1)],
-                      word: WordIn) -> AdminWordOut:
+@offload('db')
+def update_word(word_id: Annotated[int, Path(title='Word ID', ge=1)],
+                word: WordIn) -> AdminWordOut:
     """## Update the info for the word with *word_id*
     All fields are required."""
     db_word = db_manager.get_word_by_id(word_id)
     check_for_exception(db_word, 404)
+    previous_word = db_word.word, db_word.word_type.name
     updated_word = db_manager.update_word(
+        word_id=word_id,
         word=word.word,
         word_type=word.word_type,
         english=word.english,
@@ -308,16 +383,20 @@ async def update_word(word_id: Annotated[int, Path(title='Word ID', ge=1)],
         example=word.example,
         example_translation=word.example_translation
     )
-    return serialization.admin_word_out_from_db_word(updated_word)
+    check_for_exception(updated_word, 404)
+    spelling_index.rename(previous_word, (updated_word.word, updated_word.word_type.name))
+    return serialization.admin_word_from_word(updated_word)
 
 
 @admin_words.patch('/{word_id}', summary='Update word info')
-async def patch_word(word_id: Annotated[int, Path(ge=1)],
-                     word: WordPatch) -> AdminWordOut:
+@offload('db')
+def patch_word(word_id: Annotated[int, Path(ge=1)],
+               word: WordPatch) -> AdminWordOut:
     """## Update the info for the word with *word_id*
     At least one field should be provided."""
     db_word = db_manager.get_word_by_id(word_id)
     check_for_exception(db_word, 404)
+    previous_word = db_word.word, db_word.word_type.name
     stored_word_model = AdminWordOut(**serialization.admin_word_from_word(db_word).__dict__)
     update_data = word.model_dump(exclude_unset=True)
     updated_word = stored_word_model.model_copy(update=update_data)
@@ -331,11 +410,13 @@ async def patch_word(word_id: Annotated[int, Path(ge=1)],
         example_translation=updated_word.example_translation
     )
     check_for_exception(updated_db_word, 404)
+    spelling_index.rename(previous_word, (updated_db_word.word, updated_db_word.word_type.name))
     return serialization.admin_word_from_word(updated_db_word)
 
 
 @admin_user_topics.get('/{user_id}', summary='Show user topics')
-async def get_user_topics(
+@offload('db')
+def get_user_topics(
         user_id: Annotated[int, Path(title='User ID', ge=1)],
         limit: Annotated[int, Query(title='topics limit', description='topics per request', ge=1, le=100)] = 25,
         skip: Annotated[int, Query(title='skip pages', description='pages to skip', ge=0)] = 0,
@@ -347,11 +428,12 @@ async def get_user_topics(
     check_for_exception(db_user, 404)
     user_topics = db_manager.get_user_topics(user_id, limit, skip, sort_by, desc)
     check_for_exception(user_topics, 404)
-    return user_topics
+    return serialization.topic_out_list_from_topics(user_topics)
 
 
 @admin_user_topics.get('/{user_id}/{topic_id}/words', summary='Show words for user topic')
-async def get_user_topic_words(
+@offload('db')
+def get_user_topic_words(
         user_id: Annotated[int, Path(title='User ID', ge=1)],
         topic_id: Annotated[int, Path(title='Topic ID', ge=1)],
         limit: Annotated[int, Query(title='words limit', description='words per request', ge=1, le=100)] = 25,
@@ -360,25 +442,38 @@ async def get_user_topic_words(
         desc: Annotated[bool, Query(description='true - descending')] = False
 ) -> list[AdminUserWordOut]:
     """## Retrieve all words for user topic"""
-    user_topic_words = db_manager.get_user_topic_words(user_id, topic_id, limit, skip, sort_by, desc)
+    user_topic_words = db_manager.get_user_topic_words_rows(user_id, topic_id, limit, skip, sort_by, desc)
     check_for_exception(user_topic_words, 404)
-    return serialization.admin_wordlist_out_from_user_words(user_topic_words, sort_by)
+    return serialization.list_response(serialization.admin_user_word_out_list, user_topic_words)
 
 
 @admin_user_topics.put('/{user_id}/{topic_id}', summary='Update user topic name')
-async def update_user_topic(user_id: Annotated[int, Path(title='User ID', ge=1)],
-                            topic_id: Annotated[int, Path(title='Topic ID', ge=1)],
-                            topic_name: str) -> TopicOut:
+@offload('db')
+def update_user_topic(user_id: Annotated[int, Path(title='User ID', ge=1)],
+                      topic_id: Annotated[int, Path(title='Topic ID', ge=1)],
+                      topic_name: str) -> TopicOut:
     """## Update the name of topic with *topic_id* for user with *user_id*"""
     user_topic = db_manager.update_user_topic(user_id, topic_id, topic_name)
     check_for_exception(user_topic, 404)
-    return user_topic
+    return serialization.topic_out_from_topic(user_topic)
 
 
 @admin_user_topics.delete('/{user_id}/{topic_id}', summary='Delete user topic')
-async def remove_user_topic(user_id: Annotated[int, Path(title='User ID', ge=1)],
-                            topic_id: Annotated[int, Path(title='Topic ID', ge=1)]) -> TopicOut:
+@offload('db')
+def remove_user_topic(user_id: Annotated[int, Path(title='User ID', ge=1)],
+                      topic_id: Annotated[int, Path(title='Topic ID', ge=1)]) -> TopicOut:
     """## Remove topic with *topic_id* for user with *user_id*"""
     user_topic = db_manager.delete_user_topic(user_id, topic_id)
     check_for_exception(user_topic, 404)
-    return user_topic
+    return serialization.topic_out_from_topic(user_topic)
+
+
+@admin_pools.get('', summary='Show blocking work pools load')
+async def get_pools() -> list[dict]:
+    """## Show the state of thread pools running blocking database and scraper calls
+    - *max_workers* - pool size
+    - *queue_depth* - calls waiting for a free worker
+    - *active* - calls being executed right now
+    - *completed* - calls finished since the app start
+    """
+    return pools_stats()
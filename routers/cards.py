@@ -1,43 +1,87 @@
-from fastapi import APIRouter, Depends, Path, Query
+from fastapi import APIRouter, Depends, Path, Query, WebSocket, WebSocketDisconnect
 from typing import Annotated, Literal
 from datetime import datetime
 
 from data.schemas import UserOut, UserWordCard
 from data.database_manager import db_manager
-from modules.security import get_current_active_user
+from modules.security import get_current_active_user, get_user_from_token
 import modules.serialization as serialization
 from modules.utils import check_for_exception, raise_exception
+from modules.executor import offload
+from modules.etags import user_data_etag, cards_etag
+from modules.review_log import review_log
+from modules.card_session import CardSession
 
 cards = APIRouter(prefix='/user_cards', dependencies=[Depends(get_current_active_user)], tags=['user_cards'])
+# WebSocket clients can't always send headers, so the session authenticates itself
+card_sessions = APIRouter(prefix='/user_cards', tags=['user_cards'])
 
 
-@cards.get('/topic/{topic_id}')
-async def get_topic_cards(current_user: Annotated[UserOut, Depends(get_current_active_user)],
-                          topic_id: Annotated[int | None, Path(ge=1)],
-                          limit: Annotated[int, Query(ge=1, le=50)] = 25,
-                          random: bool = False
-                          ) -> list[UserWordCard]:
+@cards.get('/topic/{topic_id}', dependencies=[Depends(cards_etag)])
+@offload('db')
+def get_topic_cards(current_user: Annotated[UserOut, Depends(get_current_active_user)],
+                    topic_id: Annotated[int | None, Path(ge=1)],
+                    limit: Annotated[int, Query(ge=1, le=50)] = 25,
+                    random: bool = False
+                    ) -> list[UserWordCard]:
     db_cards = db_manager.get_user_cards(current_user.id, topic_id, limit, random)
     check_for_exception(db_cards, 404)
-    return [serialization.user_word_card_from_user_word(user_word) for user_word in db_cards]
+    return serialization.user_word_cards_response(db_cards)
+
+
+@cards.get('/daily', dependencies=[Depends(user_data_etag)])
+@offload('db')
+def get_daily_cards(current_user: Annotated[UserOut, Depends(get_current_active_user)],
+                    limit: Annotated[int, Query(ge=1, le=50)] = 25) -> list[UserWordCard]:
+    db_cards = db_manager.get_user_cards(current_user.id, None, limit)
+    check_for_exception(db_cards, 404)
+    return serialization.user_word_cards_response(db_cards)
 
 
 @cards.get('/random')
-async def get_random_cards(current_user: Annotated[UserOut, Depends(get_current_active_user)],
-                           limit: Annotated[int, Query(ge=1, le=50)] = 25):
+@offload('db')
+def get_random_cards(current_user: Annotated[UserOut, Depends(get_current_active_user)],
+                     limit: Annotated[int, Query(ge=1, le=50)] = 25) -> list[UserWordCard]:
     random_db_words = db_manager.get_random_user_words(current_user.id, limit)
     check_for_exception(random_db_words, 404)
-    return [serialization.user_word_card_from_user_word(user_word) for user_word in random_db_words]
+    return serialization.user_word_cards_response(random_db_words)
 
 
 @cards.get('/update_info/{user_word_id}')
-async def update_card_info(current_user: Annotated[UserOut, Depends(get_current_active_user)],
-                           user_word_id: Annotated[int, Path(ge=1)],
-                           guess: Literal['fails', 'success']) -> UserWordCard:
+@offload('db')
+def update_card_info(current_user: Annotated[UserOut, Depends(get_current_active_user)],
+                     user_word_id: Annotated[int, Path(ge=1)],
+                     guess: Literal['fails', 'success']) -> UserWordCard:
     db_user_word = db_manager.get_user_word_by_id(user_word_id)
     check_for_exception(db_user_word, 404)
     if db_user_word.user_id != current_user.id:
         raise_exception(403, f"User with id={current_user.id} "
                              f"doesn't have a user word with id={user_word_id}")
-    updated_user_word = db_manager.update_card(user_word_id, datetime.now(), guess)
+    shown_time = datetime.now()
+    updated_user_word = db_manager.update_card(user_word_id, shown_time, guess)
+    review_log.add(current_user.id, user_word_id, db_user_word.word_id, shown_time, guess == 'success')
     return serialization.user_word_card_from_user_word(updated_user_word)
+
+
+@card_sessions.websocket('/session')
+async def card_session(websocket: WebSocket, topic_id: Annotated[int | None, Query(ge=1)] = None):
+    """Study session streaming cards and answers over one connection (protocol in modules/card_session.py).
+
+    The access token comes in the *Authorization: Bearer* header or, from browsers, in the first message:
+    ``{"type": "auth", "token": "..."}``. Without *topic_id* cards come from the daily deck first.
+    """
+    await websocket.accept()
+    token = websocket.headers.get('authorization', '').removeprefix('Bearer ').strip()
+    try:
+        if not token:
+            message = await websocket.receive_json()
+            token = message.get('token', '') if isinstance(message, dict) and message.get('type') == 'auth' else ''
+    except WebSocketDisconnect:
+        return
+    except ValueError:
+        token = ''
+    current_user = await get_user_from_token(token) if token else None
+    if current_user is None:
+        await websocket.close(code=1008, reason='Could not validate credentials')
+        return
+    await CardSession(current_user.id, topic_id).run(websocket)
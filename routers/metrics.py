@@ -0,0 +1,19 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from modules import metrics
+
+metrics_routes = APIRouter(tags=['metrics'])
+
+
+@metrics_routes.get('/metrics', summary='Prometheus metrics', response_class=PlainTextResponse)
+async def get_metrics() -> PlainTextResponse:
+    """## Application metrics in the Prometheus text exposition format
+    - *http_request_duration_seconds* - latency per route, method and status
+    - *http_request_sql_statements*, *http_request_sql_duration_seconds* - SQL work per request and route
+    - *db_statement_duration_seconds* - duration of single SQL statements
+    - *scraper_fetch_duration_seconds*, *scraper_fetch_bytes_total* - woerter.net requests
+    - *cache_requests_total* - cache hits and misses per cache
+    - *blocking_pool_queue_depth*, *blocking_pool_active* - db and scraper thread pools load
+    """
+    return PlainTextResponse(metrics.render(), media_type=metrics.CONTENT_TYPE)
@@ -6,12 +6,14 @@ import datetime
 
 from modules.security import authenticate_user, create_access_token, \
     ACCESS_TOKEN_EXPIRE_MINUTES, get_current_user, create_refresh_token, check_cookie, decode_refresh_token
+from modules.executor import offload
 
 security = APIRouter(tags=['security'])
 
 
 @security.post("/token")
-async def login_for_access_token(
+@offload('db')
+def login_for_access_token(
         form_data: Annotated[OAuth2PasswordRequestForm, Depends()],
 ) -> JSONResponse:
     user = authenticate_user(form_data.username, form_data.password)
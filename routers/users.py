@@ -1,10 +1,14 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Query
 from typing import Annotated
 
-from data.schemas import UserIn, UserOut, UserPatch, UserBase
+from data.schemas import UserIn, UserOut, UserPatch, UserBase, UserStats, SyncOut
 from data.database_manager import db_manager
 from modules.security import get_password_hash, get_current_active_user
 from modules.utils import check_for_exception, raise_exception
+from modules.executor import offload
+from modules.etags import user_data_etag
+from modules.sync import decode_token
+import modules.serialization as serialization
 
 home_routes = APIRouter(tags=['Home'])
 users = APIRouter(prefix='/users', tags=['users'])
@@ -22,7 +26,8 @@ async def home():
 
 
 @users.post('', summary='Add a new user')
-async def add_user(user: UserIn) -> UserBase:
+@offload('db')
+def add_user(user: UserIn) -> UserBase:
     """## Create a new user
     If creating the very first user, he/she will be assigned to the *Admin* role. Otherwise - *User*.
 
@@ -41,13 +46,14 @@ async def add_user(user: UserIn) -> UserBase:
         level=user.level
     )
     check_for_exception(new_user, 409)
-    return new_user
+    return serialization.user_out_from_user(new_user)
 
 
 @users.put('/me', summary="Update current user's info")
-async def update_user(user: UserIn,
-                      current_user: Annotated[UserOut, Depends(get_current_active_user)]
-                      ) -> UserOut:
+@offload('db')
+def update_user(user: UserIn,
+                current_user: Annotated[UserOut, Depends(get_current_active_user)]
+                ) -> UserOut:
     """## Update info for the current logged user
     All fields are required.
     """
@@ -61,13 +67,14 @@ async def update_user(user: UserIn,
     if isinstance(updated_user, str) and 'was not found' in updated_user:
         raise_exception(404, updated_user)
     check_for_exception(updated_user, 409)
-    return updated_user
+    return serialization.user_out_from_user(updated_user)
 
 
 @users.patch('/me', summary="Update current user's info")
-async def patch_user(user: UserPatch,
-                     current_user: Annotated[UserOut, Depends(get_current_active_user)]
-                     ) -> UserOut:
+@offload('db')
+def patch_user(user: UserPatch,
+               current_user: Annotated[UserOut, Depends(get_current_active_user)]
+               ) -> UserOut:
     """## Update info for the current logged user
     All fields are optional. At least one field should be provided.
     """
@@ -76,7 +83,7 @@ async def patch_user(user: UserPatch,
     stored_user_model = UserIn(**db_user.__dict__)
     update_data = user.model_dump(exclude_unset=True)
     updated_user = stored_user_model.model_copy(update=update_data)
-    db_user_updated = await update_user(updated_user, current_user)
+    db_user_updated = update_user.__wrapped__(updated_user, current_user)
     if isinstance(db_user_updated, str) and 'was not found' in db_user_updated:
         raise_exception(404, db_user_updated)
     check_for_exception(db_user_updated, 409)
@@ -89,8 +96,44 @@ async def read_users_me(current_user: Annotated[UserOut, Depends(get_current_act
     return current_user
 
 
+@users.get('/me/stats', summary="Show current user's progress", dependencies=[Depends(user_data_etag)])
+@offload('db')
+def read_own_stats(current_user: Annotated[UserOut, Depends(get_current_active_user)]) -> UserStats:
+    """## Show the progress of the current logged user
+    - *streak* - days in a row with at least one answered card (0 if no card was answered yesterday or today)
+    - *success_rate* - share of correct answers of all answered cards
+    - *mastered* - words answered correctly at least 3 times more often than wrongly, by level
+    - *topics* - amount of words in every topic of the user
+    """
+    return UserStats(**db_manager.get_user_stats(current_user.id))
+
+
+@users.get('/me/sync', summary="Sync changes of current user's words and topics")
+@offload('db')
+def sync_user_data(current_user: Annotated[UserOut, Depends(get_current_active_user)],
+                   since: Annotated[str | None, Query(title='Sync token',
+                                                      description='*token* of the previous sync')] = None
+                   ) -> SyncOut:
+    """## Words and topics of the current logged user changed since the previous sync
+    Without *since* all words and topics are returned. Pass the returned *token* as *since* next time to get only:
+    - *words* - words added or changed since (translations, examples, levels, topics and card progress included)
+    - *topics* - topics of those words
+    - *deleted_words*, *deleted_topics* - ids of removed words and of topics the user has no words in any more
+
+    Changes of the last seconds before the token may come again. If *reset* is true the token was too old:
+    the response holds all words and topics and the client should drop everything it doesn't contain.
+    """
+    try:
+        token_time = decode_token(since) if since else None
+    except ValueError as error:
+        raise_exception(400, str(error))
+    changes = db_manager.get_user_changes(current_user.id, token_time)
+    return serialization.list_response(serialization.sync_out, changes)
+
+
 @users.delete('/me', summary='Delete current user')
-async def remove_self(current_user: Annotated[UserOut, Depends(get_current_active_user)]) -> UserOut:
+@offload('db')
+def remove_self(current_user: Annotated[UserOut, Depends(get_current_active_user)]) -> UserOut:
     """## Delete the current logged user from the App
     This is **irreversible action**. After this:
     1. User's info will be deleted from the App.
@@ -102,5 +145,6 @@ async def remove_self(current_user: Annotated[UserOut, Depends(get_current_activ
     """
     db_user = db_manager.get_user_by_id(current_user.id)
     check_for_exception(db_user, 404)
-    deleted_user = db_manager.delete_user(db_user.id)
+    deleted_user = serialization.user_out_from_user(db_user)
+    db_manager.delete_user(db_user.id)
     return deleted_user
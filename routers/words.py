@@ -1,19 +1,25 @@
 from fastapi import APIRouter, Depends, Path, Query
+from fastapi.responses import StreamingResponse
 from typing import Annotated, Literal
 
-from data.schemas import UserOut, WordOut, UserWordIn, UserWordPatch, TopicOut
+from data.schemas import UserOut, WordOut, UserWordIn, UserWordPatch, TopicOut, WordSearchResult, WordInflections
 from data.database_manager import db_manager
 from modules.security import get_current_active_user
-from modules.word_info import get_word_info_from_search, get_word_info, get_words_suggestion
+from modules.word_info import get_word_info, get_words_suggestion
 import modules.serialization as serialization
 from modules.utils import check_for_exception, raise_exception
+from modules.executor import offload, run_blocking
+from modules.etags import user_data_etag
+from modules.genai import wake_example_generator
+from modules.spelling import find_similar_words, spelling_index
 
 words = APIRouter(prefix='/users/me/words', tags=['user_words'])
 user_topics = APIRouter(prefix='/users/me/topics', tags=['user_topics'])
 
 
-@words.get('', summary="Show user's words")
-async def read_own_words(
+@words.get('', summary="Show user's words", dependencies=[Depends(user_data_etag)])
+@offload('db')
+def read_own_words(
         current_user: Annotated[UserOut, Depends(get_current_active_user)],
         limit: Annotated[int, Query(title='words limit', description='words per request', ge=1, le=100)] = 25,
         skip: Annotated[int, Query(title='skip pages', description='pages to skip', ge=0)] = 0,
@@ -27,12 +33,14 @@ async def read_own_words(
     - *sort_by* - word attribute for sorting
     - *desc* - should sorting be ascending (false) or descending (true)
     """
-    db_users_words = db_manager.get_user_words(current_user.id, limit, skip, sort_by, desc)
-    return serialization.word_out_list_from_user_words(db_users_words)
+    user_words_rows = db_manager.get_user_words_rows(current_user.id, limit, skip, sort_by, desc)
+    check_for_exception(user_words_rows, 404)
+    return serialization.list_response(serialization.word_out_list, user_words_rows)
 
 
 @words.get('/suggest', summary='Suggest words from letter combination')
-async def suggest_words_by_letter_combination(
+@offload('scraper')
+def suggest_words_by_letter_combination(
         current_user: Annotated[UserOut, Depends(get_current_active_user)],
         letter_combination: Annotated[str, Query(title='Combination of letters', min_length=3)],
         page_start: Annotated[int, Query(title='Page number', description='Pagination parameter', ge=1, le=20)] = 1,
@@ -51,8 +59,40 @@ async def suggest_words_by_letter_combination(
     return suggest_words
 
 
-@words.get('/{user_word_id}', summary="Show user word's info")
-async def get_own_word(
+@words.get('/search', summary="Search user's words", dependencies=[Depends(user_data_etag)])
+@offload('db')
+def search_own_words(
+        current_user: Annotated[UserOut, Depends(get_current_active_user)],
+        q: Annotated[str, Query(title='Search text', min_length=2, max_length=100)],
+        limit: Annotated[int, Query(title='results limit', ge=1, le=100)] = 25
+) -> list[WordSearchResult]:
+    """## Find user words by a part of the word, translation or example
+    Typos are tolerated: words similar to *q* are found as well.
+    Results are ordered by *score* (1 - exact match), matches in the word itself rank higher than in translation
+    or example.
+    """
+    found_words = db_manager.search_user_words_rows(current_user.id, q, limit)
+    return serialization.list_response(serialization.word_search_list, found_words)
+
+
+@words.get('/export', summary="Export all user's words")
+async def export_own_words(
+        current_user: Annotated[UserOut, Depends(get_current_active_user)],
+        export_format: Literal['ndjson', 'csv'] = 'ndjson'
+) -> StreamingResponse:
+    """## Download the whole user vocabulary in one request
+    - *export_format* - _ndjson_ (one JSON word per line) or _csv_
+
+    Words are streamed from the database in batches, so the size of the vocabulary doesn't matter.
+    """
+    user_words_batches = db_manager.iter_user_words(current_user.id)
+    return serialization.export_response(serialization.user_words_export(user_words_batches, export_format),
+                                         export_format, f'{current_user.username}_words')
+
+
+@words.get('/{user_word_id}', summary="Show user word's info", dependencies=[Depends(user_data_etag)])
+@offload('db')
+def get_own_word(
         current_user: Annotated[UserOut, Depends(get_current_active_user)],
         user_word_id: Annotated[int, Path(title='UserWord id', ge=1)]
 ) -> WordOut:
@@ -64,6 +104,25 @@ async def get_own_word(
     return serialization.word_out_from_user_word(db_word)
 
 
+@words.get('/{user_word_id}/inflections', summary="Show conjugation or declension of user's word",
+           dependencies=[Depends(user_data_etag)])
+@offload('db')
+def get_own_word_inflections(
+        current_user: Annotated[UserOut, Depends(get_current_active_user)],
+        user_word_id: Annotated[int, Path(title='UserWord id', ge=1)]
+) -> WordInflections:
+    """## Conjugation (verbs), declension (nouns) or comparison (adjectives) tables of the user word
+    Tables are parsed when the word is added, so they are read from the database, not from woerter.net.
+    """
+    db_word = db_manager.get_user_word_by_id(user_word_id)
+    check_for_exception(db_word, 404)
+    if db_word.user_id != current_user.id:
+        raise_exception(403, f'User "{current_user.username}" is allowed to see only his/her own words.')
+    db_inflection = db_manager.get_word_inflections(db_word.word_id)
+    check_for_exception(db_inflection, 404)
+    return serialization.word_inflections_from_db(db_inflection)
+
+
 @words.post('', summary='Add a user word')
 async def add_user_word(
         current_user: Annotated[UserOut, Depends(get_current_active_user)],
@@ -75,10 +134,10 @@ async def add_user_word(
     2. by providing *word*, *translation*, *level* and *word_type*.
 
     """
-    parsed_word = get_word_info(word.word)
+    parsed_word = await run_blocking('scraper', get_word_info, word.word)
     custom_word = False
     if isinstance(parsed_word, str) and not all([word.english, word.level, word.word_type]):
-        searched_words = get_word_info_from_search(word.word)
+        searched_words = await find_similar_words(word.word)
         if isinstance(searched_words, list) and searched_words:
             suggestions = '; '.join([f"{searched_word['word']} ({searched_word['word_type']})"
                                      for searched_word in searched_words])
@@ -95,30 +154,38 @@ async def add_user_word(
             example_translation=word.example_translation
         )
         custom_word = True
-    the_word = parsed_word['word']
-    if db_manager.user_has_word(current_user.id, the_word, parsed_word['word_type']):
-        raise_exception(409, f"User '{current_user.username}' already has word '{the_word}' "
-                             f"({parsed_word['word_type']}).")
-    db_word = db_manager.get_word_by_word(the_word, parsed_word['word_type'])
-    if isinstance(db_word, str):
+
+    def save_user_word() -> WordOut:
+        the_word = parsed_word['word']
+        if db_manager.user_has_word(current_user.id, the_word, parsed_word['word_type']):
+            raise_exception(409, f"User '{current_user.username}' already has word '{the_word}' "
+                                 f"({parsed_word['word_type']}).")
+        db_word = db_manager.get_word_by_word(the_word, parsed_word['word_type'])
+        if isinstance(db_word, str):
+            db_user_word = db_manager.add_user_word(user_id=current_user.id,
+                                                    word=parsed_word,
+                                                    example=word.example,
+                                                    example_translation=word.example_translation,
+                                                    topics=word.topics,
+                                                    translation=word.english)
+            if custom_word:
+                db_manager.add_non_parsed_word_record(current_user.id, db_user_word.word.id)
+            return serialization.word_out_from_user_word(db_user_word)
         db_user_word = db_manager.add_user_word(user_id=current_user.id,
                                                 word=parsed_word,
-                                                example=word.example,
-                                                example_translation=word.example_translation,
                                                 topics=word.topics,
                                                 translation=word.english)
-        if custom_word:
-            db_manager.add_non_parsed_word_record(current_user.id, db_user_word.word.id)
         return serialization.word_out_from_user_word(db_user_word)
-    db_user_word = db_manager.add_user_word(user_id=current_user.id,
-                                            word=parsed_word,
-                                            topics=word.topics,
-                                            translation=word.english)
-    return serialization.word_out_from_user_word(db_user_word)
+
+    saved_user_word = await run_blocking('db', save_user_word)
+    spelling_index.add(saved_user_word.word, saved_user_word.word_type)
+    wake_example_generator()
+    return saved_user_word
 
 
 @words.delete('/{user_word_id}', summary="Removes user's word from the app")
-async def remove_user_word(
+@offload('db')
+def remove_user_word(
         current_user: Annotated[UserOut, Depends(get_current_active_user)],
         user_word_id: Annotated[int, Path(ge=1)]
 ) -> WordOut | None:
@@ -135,9 +202,10 @@ async def remove_user_word(
 
 
 @words.patch('/{user_word_id}', summary="Update user word's info")
-async def patch_own_word(user_word_id: Annotated[int, Path(ge=1)],
-                         current_user: Annotated[UserOut, Depends(get_current_active_user)],
-                         word: UserWordPatch) -> WordOut:
+@offload('db')
+def patch_own_word(user_word_id: Annotated[int, Path(ge=1)],
+                   current_user: Annotated[UserOut, Depends(get_current_active_user)],
+                   word: UserWordPatch) -> WordOut:
     """## Update info for user word with *user_word_id*
     Expected at least one of the parameters:
      - word
@@ -172,9 +240,10 @@ async def patch_own_word(user_word_id: Annotated[int, Path(ge=1)],
 
 
 @words.put('/{user_word_id}', summary="Update user word's info")
-async def update_own_word(user_word_id: Annotated[int, Path(ge=1)],
-                          current_user: Annotated[UserOut, Depends(get_current_active_user)],
-                          word: UserWordIn) -> WordOut:
+@offload('db')
+def update_own_word(user_word_id: Annotated[int, Path(ge=1)],
+                    current_user: Annotated[UserOut, Depends(get_current_active_user)],
+                    word: UserWordIn) -> WordOut:
     """## Update info for user word with *user_word_id*
     All parameters are required."""
     db_user_word = db_manager.get_user_word_by_id(user_word_id)
@@ -194,8 +263,9 @@ async def update_own_word(user_word_id: Annotated[int, Path(ge=1)],
     return serialization.word_out_from_user_word(updated_db_user_word)
 
 
-@user_topics.get('', summary="Shows all user's topics")
-async def get_own_topics(
+@user_topics.get('', summary="Shows all user's topics", dependencies=[Depends(user_data_etag)])
+@offload('db')
+def get_own_topics(
         current_user: Annotated[UserOut, Depends(get_current_active_user)],
         limit: Annotated[int, Query(title='words limit', description='topics per request', ge=1, le=100)] = 25,
         skip: Annotated[int, Query(title='skip pages', description='pages to skip', ge=0)] = 0,
@@ -206,11 +276,12 @@ async def get_own_topics(
     User topics can be ordered by topic's _name_ or _id_ in ascending or descending order."""
     user_topics_list = db_manager.get_user_topics(current_user.id, limit, skip, sort_by, desc)
     check_for_exception(user_topics_list, 404)
-    return user_topics_list
+    return serialization.topic_out_list_from_topics(user_topics_list)
 
 
-@user_topics.get('/{topic_id}', summary="Show all user topic's words")
-async def get_own_topic_words(
+@user_topics.get('/{topic_id}', summary="Show all user topic's words", dependencies=[Depends(user_data_etag)])
+@offload('db')
+def get_own_topic_words(
         topic_id: Annotated[int, Path(title='Topic ID', ge=1)],
         current_user: Annotated[UserOut, Depends(get_current_active_user)],
         limit: Annotated[int, Query(title='words limit', description='words per request', ge=1, le=100)] = 25,
@@ -221,27 +292,29 @@ async def get_own_topic_words(
     """## Get a list of all words from user topic with *topic_id*
     Words can be sorted and paginated.
     """
-    own_topic_words = db_manager.get_user_topic_words(current_user.id, topic_id, limit, skip, sort_by, desc)
+    own_topic_words = db_manager.get_user_topic_words_rows(current_user.id, topic_id, limit, skip, sort_by, desc)
     check_for_exception(own_topic_words, 404)
-    return serialization.word_out_list_from_user_words(own_topic_words)
+    return serialization.list_response(serialization.word_out_list, own_topic_words)
 
 
 @user_topics.put('/{topic_id}', summary="Update topic's name")
-async def update_own_topic_name(topic_id: Annotated[int, Path(title='Topic ID', ge=1)],
-                                current_user: Annotated[UserOut, Depends(get_current_active_user)],
-                                topic_name: str) -> TopicOut:
+@offload('db')
+def update_own_topic_name(topic_id: Annotated[int, Path(title='Topic ID', ge=1)],
+                          current_user: Annotated[UserOut, Depends(get_current_active_user)],
+                          topic_name: str) -> TopicOut:
     """## Update user's topic
     """
     updated_user_topic = db_manager.update_user_topic(current_user.id, topic_id, topic_name)
     check_for_exception(updated_user_topic, 404)
-    return updated_user_topic
+    return serialization.topic_out_from_topic(updated_user_topic)
 
 
 @user_topics.delete('/{topic_id}', summary='Delete topic from the app')
-async def remove_own_topic(topic_id: Annotated[int, Path(title='Topic ID', ge=1)],
-                           current_user: Annotated[UserOut, Depends(get_current_active_user)]) -> TopicOut:
+@offload('db')
+def remove_own_topic(topic_id: Annotated[int, Path(title='Topic ID', ge=1)],
+                     current_user: Annotated[UserOut, Depends(get_current_active_user)]) -> TopicOut:
     """## Delete topic from the application
     This action is **irreversible**. This will delete the topic and all related user words as well."""
     user_topic = db_manager.delete_user_topic(current_user.id, topic_id)
     check_for_exception(user_topic, 404)
-    return user_topic
+    return serialization.topic_out_from_topic(user_topic)
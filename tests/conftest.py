@@ -0,0 +1,45 @@
+"""Tests run the app against a throw-away SQLite database; set before the app modules read the environment."""
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+DB_DIR = tempfile.mkdtemp(prefix='brain_germination_tests_')
+os.environ.update({'db_drivername': 'sqlite', 'db_database': str(Path(DB_DIR, 'app.db')), 'db_replica_hosts': '',
+                   'genai_provider': 'off', 'OLD_SECRET_KEY': 'old-test-secret', 'SECRET_KEY': 'test-secret',
+                   'OLD_ALGORITHM': 'HS256'})
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import pytest
+from fastapi.testclient import TestClient
+
+
+@pytest.fixture(scope='session')
+def client():
+    import main
+    with TestClient(main.app) as test_client:
+        # the first user of the app is its admin
+        register(test_client, 'admin')
+        yield test_client
+
+
+def register(client: TestClient, username: str) -> dict[str, str]:
+    """Create a user and return the Authorization header of the user."""
+    response = client.post('/users', json={'username': username, 'email': f'{username}@example.com',
+                                           'password': 'password'})
+    assert response.status_code == 200, response.text
+    token = client.post('/token', data={'username': username, 'password': 'password'}).json()['access_token']
+    return {'Authorization': f'Bearer {token}'}
+
+
+@pytest.fixture
+def admin_headers(client):
+    token = client.post('/token', data={'username': 'admin', 'password': 'password'}).json()['access_token']
+    return {'Authorization': f'Bearer {token}'}
+
+
+@pytest.fixture
+def user(client, request):
+    """A new user: (id, Authorization header)."""
+    headers = register(client, request.node.name.replace('[', '_').strip(']')[:50])
+    return client.get('/users/me', headers=headers).json()['id'], headers
@@ -0,0 +1,16 @@
+from data.database_manager import db_manager
+
+
+def test_random_topic_cards_are_not_validated(client, user):
+    user_id, headers = user
+    db_manager.add_user_word(user_id=user_id, word={'word': 'der Baum', 'word_type': 'Noun', 'level': 'A1',
+                                                    'translation': 'tree'}, topics=['Natur'])
+    topic_id = client.get('/users/me/topics', headers=headers).json()[0]['id']
+    response = client.get(f'/user_cards/topic/{topic_id}', headers=headers)
+    etag = response.headers['etag']
+    assert client.get(f'/user_cards/topic/{topic_id}', headers={**headers, 'If-None-Match': etag}).status_code == 304
+
+    response = client.get(f'/user_cards/topic/{topic_id}', headers={**headers, 'If-None-Match': etag},
+                          params={'random': True})
+    assert response.status_code == 200
+    assert 'etag' not in response.headers
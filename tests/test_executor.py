@@ -0,0 +1,41 @@
+import asyncio
+import logging
+import threading
+
+import pytest
+
+from modules.executor import iterate_in_pool
+
+
+def batches(closed: threading.Event, fail_after: int | None = None):
+    try:
+        for number in range(10):
+            if number == fail_after:
+                raise RuntimeError('cursor lost')
+            yield number
+    finally:
+        closed.set()
+
+
+def test_iterator_is_closed_when_the_consumer_stops_early():
+    closed = threading.Event()
+
+    async def consume_one():
+        items = iterate_in_pool('db', batches(closed))
+        assert await anext(items) == 0
+        await items.aclose()
+
+    asyncio.run(consume_one())
+    assert closed.wait(5)
+
+
+def test_iterator_errors_are_logged(caplog):
+    closed = threading.Event()
+
+    async def consume():
+        return [item async for item in iterate_in_pool('db', batches(closed, fail_after=2))]
+
+    with caplog.at_level(logging.ERROR, logger='modules.executor'), pytest.raises(RuntimeError):
+        asyncio.run(consume())
+    assert 'Iterating in the db pool failed' in caplog.text
+    assert closed.wait(5)
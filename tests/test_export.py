@@ -0,0 +1,61 @@
+import csv
+import io
+import json
+from functools import partialmethod
+
+import pytest
+
+from data.database_manager import DataManager, db_manager
+
+WORDS = [('der Tisch', 'Noun', 'table'), ('schreiben', 'Verb', 'write'), ('groß', 'Adjective', 'big'),
+         ('die Lampe', 'Noun', 'lamp'), ('lesen', 'Verb', 'read')]
+
+
+@pytest.fixture
+def small_batches(monkeypatch):
+    # a batch of 2 makes the five words below span three batches
+    monkeypatch.setattr(DataManager, 'iter_words', partialmethod(DataManager.iter_words, batch_size=2))
+    monkeypatch.setattr(DataManager, 'iter_user_words', partialmethod(DataManager.iter_user_words, batch_size=2))
+
+
+@pytest.fixture
+def user_with_words(user):
+    user_id, headers = user
+    for word, word_type, translation in WORDS:
+        db_manager.add_user_word(user_id=user_id, word={'word': word, 'word_type': word_type, 'level': 'A1',
+                                                        'translation': translation}, topics=['Default'])
+    return user_id, headers
+
+
+def test_own_words_export_spans_batches(client, small_batches, user_with_words):
+    _, headers = user_with_words
+    response = client.get('/users/me/words/export', headers=headers)
+    assert response.status_code == 200
+    exported = [json.loads(line) for line in response.text.splitlines()]
+    assert [word['word'] for word in exported] == [word for word, _, _ in WORDS]
+
+
+def test_own_words_csv_export_spans_batches(client, small_batches, user_with_words):
+    _, headers = user_with_words
+    response = client.get('/users/me/words/export', headers=headers, params={'export_format': 'csv'})
+    assert response.status_code == 200
+    rows = list(csv.DictReader(io.StringIO(response.text)))
+    assert [row['word'] for row in rows] == [word for word, _, _ in WORDS]
+
+
+def test_export_skips_deleted_words(client, small_batches, user_with_words):
+    _, headers = user_with_words
+    words = client.get('/users/me/words/export', headers=headers).text.splitlines()
+    deleted = json.loads(words[2])
+    assert client.delete(f'/users/me/words/{deleted["id"]}', headers=headers).status_code == 200
+    exported = [json.loads(line)['word'] for line in client.get('/users/me/words/export', headers=headers)
+                .text.splitlines()]
+    assert exported == [word for word, _, _ in WORDS if word != deleted['word']]
+
+
+def test_admin_words_export_spans_batches(client, small_batches, admin_headers, user_with_words):
+    response = client.get('/admin/words/export', headers=admin_headers)
+    assert response.status_code == 200
+    exported = [json.loads(line)['word'] for line in response.text.splitlines()]
+    assert set(word for word, _, _ in WORDS) <= set(exported)
+    assert len(exported) == len(set(exported))
@@ -0,0 +1,87 @@
+import asyncio
+
+import pytest
+
+from data.database_manager import db_manager
+from modules.genai import ExampleGenerator, ExampleKey, ExampleProvider, FakeProvider, SKIPPED_LIMIT
+
+
+def generate_all(generator: ExampleGenerator) -> int:
+    async def fill() -> int:
+        written = 0
+        while count := await generator.fill_batch():
+            written += count
+        return written
+
+    return asyncio.run(fill())
+
+
+def sync_words(client, headers) -> dict[str, dict]:
+    response = client.get('/users/me/sync', headers=headers)
+    assert response.status_code == 200
+    return {word['word']: word for word in response.json()['words']}
+
+
+def test_provider_needs_generate():
+    with pytest.raises(TypeError):
+        ExampleProvider()
+
+
+def test_fake_provider_is_deterministic():
+    key = ExampleKey(1, 'der Apfel', 'Noun', 'A1', 'Essen')
+    assert FakeProvider().generate([key]) == FakeProvider().generate([key])
+    assert 'der Apfel' in FakeProvider().generate([key])[0][0]
+
+
+def test_generated_examples_are_not_custom(client, user):
+    user_id, headers = user
+    db_manager.add_user_word(user_id=user_id, word={'word': 'der Apfel', 'word_type': 'Noun', 'level': 'A1',
+                                                    'translation': 'apple'}, topics=['Essen'])
+    db_manager.add_user_word(user_id=user_id, word={'word': 'die Birne', 'word_type': 'Noun', 'level': 'A1',
+                                                    'translation': 'pear'},
+                             example='Die Birne ist reif.', example_translation='The pear is ripe.', topics=['Essen'])
+    assert generate_all(ExampleGenerator(FakeProvider(), batch_size=2)) >= 1
+
+    words = sync_words(client, headers)
+    expected = FakeProvider().generate([ExampleKey(0, 'der Apfel', 'Noun', 'A1', 'Essen')])[0]
+    assert (words['der Apfel']['example'], words['der Apfel']['example_translation']) == expected
+    assert words['der Apfel']['custom_example'] is None
+    assert words['die Birne']['example'] == words['die Birne']['custom_example'] == 'Die Birne ist reif.'
+    # a second run has nothing left to do for this user
+    assert all(row['user_id'] != user_id for row in db_manager.get_user_words_without_example(1000))
+
+
+def test_skipped_user_words_are_capped():
+    generator = ExampleGenerator(FakeProvider())
+    for user_word_id in range(SKIPPED_LIMIT + 10):
+        generator.skip(user_word_id)
+    assert len(generator.skipped) == SKIPPED_LIMIT
+    # the oldest are given another chance
+    assert 0 not in generator.skipped and SKIPPED_LIMIT + 9 in generator.skipped
+
+
+def test_cards_rotate_through_generated_and_scraped_examples(client, user):
+    user_id, headers = user
+    scraped = [['Der Hund bellt.', 'The dog barks.'], ['Ich habe einen Hund.', 'I have a dog.']]
+    db_manager.add_user_word(user_id=user_id, word={'word': 'der Hund', 'word_type': 'Noun', 'level': 'A1',
+                                                    'translation': 'dog', 'example': scraped[0],
+                                                    'examples': scraped}, topics=['Tiere'])
+    db_manager.add_user_word(user_id=user_id, word={'word': 'die Katze', 'word_type': 'Noun', 'level': 'A1',
+                                                    'translation': 'cat', 'example': scraped[0],
+                                                    'examples': scraped},
+                             example='Die Katze schläft.', example_translation='The cat sleeps.', topics=['Tiere'])
+    generate_all(ExampleGenerator(FakeProvider()))
+    words = sync_words(client, headers)
+    generated = [words['der Hund']['example'], words['der Hund']['example_translation']]
+    assert generated not in scraped
+
+    def review(word: str) -> list[str]:
+        response = client.get(f'/user_cards/update_info/{words[word]["id"]}', headers=headers,
+                              params={'guess': 'success'})
+        assert response.status_code == 200
+        return [response.json()['example'], response.json()['example_translation']]
+
+    # every review shows the next one: the generated example first, then the scraped ones
+    assert [review('der Hund') for _ in range(3)] == [*scraped, generated]
+    # a custom example is shown on every review
+    assert [review('die Katze') for _ in range(2)] == [['Die Katze schläft.', 'The cat sleeps.']] * 2
@@ -0,0 +1,31 @@
+import pytest
+
+from data.database_manager import db_manager
+
+TABLES = {'Präsens': {'ich': 'laufe', 'du': 'läufst'}}
+
+
+@pytest.fixture
+def user_words(user):
+    user_id, headers = user
+    with_tables = db_manager.add_user_word(user_id=user_id, word={'word': 'laufen', 'word_type': 'Verb',
+                                                                  'level': 'A1', 'translation': 'run'})
+    without_tables = db_manager.add_user_word(user_id=user_id, word={'word': 'bald', 'word_type': 'Adverb',
+                                                                     'level': 'A1', 'translation': 'soon'})
+    db_manager.add_word_inflections(with_tables.word_id, TABLES)
+    db_manager.add_word_inflections(without_tables.word_id, {})
+    return headers, with_tables, without_tables
+
+
+def test_inflections(client, admin_headers, user_words):
+    headers, with_tables, _ = user_words
+    assert client.get(f'/users/me/words/{with_tables.id}/inflections', headers=headers).json()['tables'] == TABLES
+    assert client.get(f'/admin/words/{with_tables.word_id}/inflections',
+                      headers=admin_headers).json()['tables'] == TABLES
+
+
+def test_word_without_tables_is_not_found(client, admin_headers, user_words):
+    headers, _, without_tables = user_words
+    assert client.get(f'/users/me/words/{without_tables.id}/inflections', headers=headers).status_code == 404
+    assert client.get(f'/admin/words/{without_tables.word_id}/inflections',
+                      headers=admin_headers).status_code == 404
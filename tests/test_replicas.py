@@ -0,0 +1,17 @@
+from data.replicas import is_replica_method
+
+
+def test_reads_go_to_replicas():
+    assert is_replica_method('get_user_words')
+    assert is_replica_method('check_user_role')
+
+
+def test_writes_stay_on_primary():
+    assert not is_replica_method('add_user_word')
+    assert not is_replica_method('load_review_state')
+
+
+def test_sync_and_cards_stay_on_primary():
+    # a lagging replica would lose rows from the sync token and cache a stale review state
+    assert not is_replica_method('get_user_changes')
+    assert not is_replica_method('get_user_cards')
@@ -0,0 +1,24 @@
+import datetime
+
+from modules.review_log import ReviewLog
+
+
+def add_events(review_log: ReviewLog, user_word_ids) -> None:
+    for user_word_id in user_word_ids:
+        review_log.add(1, user_word_id, 1, datetime.datetime(2026, 1, 1), True)
+
+
+def test_full_buffer_drops_the_oldest_events():
+    review_log = ReviewLog(batch_size=100, max_buffer=3)
+    add_events(review_log, range(5))
+    assert [event['user_word_id'] for event in review_log.take()] == [2, 3, 4]
+    assert len(review_log) == 0
+
+
+def test_given_back_events_go_first_and_the_oldest_are_dropped():
+    review_log = ReviewLog(batch_size=100, max_buffer=4)
+    add_events(review_log, range(3))
+    events = review_log.take()
+    add_events(review_log, [10, 11])
+    review_log.give_back(events)
+    assert [event['user_word_id'] for event in review_log.take()] == [1, 2, 10, 11]
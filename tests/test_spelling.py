@@ -0,0 +1,59 @@
+import threading
+import time
+
+from modules.spelling import SpellingIndex
+
+WORDS = [('der Tisch', 'Noun'), ('schreiben', 'Verb')]
+
+
+def test_first_load_happens_once():
+    index = SpellingIndex()
+    calls = []
+
+    def words():
+        calls.append(1)
+        time.sleep(0.05)
+        return WORDS
+
+    threads = [threading.Thread(target=index.refresh, args=(words, 300)) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(calls) == 1
+    assert index.suggest('Tish') == [{'word': 'der Tisch', 'word_type': 'Noun'}]
+
+
+def test_removed_words_are_not_suggested():
+    index = SpellingIndex()
+    index.refresh(lambda: WORDS, 300)
+    index.remove('der Tisch', 'Noun')
+    assert index.suggest('Tish') == []
+    index.rename(('schreiben', 'Verb'), ('schreibt', 'Verb'))
+    assert index.suggest('schreibn') == [{'word': 'schreibt', 'word_type': 'Verb'}]
+
+
+def test_rebuild_picks_up_changes_of_other_workers():
+    index = SpellingIndex()
+    words = list(WORDS)
+    index.refresh(lambda: words, 300)
+    words[:] = [('der Tisch', 'Noun'), ('groß', 'Adjective')]
+    index.refresh(lambda: words, 300)
+    assert index.suggest('gros') == []
+    index.refresh(lambda: words, 0)
+    assert index.suggest('gros') == [{'word': 'groß', 'word_type': 'Adjective'}]
+    assert index.suggest('schreibn') == []
+
+
+def test_changes_during_a_rebuild_are_kept():
+    index = SpellingIndex()
+
+    def words():
+        # a word saved and deleted by requests of this worker while the database is read
+        index.add('die Lampe', 'Noun')
+        index.remove('der Tisch', 'Noun')
+        return WORDS
+
+    index.load(words)
+    assert index.suggest('Lampe') == [{'word': 'die Lampe', 'word_type': 'Noun'}]
+    assert index.suggest('Tisch') == []
@@ -0,0 +1,28 @@
+from tests.conftest import register
+from data.database_manager import db_manager
+from modules.stats import MASTERED_MARGIN
+
+
+def master(client, headers, user_word_id: int) -> None:
+    for _ in range(MASTERED_MARGIN):
+        assert client.get(f'/user_cards/update_info/{user_word_id}', headers=headers,
+                          params={'guess': 'success'}).status_code == 200
+
+
+def test_word_level_change_moves_mastered_counters(client, admin_headers, user):
+    user_id, headers = user
+    other_headers = register(client, 'level_change_other')
+    other_id = client.get('/users/me', headers=other_headers).json()['id']
+    word = {'word': 'das Fahrrad', 'word_type': 'Noun', 'level': 'A1', 'translation': 'bicycle'}
+    user_word = db_manager.add_user_word(user_id=user_id, word=word)
+    other_user_word = db_manager.add_user_word(user_id=other_id, word=word)
+    db_manager.add_user_word_level(other_user_word.id, 'C1')
+    master(client, headers, user_word.id)
+    master(client, other_headers, other_user_word.id)
+    assert client.get('/users/me/stats', headers=headers).json()['mastered'] == {'A1': 1}
+
+    response = client.patch(f'/admin/words/{user_word.word_id}', headers=admin_headers, json={'level': 'B1'})
+    assert response.status_code == 200
+    assert client.get('/users/me/stats', headers=headers).json()['mastered'] == {'B1': 1}
+    # a custom level is kept
+    assert client.get('/users/me/stats', headers=other_headers).json()['mastered'] == {'C1': 1}
@@ -0,0 +1,37 @@
+from data.database_manager import db_manager
+from tests.conftest import register
+
+
+def user_topics(client, headers) -> dict[str, int]:
+    return {topic['name']: topic['id'] for topic in client.get('/users/me/topics', headers=headers).json()}
+
+
+def add_word(user_id: int, word: str, topic: str) -> None:
+    db_manager.add_user_word(user_id=user_id, word={'word': word, 'word_type': 'Noun', 'level': 'A1',
+                                                    'translation': word}, topics=[topic])
+
+
+def test_renaming_into_an_existing_topic_deletes_the_old_one(client, user):
+    user_id, headers = user
+    add_word(user_id, 'der Wald', 'Draußen')
+    add_word(user_id, 'der See', 'Landschaft')
+    topics = user_topics(client, headers)
+    response = client.put(f'/users/me/topics/{topics["Draußen"]}', headers=headers,
+                          params={'topic_name': 'Landschaft'})
+    assert response.status_code == 200
+    assert response.json()['id'] == topics['Landschaft']
+    assert user_topics(client, headers) == {'Landschaft': topics['Landschaft']}
+    assert isinstance(db_manager.get_topic_by_id(topics['Draußen']), str)
+
+
+def test_renaming_keeps_a_topic_other_users_have(client, user):
+    user_id, headers = user
+    other_headers = register(client, 'topic_rename_other')
+    other_id = client.get('/users/me', headers=other_headers).json()['id']
+    add_word(user_id, 'der Berg', 'Gebirge')
+    add_word(other_id, 'der Berg', 'Gebirge')
+    add_word(user_id, 'das Tal', 'Täler')
+    topics = user_topics(client, headers)
+    assert client.put(f'/users/me/topics/{topics["Gebirge"]}', headers=headers,
+                      params={'topic_name': 'Täler'}).status_code == 200
+    assert user_topics(client, other_headers) == {'Gebirge': topics['Gebirge']}
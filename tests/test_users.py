@@ -0,0 +1,30 @@
+from data.database_manager import db_manager
+from tests.conftest import register
+
+WORD = {'word': 'der Stuhl', 'word_type': 'Noun', 'level': 'A1', 'translation': 'chair'}
+
+
+def test_deleting_a_user_subtracts_every_copy_of_a_word(client, admin_headers, user):
+    user_id, _ = user
+    other_headers = register(client, 'user_count_other')
+    other_id = client.get('/users/me', headers=other_headers).json()['id']
+    word_id = db_manager.add_user_word(user_id=user_id, word=WORD).word_id
+    db_manager.add_user_word(user_id=user_id, word=WORD, topics=['Möbel'])
+    db_manager.add_user_word(user_id=other_id, word=WORD)
+    assert db_manager.get_word_by_id(word_id).user_count == 3
+
+    assert client.delete(f'/admin/users/{user_id}', headers=admin_headers).status_code == 200
+    db_manager.session.expire_all()
+    assert db_manager.get_word_by_id(word_id).user_count == 1
+
+
+def test_user_has_word(user):
+    user_id, _ = user
+    word = {'word': 'der Schrank', 'word_type': 'Noun', 'level': 'A1', 'translation': 'wardrobe'}
+    assert not db_manager.user_has_word(user_id, 'der Schrank', 'Noun')
+    db_manager.add_user_word(user_id=user_id, word=word)
+    db_manager.add_user_word(user_id=user_id, word=word)
+    assert db_manager.user_has_word(user_id, 'der Schrank', 'Noun')
+    assert db_manager.user_has_word(user_id, 'Der schrank', 'Noun')
+    assert not db_manager.user_has_word(user_id, 'der Schrank', 'Verb')
+    assert db_manager.get_user_word_by_word(user_id, 'der Schrank').word.english == 'wardrobe'